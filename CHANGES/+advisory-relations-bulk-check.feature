@@ -0,0 +1 @@
+Saving the advisories of a sync now checks which of them already have collections and references with one query per batch, instead of up to two queries per advisory.
@@ -0,0 +1 @@
+Added the `RPM_PACKAGE_SIGNING_BATCH_SIZE` setting to sign the packages added to a repository in batches, with one call of the signing script per batch. Packages which were signed before are now looked up with a single query.
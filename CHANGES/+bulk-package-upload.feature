@@ -0,0 +1 @@
+Added the `rpm/packages/upload/` endpoint, which creates packages from many RPM files or uploads, parsing their headers in parallel, and adds them to a repository in a single new version.
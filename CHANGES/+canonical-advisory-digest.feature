@@ -0,0 +1 @@
+Advisory digests are now computed directly from the advisory fields instead of from its XML, and advisories which are unchanged in the latest repository version are no longer rebuilt during sync.
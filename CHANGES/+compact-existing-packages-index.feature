@@ -0,0 +1 @@
+Reduced the memory used during resync by indexing the packages already in the repository with only the fields needed to add them to the new repository version.
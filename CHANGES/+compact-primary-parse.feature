@@ -0,0 +1 @@
+Reduced the memory used by the first pass over primary.xml during sync by tracking packages by their position in the metadata instead of by NEVRA.
@@ -0,0 +1 @@
+Added the `MAX_SUBREPO_SYNC_WORKERS` setting to sync the sub-repositories of a kickstart tree concurrently.
@@ -0,0 +1 @@
+Package uploads from artifacts and package signing now only read the header of the RPM from storage, with ranged reads, instead of copying the whole file first.
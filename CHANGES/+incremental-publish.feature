@@ -0,0 +1 @@
+Added the opt-in `RPM_INCREMENTAL_PUBLISH` setting, which reuses the package metadata of the previous publication for unchanged packages when publishing.
@@ -0,0 +1 @@
+Mirrors from a mirrorlist are now probed concurrently and ranked by speed, the ranking is cached per remote, and immediate syncs spread package downloads over the fastest mirrors with failover between them.
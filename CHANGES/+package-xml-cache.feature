@@ -0,0 +1 @@
+Added the opt-in `RPM_PACKAGE_XML_CACHE` setting, which caches the rendered metadata XML of each package so that later publishes can reuse it.
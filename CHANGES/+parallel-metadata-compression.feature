@@ -0,0 +1 @@
+Added the opt-in `RPM_PARALLEL_METADATA_COMPRESSION` setting, which compresses the repository metadata files in parallel when publishing.
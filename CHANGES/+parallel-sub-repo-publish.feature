@@ -0,0 +1 @@
+Added the `MAX_PUBLISH_METADATA_WORKERS` setting, which allows the metadata of kickstart sub-repositories to be generated in parallel when publishing.
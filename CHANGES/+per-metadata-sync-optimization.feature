@@ -0,0 +1 @@
+Optimized syncs now only parse the types of metadata which changed since the previous sync, e.g. only updateinfo.xml for errata-only updates, and carry the rest of the content forward.
@@ -0,0 +1 @@
+Added the `RPM_SYNC_CHECKPOINTS` setting, to resume immediate syncs which failed partway from the packages they already saved.
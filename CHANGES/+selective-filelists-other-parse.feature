@@ -0,0 +1 @@
+When resyncing a repository with few new packages, filelists.xml and other.xml are now only parsed for the new packages.
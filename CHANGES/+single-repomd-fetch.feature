@@ -0,0 +1 @@
+Sync now downloads the repomd.xml and .treeinfo of each repository only once per task, instead of once to probe the URL, once to check whether the sync can be skipped and once more to sync.
@@ -0,0 +1 @@
+Adding packages to a repository which signs packages now uses their stored signing keys to find out whether they are already signed, and only reads the RPM files of packages whose signing keys are unknown.
@@ -0,0 +1 @@
+Added the `rpm-sync-stages` task diagnostic, which records per-stage statistics of the sync pipeline and attaches them to the task as a JSON profile artifact.
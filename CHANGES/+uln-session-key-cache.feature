@@ -0,0 +1 @@
+ULN downloads now share one session key per ULN account instead of logging in for every downloaded file. Added the `ULN_SESSION_KEY_TTL` setting.
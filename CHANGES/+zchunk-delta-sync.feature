@@ -0,0 +1 @@
+Added the `RPM_ZCHUNK_SYNC` setting, to sync zchunk metadata and only download the chunks that changed since the last sync.
@@ -0,0 +1 @@
+Added the `RPM_ZCHUNK_PUBLISH` setting, to also publish zchunk variants of the package and advisory metadata, so that dnf only downloads the chunks that changed.
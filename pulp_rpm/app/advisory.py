@@ -4,7 +4,6 @@ from datetime import datetime
 from gettext import gettext as _
 from itertools import chain
 
-import createrepo_c as cr
 from django.conf import settings
 from django.db import (
     IntegrityError,
@@ -16,8 +15,10 @@ from pulpcore.plugin.models import Content
 
 from pulp_rpm.app.exceptions import AdvisoryConflict
 from pulp_rpm.app.models import (
+    UpdateCollection,
     UpdateCollectionPackage,
     UpdateRecord,
+    UpdateReference,
 )
 from pulp_rpm.app.shared_utils import is_previous_version
 from pulp_rpm.app.sql_utils import get_content_in_repoversion
@@ -435,7 +436,9 @@ def merge_advisories(previous_advisory, added_advisory):
             collections_to_merge.add(collection)
 
         # Compute digest for the new merged advisory and save it
-        merged_advisory_cr = previous_advisory.to_createrepo_c(collections=collections_to_merge)
+        merged_advisory_cr = previous_advisory.to_createrepo_c(
+            collections=collections_to_merge or None
+        )
         merged_digest = hash_update_record(merged_advisory_cr)
         merged_advisory = previous_advisory
         # Need to null both pk (content_ptr_id) and pulp_id here to insure django doesn't
@@ -462,9 +465,153 @@ def merge_advisories(previous_advisory, added_advisory):
     return merged_advisory
 
 
+def update_records_to_createrepo_c(update_records, batch_size=1000):
+    """
+    Convert advisories to createrepo_c UpdateRecord objects in bulk.
+
+    Instead of querying the collections, their packages and the references of each advisory
+    separately, they are fetched for a batch of advisories at once and grouped in memory.
+
+    Args:
+        update_records(django.db.models.QuerySet): The advisories to convert
+        batch_size(int): The number of advisories to fetch related objects for at once
+
+    Yields:
+        cr.UpdateRecord: createrepo_c representation of each advisory, in the order of
+            `update_records`
+
+    """
+    batch = []
+    for update_record in update_records.iterator(chunk_size=batch_size):
+        batch.append(update_record)
+        if len(batch) == batch_size:
+            yield from _update_records_to_createrepo_c(batch)
+            batch = []
+    yield from _update_records_to_createrepo_c(batch)
+
+
+def _update_records_to_createrepo_c(update_records):
+    update_record_pks = [update_record.pk for update_record in update_records]
+    if not update_record_pks:
+        return
+
+    collections = defaultdict(list)
+    for collection in UpdateCollection.objects.filter(update_record__in=update_record_pks).order_by(
+        "name", "pulp_id"
+    ):
+        collections[collection.update_record_id].append(collection)
+
+    packages = defaultdict(list)
+    for package in UpdateCollectionPackage.objects.filter(
+        update_collection__update_record__in=update_record_pks
+    ).order_by("sum"):
+        packages[package.update_collection_id].append(package)
+
+    references = defaultdict(list)
+    for reference in UpdateReference.objects.filter(update_record__in=update_record_pks).order_by(
+        "href"
+    ):
+        references[reference.update_record_id].append(reference)
+
+    for update_record in update_records:
+        rec = update_record.to_createrepo_c(collections=(), references=references[update_record.pk])
+        for collection in collections[update_record.pk]:
+            rec.append_collection(collection.to_createrepo_c(packages=packages[collection.pk]))
+        yield rec
+
+
+# The fields of the advisory models the digest of an advisory is computed from, along with the
+# modules of the collections
+UPDATE_RECORD_DIGEST_FIELDS = (
+    "id",
+    "updated_date",
+    "description",
+    "issued_date",
+    "fromstr",
+    "status",
+    "title",
+    "summary",
+    "version",
+    "type",
+    "severity",
+    "solution",
+    "release",
+    "rights",
+    "reboot_suggested",
+    "pushcount",
+)
+UPDATE_COLLECTION_DIGEST_FIELDS = ("name", "shortname")
+UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS = (
+    "arch",
+    "epoch",
+    "filename",
+    "name",
+    "reboot_suggested",
+    "relogin_suggested",
+    "restart_suggested",
+    "release",
+    "src",
+    "sum",
+    "sum_type",
+    "version",
+)
+UPDATE_REFERENCE_DIGEST_FIELDS = ("href", "ref_id", "title", "ref_type")
+
+
+def update_record_digest(record, collections, references):
+    """
+    Compute the canonical digest of an advisory from the values of its model fields.
+
+    The digest doesn't depend on the order of the collections, packages and references, so
+    it's the same whether it's computed from the parsed updateinfo.xml or from the database.
+
+    Args:
+        record(dict): values of the UpdateRecord fields
+        collections(iterable): tuples of the values of the UpdateCollection fields and a list of
+            the values of the fields of each of its UpdateCollectionPackages
+        references(iterable): values of the fields of each UpdateReference
+
+    Returns:
+        str: a hex digest representing the advisory
+
+    """
+
+    # repr() of strings, numbers, booleans and None is unambiguous and stable
+    def canonical(values, fields):
+        return repr(tuple(map(values.get, fields)))
+
+    canonical_collections = []
+    for collection, packages in collections:
+        module = collection.get("module")
+        canonical_collections.append(
+            repr(
+                (
+                    canonical(collection, UPDATE_COLLECTION_DIGEST_FIELDS),
+                    sorted(module.items()) if module else None,
+                    sorted(
+                        canonical(package, UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS)
+                        for package in packages
+                    ),
+                )
+            )
+        )
+    canonical_collections.sort()
+    canonical_references = sorted(
+        canonical(reference, UPDATE_REFERENCE_DIGEST_FIELDS) for reference in references
+    )
+    canonical_record = repr(
+        (
+            canonical(record, UPDATE_RECORD_DIGEST_FIELDS),
+            canonical_collections,
+            canonical_references,
+        )
+    )
+    return hashlib.sha256(canonical_record.encode("utf-8")).hexdigest()
+
+
 def hash_update_record(update):
     """
-    Find the hex digest for an update record xml from creatrepo_c.
+    Find the hex digest for an update record from createrepo_c.
 
     Args:
         update(createrepo_c.UpdateRecord): update record
@@ -473,6 +620,17 @@ def hash_update_record(update):
         str: a hex digest representing the update record
 
     """
-    uinfo = cr.UpdateInfo()
-    uinfo.append(update)
-    return hashlib.sha256(uinfo.xml_dump().encode("utf-8")).hexdigest()
+    return update_record_digest(
+        UpdateRecord.createrepo_to_dict(update),
+        [
+            (
+                UpdateCollection.createrepo_to_dict(collection),
+                [
+                    UpdateCollectionPackage.createrepo_to_dict(package)
+                    for package in collection.packages
+                ],
+            )
+            for collection in update.collections
+        ],
+        [UpdateReference.createrepo_to_dict(reference) for reference in update.references],
+    )
@@ -1,9 +1,13 @@
 import asyncio
+import hashlib
 import os
+import time
+import weakref
 from logging import getLogger
 from urllib.parse import quote, unquote, urlparse
 
 from aiohttp_xmlrpc.client import ServerProxy, _Method
+from django.conf import settings
 from lxml import etree
 
 from pulpcore.plugin.download import FileDownloader, HttpDownloader
@@ -125,6 +129,79 @@ class RpmDownloader(HttpDownloader):
         return to_return
 
 
+class UlnSessionKeys:
+    """
+    ULN session keys shared by all downloaders of a process.
+
+    A key is kept per server and account for `ttl` seconds. Only one downloader of each event loop
+    logs in when there's no key, the others wait for it and use the same key.
+    """
+
+    def __init__(self, ttl):
+        """
+        Args:
+            ttl (int): How many seconds a session key is used for
+        """
+        self.ttl = ttl
+        self._keys = {}
+        # Sub-repositories may be synced in threads with their own event loops, asyncio locks
+        # can only be used from one of them.
+        self._locks = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def account(server, username, password):
+        """
+        The key of the session keys of an account, which doesn't contain the password.
+
+        Args:
+            server (str): The ULN server URL
+            username (str): The ULN username
+            password (str): The ULN password
+
+        Returns:
+            tuple: The server, the username and the SHA-256 digest of the password
+        """
+        return server, username, hashlib.sha256((password or "").encode()).hexdigest()
+
+    def _lock(self, account):
+        locks = self._locks.setdefault(asyncio.get_running_loop(), {})
+        return locks.setdefault(account, asyncio.Lock())
+
+    def _cached(self, account):
+        session_key, expires = self._keys.get(account, (None, 0))
+        return session_key if expires > time.monotonic() else None
+
+    async def get(self, account, login):
+        """
+        Get the session key of an account, logging in if there's none.
+
+        Args:
+            account (tuple): The account, as returned by `account()`
+            login: A coroutine function logging into the account and returning the session key
+
+        Returns:
+            str: The session key
+        """
+        session_key = self._cached(account)
+        if session_key:
+            return session_key
+        async with self._lock(account):
+            session_key = self._cached(account)
+            if not session_key:
+                session_key = await login()
+                self._keys[account] = (session_key, time.monotonic() + self.ttl)
+        return session_key
+
+    def invalidate(self, account, session_key):
+        """Forget the session key of an account, unless it has been replaced already."""
+        if self._keys.get(account, (None, 0))[0] == session_key:
+            # Another thread may have invalidated it since
+            self._keys.pop(account, None)
+
+
+uln_session_keys = UlnSessionKeys(settings.ULN_SESSION_KEY_TTL)
+
+
 class UlnDownloader(RpmDownloader):
     """
     Custom Downloader for ULN repositories.
@@ -157,46 +234,77 @@ class UlnDownloader(RpmDownloader):
         """
         Download, validate, and compute digests on the `url`. This is a coroutine.
 
-        Once per session the coroutine logs into the ULN account using the
-        ULN username and password. The returned key is used for authentification
-        for all other downloads.
+        The downloader logs into the ULN account using the ULN username and password, unless
+        another downloader already did. The returned key is used for authentification for all
+        downloads from the account, until it expires or is rejected.
 
         This method provides the same return object type and documented in
         :meth:`~pulpcore.plugin.download.BaseDownloader._run`.
         """
         parsed = urlparse(self.url)
+        url = self.url
+        account = None
 
         if parsed.scheme == "uln":
-            # get ULN Session-key
-            SERVER_URL = os.path.join(self.uln_server_base_url, "rpc/api")
-
-            # set proxy for authentification
-            client = AllowProxyServerProxy(
-                SERVER_URL, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth
+            account = uln_session_keys.account(
+                self.uln_server_base_url, self.username, self.password
             )
-            if not self.session_key:
-                self.session_key = await self._login_and_retry(client)
-                if len(self.session_key) != 43:
-                    raise UlnCredentialsError()
-                self.headers = {"X-ULN-API-User-Key": self.session_key}
-                await client.close()
+            await self._set_session_key(account)
             # build request url from input uri
             channelLabel = parsed.netloc
             path = parsed.path.lstrip("/")
             url = os.path.join(self.uln_server_base_url, "XMLRPC/GET-REQ", channelLabel, path)
+
         async with self.session.get(
             url, proxy=self.proxy, proxy_auth=self.proxy_auth, auth=self.auth, headers=self.headers
         ) as response:
-            self.raise_for_status(response)
-            to_return = await self._handle_response(response)
-            await response.release()
-            self.response_headers = response.headers
+            if account and response.status in (401, 403):
+                # The session key may have expired on the server, log in again
+                await response.release()
+                uln_session_keys.invalidate(account, self.session_key)
+                await self._set_session_key(account)
+                async with self.session.get(
+                    url,
+                    proxy=self.proxy,
+                    proxy_auth=self.proxy_auth,
+                    auth=self.auth,
+                    headers=self.headers,
+                ) as response:
+                    to_return = await self._handle_uln_response(response)
+            else:
+                to_return = await self._handle_uln_response(response)
 
         if self._close_session_on_finalize:
             self.session.close()
-            client.close()
         return to_return
 
+    async def _handle_uln_response(self, response):
+        self.raise_for_status(response)
+        to_return = await self._handle_response(response)
+        await response.release()
+        self.response_headers = response.headers
+        return to_return
+
+    async def _set_session_key(self, account):
+        async def login():
+            # set proxy for authentification
+            client = AllowProxyServerProxy(
+                os.path.join(self.uln_server_base_url, "rpc/api"),
+                proxy=self.proxy,
+                proxy_auth=self.proxy_auth,
+                auth=self.auth,
+            )
+            try:
+                session_key = await self._login_and_retry(client)
+            finally:
+                await client.close()
+            if not session_key or len(session_key) != 43:
+                raise UlnCredentialsError()
+            return session_key
+
+        self.session_key = await uln_session_keys.get(account, login)
+        self.headers = {"X-ULN-API-User-Key": self.session_key}
+
     async def _login_and_retry(self, client, max_attempts=4, delay=1):
         """
         Attempts to log in using the provided client. Retries up to `max_attempts`
@@ -211,3 +211,20 @@ class UnsupportedChecksumTypeError(PulpException):
         return f"[{self.error_code}] " + _('"{sum_type}" is not supported.').format(
             sum_type=self.sum_type
         )
+
+
+class PackageParseError(PulpException):
+    """
+    Raised when uploaded RPM files cannot be parsed for metadata.
+    """
+
+    error_code = "RPM0019"
+
+    def __init__(self, sha256s):
+        super().__init__()
+        self.sha256s = sha256s
+
+    def __str__(self):
+        return f"[{self.error_code}] " + _(
+            "RPM files cannot be parsed for metadata: {sha256s}"
+        ).format(sha256s=", ".join(self.sha256s))
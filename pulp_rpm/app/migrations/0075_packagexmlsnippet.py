@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:44
+
+import django.db.models.deletion
+import django_lifecycle.mixins
+import pulpcore.app.models.base
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("rpm", "0074_alter_rpmrepository_metadata_signing_service_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PackageXmlSnippet",
+            fields=[
+                (
+                    "pulp_id",
+                    models.UUIDField(
+                        default=pulpcore.app.models.base.pulp_uuid,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                ("pulp_created", models.DateTimeField(auto_now_add=True)),
+                ("pulp_last_updated", models.DateTimeField(auto_now=True, null=True)),
+                ("digest", models.TextField(unique=True)),
+                ("primary", models.TextField()),
+                ("filelists", models.TextField()),
+                ("other", models.TextField()),
+                (
+                    "package",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="xml_snippets",
+                        to="rpm.package",
+                    ),
+                ),
+            ],
+            options={
+                "abstract": False,
+            },
+            bases=(django_lifecycle.mixins.LifecycleModelMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,162 @@
+import hashlib
+import logging
+from collections import defaultdict
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+# The digest as computed by pulp_rpm.app.advisory when this migration was written. It's copied
+# here so that later changes to the digest don't change what this migration does.
+UPDATE_RECORD_DIGEST_FIELDS = (
+    "id",
+    "updated_date",
+    "description",
+    "issued_date",
+    "fromstr",
+    "status",
+    "title",
+    "summary",
+    "version",
+    "type",
+    "severity",
+    "solution",
+    "release",
+    "rights",
+    "reboot_suggested",
+    "pushcount",
+)
+UPDATE_COLLECTION_DIGEST_FIELDS = ("name", "shortname")
+UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS = (
+    "arch",
+    "epoch",
+    "filename",
+    "name",
+    "reboot_suggested",
+    "relogin_suggested",
+    "restart_suggested",
+    "release",
+    "src",
+    "sum",
+    "sum_type",
+    "version",
+)
+UPDATE_REFERENCE_DIGEST_FIELDS = ("href", "ref_id", "title", "ref_type")
+
+
+def update_record_digest(record, collections, references):
+    """Compute the canonical digest of an advisory from the values of its model fields."""
+
+    def canonical(values, fields):
+        return repr(tuple(map(values.get, fields)))
+
+    canonical_collections = []
+    for collection, packages in collections:
+        module = collection.get("module")
+        canonical_collections.append(
+            repr(
+                (
+                    canonical(collection, UPDATE_COLLECTION_DIGEST_FIELDS),
+                    sorted(module.items()) if module else None,
+                    sorted(
+                        canonical(package, UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS)
+                        for package in packages
+                    ),
+                )
+            )
+        )
+    canonical_collections.sort()
+    canonical_references = sorted(
+        canonical(reference, UPDATE_REFERENCE_DIGEST_FIELDS) for reference in references
+    )
+    canonical_record = repr(
+        (
+            canonical(record, UPDATE_RECORD_DIGEST_FIELDS),
+            canonical_collections,
+            canonical_references,
+        )
+    )
+    return hashlib.sha256(canonical_record.encode("utf-8")).hexdigest()
+
+
+def recompute_advisory_digests(apps, schema_editor):
+    """Replace the digests of the advisories, which hashed their XML, with canonical ones."""
+    UpdateRecord = apps.get_model("rpm", "UpdateRecord")
+    UpdateCollection = apps.get_model("rpm", "UpdateCollection")
+    UpdateCollectionPackage = apps.get_model("rpm", "UpdateCollectionPackage")
+    UpdateReference = apps.get_model("rpm", "UpdateReference")
+
+    record_fields = ["content_ptr_id", "_pulp_domain_id", "digest", *UPDATE_RECORD_DIGEST_FIELDS]
+    collection_fields = ["pk", "name", "shortname", "module", "update_record_id"]
+    package_fields = ["update_collection_id", *UPDATE_COLLECTION_PACKAGE_DIGEST_FIELDS]
+    reference_fields = ["update_record_id", *UPDATE_REFERENCE_DIGEST_FIELDS]
+
+    seen_digests = set()
+    pks = list(UpdateRecord.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(pks), BATCH_SIZE):
+        batch_pks = pks[start : start + BATCH_SIZE]
+
+        collections = defaultdict(list)
+        collections_by_pk = {}
+        for collection in UpdateCollection.objects.filter(update_record__in=batch_pks).values(
+            *collection_fields
+        ):
+            # Collections without a name are given one when they're saved, the digest is
+            # computed before that
+            if (collection["name"] or "").startswith("collection-autofill-"):
+                collection["name"] = None
+            collection["packages"] = []
+            collections[collection["update_record_id"]].append(collection)
+            collections_by_pk[collection["pk"]] = collection
+
+        for package in UpdateCollectionPackage.objects.filter(
+            update_collection__in=collections_by_pk.keys()
+        ).values(*package_fields):
+            collections_by_pk[package["update_collection_id"]]["packages"].append(package)
+
+        references = defaultdict(list)
+        for reference in UpdateReference.objects.filter(update_record__in=batch_pks).values(
+            *reference_fields
+        ):
+            references[reference["update_record_id"]].append(reference)
+
+        to_update = []
+        for record in UpdateRecord.objects.filter(pk__in=batch_pks).values(*record_fields):
+            digest = update_record_digest(
+                record,
+                [
+                    (collection, collection["packages"])
+                    for collection in collections[record["content_ptr_id"]]
+                ],
+                references[record["content_ptr_id"]],
+            )
+            # Advisories which only differed in the order of their collections, packages or
+            # references keep their old digest, it has to stay unique
+            if (record["_pulp_domain_id"], digest) in seen_digests:
+                logger.warning(
+                    "Advisory {} ({}) keeps its digest {}, another advisory with the same "
+                    "contents has the digest {}.".format(
+                        record["id"], record["content_ptr_id"], record["digest"], digest
+                    )
+                )
+                continue
+            seen_digests.add((record["_pulp_domain_id"], digest))
+            if digest != record["digest"]:
+                to_update.append(UpdateRecord(pk=record["content_ptr_id"], digest=digest))
+        UpdateRecord.objects.bulk_update(to_update, fields=["digest"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("rpm", "0075_packagexmlsnippet"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            code=recompute_advisory_digests,
+            reverse_code=migrations.RunPython.noop,
+            elidable=True,
+        ),
+    ]
@@ -146,12 +146,15 @@ class UpdateRecord(Content):
             or False,
         }
 
-    def to_createrepo_c(self, collections=[]):
+    def to_createrepo_c(self, collections=None, references=None):
         """
         Convert to a createrepo_c UpdateRecord object.
 
         Args:
-            collections(): Collections to add to use for createrepo_c object
+            collections(): Collections to add to use for createrepo_c object, defaults to the
+                collections of the advisory
+            references(): References to add to use for createrepo_c object, defaults to the
+                references of the advisory
 
         Returns:
             rec(cr.UpdateRecord): createrepo_c representation of an advisory
@@ -178,13 +181,16 @@ class UpdateRecord(Content):
 
         rec.pushcount = self.pushcount
 
-        if not collections:
+        if collections is None:
             collections = self.collections.all().order_by("name", "pulp_id")
 
+        if references is None:
+            references = self.references.all().order_by("href")
+
         for collection in collections:
             rec.append_collection(collection.to_createrepo_c())
 
-        for reference in self.references.all().order_by("href"):
+        for reference in references:
             rec.append_reference(reference.to_createrepo_c())
 
         return rec
@@ -297,10 +303,14 @@ class UpdateCollection(BaseModel):
 
         return ret
 
-    def to_createrepo_c(self):
+    def to_createrepo_c(self, packages=None):
         """
         Convert to a createrepo_c UpdateCollection object.
 
+        Args:
+            packages(): Packages to add to use for createrepo_c object, defaults to the packages
+                of the collection
+
         Returns:
             col(cr.UpdateCollection): createrepo_c representation of a collection
 
@@ -317,7 +327,10 @@ class UpdateCollection(BaseModel):
             module.arch = self.module["arch"]
             col.module = module
 
-        for package in self.packages.all().order_by("sum"):
+        if packages is None:
+            packages = self.packages.all().order_by("sum")
+
+        for package in packages:
             col.append(package.to_createrepo_c())
 
         return col
@@ -1,3 +1,5 @@
+import json
+import subprocess
 import tempfile
 from pathlib import Path
 from typing import Optional
@@ -45,6 +47,48 @@ class RpmPackageSigningService(SigningService):
         _env_vars["PULP_SIGNING_KEY_FINGERPRINT"] = pubkey_fingerprint
         return super().sign(filename, _env_vars)
 
+    def sign_batch(
+        self,
+        filenames: list,
+        env_vars: Optional[dict] = None,
+        pubkey_fingerprint: Optional[str] = None,
+    ):
+        """
+        Sign many packages @filenames with a single call of the signing script.
+
+        The script is called with all the filenames as arguments and the `PULP_SIGNING_BATCH`
+        environment variable set. It must return the paths of the signed packages in the same
+        order:
+
+        ```json
+        {"rpm_packages": ["<path/to/package.rpm>", ...]}
+        ```
+
+        Args:
+            filenames: The absolute paths to the packages to be signed.
+            env_vars: (optional) Dict of env_vars to be passed to the signing script.
+            pubkey_fingerprint: The raw fingerprint that correlates with the private key to use.
+        """
+        if not pubkey_fingerprint:
+            raise ValueError("A pubkey_fingerprint must be provided.")
+        _env_vars = env_vars or {}
+        _env_vars["PULP_SIGNING_KEY_FINGERPRINT"] = pubkey_fingerprint
+        _env_vars["PULP_SIGNING_BATCH"] = "true"
+        completed_process = subprocess.run(
+            [self.script, *(str(filename) for filename in filenames)],
+            env=self._env_variables(_env_vars),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        if completed_process.returncode != 0:
+            raise RuntimeError(str(completed_process.stderr))
+
+        try:
+            return json.loads(completed_process.stdout)
+        except json.JSONDecodeError:
+            raise RuntimeError("The signing service script did not return valid JSON!")
+
     def validate(self):
         """
         Validate a signing service for a Rpm Package signature.
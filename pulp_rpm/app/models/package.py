@@ -1,3 +1,4 @@
+import hashlib
 from logging import getLogger
 
 import createrepo_c as cr
@@ -5,7 +6,7 @@ from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.db import models
 
-from pulpcore.plugin.models import Content
+from pulpcore.plugin.models import BaseModel, Content
 from pulpcore.plugin.util import get_domain_pk
 
 from pulp_rpm.app.constants import (
@@ -471,3 +472,50 @@ class Package(Content):
         package.url = getattr(self, PULP_PACKAGE_ATTRS.URL)
         package.version = getattr(self, PULP_PACKAGE_ATTRS.VERSION)
         return package
+
+
+class PackageXmlSnippet(BaseModel):
+    """
+    The primary, filelists and other XML of a Package, as rendered into published metadata.
+
+    Rendering a package requires loading its files, dependencies and changelogs and converting
+    them to a createrepo_c package, which dominates the cost of publishing large repositories.
+    The rendered XML only depends on the package and on the values a publication overrides
+    (checksum and location), so it is cached under a digest of those. The file time, which can
+    differ for every repository the package is in, is set when the XML is published.
+
+    Fields:
+        digest (Text): The sha256 digest of the package pk and the publication overrides.
+        primary (Text): The package entry of primary.xml.
+        filelists (Text): The package entry of filelists.xml.
+        other (Text): The package entry of other.xml.
+
+    Relations:
+        package (ForeignKey): The package the snippets were rendered from.
+    """
+
+    digest = models.TextField(unique=True)
+    primary = models.TextField()
+    filelists = models.TextField()
+    other = models.TextField()
+
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name="xml_snippets")
+
+    @staticmethod
+    def calculate_digest(package_pk, checksum_type, checksum, location_href):
+        """
+        Calculate the digest of a package rendered with the given publication overrides.
+
+        Args:
+            package_pk (uuid.UUID): The pk of the package.
+            checksum_type (str): The checksum type the package is published with.
+            checksum (str): The checksum the package is published with.
+            location_href (str): The path the package is published at.
+
+        Returns:
+            str: A hex digest identifying the rendered snippets.
+        """
+        key = "\0".join(
+            str(value) for value in (package_pk, checksum_type, checksum, location_href)
+        )
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
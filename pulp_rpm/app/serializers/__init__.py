@@ -26,7 +26,12 @@ from .modulemd import (  # noqa
     ModulemdDefaultsSerializer,
     ModulemdObsoleteSerializer,
 )
-from .package import PackageSerializer, PackageUploadSerializer, MinimalPackageSerializer  # noqa
+from .package import (  # noqa
+    MinimalPackageSerializer,
+    PackageBulkUploadSerializer,
+    PackageSerializer,
+    PackageUploadSerializer,
+)
 from .prune import PrunePackagesSerializer  # noqa
 from .repository import (  # noqa
     CopySerializer,
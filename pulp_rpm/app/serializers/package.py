@@ -11,17 +11,19 @@ from rest_framework import serializers
 from rest_framework.exceptions import NotAcceptable
 
 from pulpcore.plugin.files import PulpTemporaryUploadedFile
-from pulpcore.plugin.models import Artifact, UploadChunk
+from pulpcore.plugin.models import Artifact, Upload, UploadChunk
 from pulpcore.plugin.serializers import (
     ArtifactSerializer,
     ContentChecksumSerializer,
+    DetailRelatedField,
     PgpKeyFingerprintField,
+    RelatedField,
     SingleArtifactContentUploadSerializer,
 )
 from pulpcore.plugin.util import get_domain_pk
 
 from pulp_rpm.app.constants import CR_HEADER_FLAGS
-from pulp_rpm.app.models import Package
+from pulp_rpm.app.models import Package, RpmRepository
 from pulp_rpm.app.shared_utils import (
     extract_signing_keys,
     format_nvra,
@@ -503,3 +505,45 @@ class PackageUploadSerializer(PackageSerializer):
 
         data.update(new_pkg)
         return data
+
+
+class PackageBulkUploadSerializer(serializers.Serializer):
+    """
+    A serializer for uploading many RPM packages into a repository at once.
+    """
+
+    files = serializers.ListField(
+        child=serializers.FileField(),
+        help_text=_("RPM files to create packages from."),
+        required=False,
+        write_only=True,
+    )
+    uploads = serializers.ListField(
+        child=RelatedField(view_name=r"uploads-detail", queryset=Upload.objects.all()),
+        help_text=_("Uncommitted uploads of RPM files to create packages from."),
+        required=False,
+        write_only=True,
+    )
+    repository = DetailRelatedField(
+        help_text=_("URI of an RPM repository to add the packages to, in a single new version."),
+        required=True,
+        write_only=True,
+        view_name_pattern=r"repositories(-.*/.*)-detail",
+        queryset=RpmRepository.objects.all(),
+    )
+
+    def validate(self, data):
+        data = super().validate(data)
+        if not data.get("files") and not data.get("uploads"):
+            raise serializers.ValidationError(_("At least one file or upload must be provided."))
+        if data["repository"].package_signing_service:
+            raise serializers.ValidationError(
+                _(
+                    "Packages can't be uploaded in bulk to a repository which signs packages, "
+                    "upload them one by one instead."
+                )
+            )
+        return data
+
+    class Meta:
+        fields = ("files", "uploads", "repository")
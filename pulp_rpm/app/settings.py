@@ -12,6 +12,7 @@ DRF_ACCESS_POLICY = {
 INSTALLED_APPS = ["django_readonly_field", "dynaconf_merge"]
 ALLOW_AUTOMATIC_UNSAFE_ADVISORY_CONFLICT_RESOLUTION = False
 DEFAULT_ULN_SERVER_BASE_URL = "https://linux-update.oracle.com/"
+ULN_SESSION_KEY_TTL = 1800
 KEEP_CHANGELOG_LIMIT = 10
 SOLVER_DEBUG_LOGS = True
 RPM_METADATA_USE_REPO_PACKAGE_TIME = False
@@ -20,4 +21,16 @@ PRUNE_WORKERS_MAX = 5
 # workaround for: https://github.com/pulp/pulp_rpm/issues/4125
 SPECTACULAR_SETTINGS__OAS_VERSION = "3.0.1"
 MAX_PACKAGE_SIGNING_WORKERS = 5
+RPM_PACKAGE_SIGNING_BATCH_SIZE = 0
+MAX_PACKAGE_UPLOAD_WORKERS = 4
 RPM_SIGNING_COPY_LABELS = True
+RPM_INCREMENTAL_PUBLISH = False
+RPM_PACKAGE_XML_CACHE = False
+MAX_PUBLISH_METADATA_WORKERS = 1
+RPM_PARALLEL_METADATA_COMPRESSION = False
+MAX_SUBREPO_SYNC_WORKERS = 1
+RPM_MIRROR_RANKING_TTL = 3600
+RPM_MIRROR_FAILOVER_COUNT = 3
+RPM_ZCHUNK_SYNC = False
+RPM_ZCHUNK_PUBLISH = False
+RPM_SYNC_CHECKPOINTS = False
@@ -1,5 +1,8 @@
+import logging
 import shutil
+import struct
 import tempfile
+import urllib.request
 from hashlib import sha256
 
 import createrepo_c as cr
@@ -9,6 +12,13 @@ from django.utils.dateparse import parse_datetime
 
 from pulp_rpm.app.constants import CR_HEADER_FLAGS
 
+log = logging.getLogger(__name__)
+
+RPM_LEAD_SIZE = 96
+RPM_HEADER_MAGIC = b"\x8e\xad\xe8\x01"
+# Enough for the lead, signature and header of most packages
+RPM_HEADER_READ_SIZE = 256 * 1024
+
 
 def format_nevra(name=None, epoch=0, version=None, release=None, arch=None):
     """Generate Name-Epoch-Version-Release-Arch string."""
@@ -112,11 +122,101 @@ def signing_key_matches(fingerprint, signing_keys):
     return any(_same_key(fingerprint, signing_key) for signing_key in signing_keys)
 
 
+def rpm_header_size(data):
+    """
+    Find the size of the lead, signature and header of an RPM, which precede its payload.
+
+    Args:
+        data (bytes): The beginning of the RPM
+
+    Returns:
+        int: The size, or None if `data` is too short to tell
+
+    Raises:
+        ValueError: If `data` isn't the beginning of an RPM
+    """
+    offset = RPM_LEAD_SIZE
+    for is_signature in (True, False):
+        intro = data[offset : offset + 16]
+        if len(intro) < 16:
+            return None
+        if intro[:4] != RPM_HEADER_MAGIC:
+            raise ValueError("Invalid RPM header magic")
+        index_length, data_length = struct.unpack(">II", intro[8:])
+        offset += 16 + index_length * 16 + data_length
+        if is_signature:
+            # the header is aligned to 8 bytes
+            offset += -offset % 8
+    return offset
+
+
+def _read_storage_range(storage, name, start, size):
+    """
+    Read a range of bytes of a file in a storage, without reading the rest of the file.
+
+    Returns: the bytes, or None if the storage doesn't serve ranges of the file
+    """
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        path = None
+    if path:
+        with open(path, "rb") as f:
+            f.seek(start)
+            return f.read(size)
+
+    # Cloud storages serve files at (signed) URLs, which support range requests
+    request = urllib.request.Request(
+        storage.url(name), headers={"Range": f"bytes={start}-{start + size - 1}"}
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        if response.status != 206:
+            return None
+        return response.read()
+
+
+def read_rpm_header_from_artifact(artifact):
+    """
+    Read the lead, signature and header of the RPM of an artifact, without its payload.
+
+    Args:
+        artifact: the artifact of an RPM
+
+    Returns:
+        bytes: The lead, signature and header, or None if they can't be read on their own
+    """
+    storage = artifact.pulp_domain.get_storage()
+    data = b""
+    size = min(RPM_HEADER_READ_SIZE, artifact.size)
+    try:
+        while True:
+            chunk = _read_storage_range(storage, artifact.file.name, len(data), size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+            header_size = rpm_header_size(data)
+            if header_size is not None and header_size <= len(data):
+                return data[:header_size]
+            if len(data) >= artifact.size:
+                return None
+            size = min(header_size or len(data) + RPM_HEADER_READ_SIZE, artifact.size)
+    except (OSError, ValueError, NotImplementedError) as exc:
+        log.debug(f"Unable to read the RPM header of artifact {artifact.pk}: {exc}")
+        return None
+
+
+def _copy_artifact_file(artifact, temp_file):
+    artifact_file = artifact.pulp_domain.get_storage().open(artifact.file.name)
+    shutil.copyfileobj(artifact_file, temp_file)
+    artifact_file.close()
+
+
 def read_crpackage_from_artifact(artifact, working_dir="."):
     """
     Helper function for creating package.
 
-    Copy file to a temp directory and parse it.
+    Read the header of the RPM from storage on its own and parse it. If that isn't possible,
+    copy the whole file to a temp directory and parse it.
 
     Returns: (cr_package, signing_keys) tuple
 
@@ -124,9 +224,30 @@ def read_crpackage_from_artifact(artifact, working_dir="."):
         artifact: inited and validated artifact to save
     """
     filename = f"{artifact.pulp_id}.rpm"
-    artifact_file = artifact.pulp_domain.get_storage().open(artifact.file.name)
+    header = read_rpm_header_from_artifact(artifact)
     with tempfile.NamedTemporaryFile("wb", dir=working_dir, suffix=filename) as temp_file:
-        shutil.copyfileobj(artifact_file, temp_file)
+        if header is not None:
+            temp_file.write(header)
+            temp_file.flush()
+            try:
+                cr_pkginfo = cr.package_from_rpm(
+                    temp_file.name,
+                    changelog_limit=settings.KEEP_CHANGELOG_LIMIT,
+                    header_reading_flags=CR_HEADER_FLAGS,
+                )
+                signing_keys = extract_signing_keys(temp_file.name)
+            except (OSError, RuntimeError) as exc:
+                log.debug(f"Unable to parse the RPM header of artifact {artifact.pk}: {exc}")
+            else:
+                # These are computed from the whole file
+                cr_pkginfo.pkgId = artifact.sha256
+                cr_pkginfo.checksum_type = "sha256"
+                cr_pkginfo.size_package = artifact.size
+                return cr_pkginfo, signing_keys
+
+        temp_file.seek(0)
+        temp_file.truncate()
+        _copy_artifact_file(artifact, temp_file)
         temp_file.flush()
         cr_pkginfo = cr.package_from_rpm(
             temp_file.name,
@@ -135,10 +256,34 @@ def read_crpackage_from_artifact(artifact, working_dir="."):
         )
         signing_keys = extract_signing_keys(temp_file.name)
 
-    artifact_file.close()
     return cr_pkginfo, signing_keys
 
 
+def read_signing_keys_from_artifact(artifact, working_dir="."):
+    """
+    Extract the signing key fingerprints of the RPM of an artifact.
+
+    Only the header of the RPM is read from storage, if possible.
+
+    Args:
+        artifact: the artifact of an RPM
+
+    Returns:
+        list: The signing keys, as formatted by `format_signing_keys`
+    """
+    header = read_rpm_header_from_artifact(artifact)
+    if header is not None:
+        try:
+            return format_signing_keys(rpm_rs.PackageMetadata.from_bytes(header).signatures())
+        except RuntimeError as exc:
+            log.debug(f"Unable to parse the RPM header of artifact {artifact.pk}: {exc}")
+
+    with tempfile.NamedTemporaryFile("wb", dir=working_dir, suffix=".rpm") as temp_file:
+        _copy_artifact_file(artifact, temp_file)
+        temp_file.flush()
+        return extract_signing_keys(temp_file.name)
+
+
 def urlpath_sanitize(*args):
     """
     Join an arbitrary number of strings into a /-separated path.
@@ -0,0 +1,286 @@
+"""
+Opt-in instrumentation of the Stages API pipeline used by sync.
+
+The pipeline is profiled when the task was dispatched with the `rpm-sync-stages` task diagnostic
+(e.g. with the `X-Task-Diagnostics: rpm-sync-stages` header), which must also be enabled in the
+`TASK_DIAGNOSTICS` setting. The statistics of each stage are logged and attached to the task as
+a JSON profile artifact.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import resource
+import time
+from gettext import gettext as _
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, connection
+
+from pulpcore.plugin.models import Artifact, Task
+from pulpcore.plugin.stages import Stage
+
+log = logging.getLogger(__name__)
+
+STAGE_PROFILING_DIAGNOSTIC = "rpm-sync-stages"
+STAGE_PROFILE_ARTIFACT_NAME = "rpm_sync_stages_profile"
+
+# The statistics of the stage which the current asyncio task (and the threads it runs sync code
+# in) belongs to, so that database queries can be attributed to it.
+_current_stage_statistics = contextvars.ContextVar("rpm_current_stage_statistics", default=None)
+
+
+def stage_profiling_requested():
+    """
+    Whether the current task asked for its sync pipeline to be profiled.
+    """
+    if STAGE_PROFILING_DIAGNOSTIC not in settings.TASK_DIAGNOSTICS:
+        return False
+    try:
+        task = Task.current()
+    except LookupError:
+        return False
+    return STAGE_PROFILING_DIAGNOSTIC in (task.profile_options or ())
+
+
+def stage_profile_name(namespace=""):
+    """
+    The name of the profile artifact of the sync pipeline of a repository.
+
+    Args:
+        namespace (str): The path of a sub-repository of a kickstart tree, empty for the main
+            repository.
+    """
+    if not namespace:
+        return STAGE_PROFILE_ARTIFACT_NAME
+    return "{}-{}".format(STAGE_PROFILE_ARTIFACT_NAME, namespace.strip("/").replace("/", "-"))
+
+
+def peak_rss():
+    """
+    The peak resident set size of the process, in bytes.
+    """
+    # Linux reports it in kilobytes
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class StageStatistics:
+    """
+    What a single stage of a pipeline spent its time on.
+
+    The time spent waiting for the input queue starts when the stage asks for the next item. Stages
+    which use `Stage.batches()` ask for the next item while processing a batch, so for them it
+    overlaps with the time doing work.
+    """
+
+    __slots__ = (
+        "name",
+        "items_in",
+        "items_out",
+        "input_wait",
+        "output_wait",
+        "duration",
+        "queries",
+        "query_time",
+        "peak_rss",
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.items_in = 0
+        self.items_out = 0
+        self.input_wait = 0.0
+        self.output_wait = 0.0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.peak_rss = 0
+
+    def to_dict(self):
+        """
+        The statistics as a JSON-serializable dict.
+        """
+        return {
+            "name": self.name,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "duration": round(self.duration, 6),
+            "input_wait": round(self.input_wait, 6),
+            "output_wait": round(self.output_wait, 6),
+            "queries": self.queries,
+            "query_time": round(self.query_time, 6),
+            "queries_per_item": round(self.queries / self.items_in, 3) if self.items_in else None,
+            "peak_rss": self.peak_rss,
+        }
+
+
+class _ProfiledQueue:
+    """
+    A wrapper of a pipeline queue which records the items and the waiting in `StageStatistics`.
+    """
+
+    def __init__(self, queue, statistics):
+        self._queue = queue
+        self._statistics = statistics
+
+    async def get(self):
+        start = time.perf_counter()
+        item = await self._queue.get()
+        self._statistics.input_wait += time.perf_counter() - start
+        if item is not None:
+            self._statistics.items_in += 1
+        return item
+
+    def get_nowait(self):
+        item = self._queue.get_nowait()
+        if item is not None:
+            self._statistics.items_in += 1
+        return item
+
+    async def put(self, item):
+        start = time.perf_counter()
+        await self._queue.put(item)
+        self._statistics.output_wait += time.perf_counter() - start
+        if item is not None:
+            self._statistics.items_out += 1
+
+    def __getattr__(self, name):
+        return getattr(self._queue, name)
+
+
+class _ProfiledStage(Stage):
+    """
+    A stage which runs another stage and records its `StageStatistics`.
+    """
+
+    def __init__(self, stage, profiler):
+        super().__init__()
+        self.stage = stage
+        self.profiler = profiler
+        self.statistics = StageStatistics(stage.__class__.__name__)
+
+    def _connect(self, in_q, out_q):
+        self.stage._connect(
+            _ProfiledQueue(in_q, self.statistics) if in_q is not None else None,
+            _ProfiledQueue(out_q, self.statistics) if out_q is not None else None,
+        )
+
+    async def __call__(self):
+        _current_stage_statistics.set(self.statistics)
+        await self.profiler.start_stage()
+        start = time.perf_counter()
+        try:
+            await self.stage()
+        finally:
+            self.statistics.duration = time.perf_counter() - start
+            self.statistics.peak_rss = peak_rss()
+            await self.profiler.finish_stage()
+
+    def __str__(self):
+        return str(self.stage)
+
+
+class PipelineProfiler:
+    """
+    Records `StageStatistics` for the stages of a pipeline.
+
+    Usage::
+
+        profiler = PipelineProfiler()
+        stages = profiler.wrap(stages)
+        # ... run the pipeline ...
+        profiler.save()
+    """
+
+    def __init__(self):
+        self.stages = []
+        self._running_stages = 0
+        self._start = None
+        self._duration = 0.0
+
+    def wrap(self, stages):
+        """
+        Wrap pipeline stages so that they are profiled.
+
+        Args:
+            stages (list): The stages of the pipeline.
+
+        Returns:
+            list: The wrapped stages, in the same order.
+        """
+        wrapped = [_ProfiledStage(stage, self) for stage in stages]
+        self.stages.extend(wrapped)
+        return wrapped
+
+    def __call__(self, execute, sql, params, many, context):
+        """
+        Attribute a database query to the stage running it.
+        """
+        statistics = _current_stage_statistics.get()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            if statistics is not None:
+                statistics.queries += 1
+                statistics.query_time += time.perf_counter() - start
+
+    def _install(self):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def _uninstall(self):
+        if self in connection.execute_wrappers:
+            connection.execute_wrappers.remove(self)
+
+    async def start_stage(self):
+        """
+        Called when a stage starts running.
+        """
+        if self._running_stages == 0:
+            self._start = time.perf_counter()
+        self._running_stages += 1
+        # Stages run their queries with sync_to_async(), in a thread with its own connection
+        await sync_to_async(self._install)()
+
+    async def finish_stage(self):
+        """
+        Called when a stage finishes running.
+        """
+        self._running_stages -= 1
+        if self._running_stages == 0:
+            self._duration = time.perf_counter() - self._start
+            await sync_to_async(self._uninstall)()
+
+    def report(self):
+        """
+        The statistics of all stages as a JSON-serializable dict.
+        """
+        return {
+            "duration": round(self._duration, 6),
+            "peak_rss": peak_rss(),
+            "stages": [stage.statistics.to_dict() for stage in self.stages],
+        }
+
+    def save(self, name=STAGE_PROFILE_ARTIFACT_NAME):
+        """
+        Log the report and attach it to the current task as a profile artifact.
+        """
+        report = self.report()
+        for stage in report["stages"]:
+            log.info(_("Pipeline stage statistics: {}").format(stage))
+
+        path = os.path.join(os.getcwd(), f"{name}.json")
+        with open(path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        artifact = Artifact.init_and_validate(path)
+        try:
+            artifact.save()
+        except IntegrityError:
+            artifact = Artifact.objects.get(
+                sha256=artifact.sha256, pulp_domain=artifact.pulp_domain
+            )
+        Task.current().profile_artifacts.add(artifact, through_defaults={"name": name})
+        return report
@@ -4,3 +4,4 @@ from .signing import sign_and_create  # noqa
 from .copy import copy_content  # noqa
 from .comps import upload_comps  # noqa
 from .prune import prune_packages  # noqa
+from .upload import upload_packages  # noqa
@@ -1,15 +1,22 @@
+import contextlib
 import logging
+import multiprocessing
 import os
+import re
 import shutil
 import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from gettext import gettext as _
+from itertools import repeat
 from typing import NamedTuple
 from uuid import UUID
+from xml.sax.saxutils import unescape
 
 import createrepo_c as cr
 import libcomps
 from django.conf import settings
 from django.core.files import File
+from django.db import connection, connections
 from django.db.models import Q
 
 from pulpcore.plugin.models import (
@@ -22,6 +29,7 @@ from pulpcore.plugin.models import (
     RepositoryVersion,
 )
 
+from pulp_rpm.app.advisory import update_records_to_createrepo_c
 from pulp_rpm.app.comps import dict_to_strdict
 from pulp_rpm.app.constants import (
     ALLOWED_CHECKSUM_ERROR_MSG,
@@ -47,6 +55,7 @@ from pulp_rpm.app.models import (
     PackageEnvironment,
     PackageGroup,
     PackageLangpacks,
+    PackageXmlSnippet,
     RepoMetadataFile,
     RpmPublication,
     UpdateRecord,
@@ -61,6 +70,37 @@ REPODATA_PATH = "repodata"
 # lift dynaconf lookups outside of loops
 ALLOWED_CONTENT_CHECKSUMS = settings.ALLOWED_CONTENT_CHECKSUMS
 RPM_METADATA_USE_REPO_PACKAGE_TIME = settings.RPM_METADATA_USE_REPO_PACKAGE_TIME
+RPM_INCREMENTAL_PUBLISH = settings.RPM_INCREMENTAL_PUBLISH
+RPM_PACKAGE_XML_CACHE = settings.RPM_PACKAGE_XML_CACHE
+MAX_PUBLISH_METADATA_WORKERS = settings.MAX_PUBLISH_METADATA_WORKERS
+RPM_PARALLEL_METADATA_COMPRESSION = settings.RPM_PARALLEL_METADATA_COMPRESSION
+# zchunk metadata can only be written if createrepo_c was built with zchunk support
+RPM_ZCHUNK_PUBLISH = settings.RPM_ZCHUNK_PUBLISH and bool(cr.HAS_ZCK)
+
+PACKAGE_METADATA_TYPES = ("primary", "filelists", "other")
+# metadata files that are added to the repository without compression
+UNCOMPRESSED_METADATA_TYPES = ("modules", "group")
+REPOMD_RECORD_ATTRS = (
+    "location_href",
+    "checksum",
+    "checksum_type",
+    "checksum_open",
+    "checksum_open_type",
+    "timestamp",
+    "size",
+    "size_open",
+)
+# metadata files that are also published as zchunk files, if enabled
+ZCHUNK_METADATA_TYPES = ("primary", "filelists", "other", "updateinfo")
+ZCHUNK_REPOMD_RECORD_ATTRS = REPOMD_RECORD_ATTRS + (
+    "checksum_header",
+    "checksum_header_type",
+    "size_header",
+)
+_PRIMARY_PKGID_RE = re.compile(rb'<checksum type="[^"]*" pkgid="YES">([^<]*)</checksum>')
+_PRIMARY_HREF_RE = re.compile(rb'<location (?:xml:base="[^"]*" )?href="([^"]*)"')
+_PKGID_RE = re.compile(rb'^<package pkgid="([^"]*)"')
+_PRIMARY_TIME_FILE_RE = re.compile(r'<time file="[^"]*"')
 
 
 class PackageInfo(NamedTuple):
@@ -160,13 +200,163 @@ class _CollisionManager:
         return [pkg.cid for pkg in self._nevra_to_pkg.values() if pkg.cid not in self._banned_cids]
 
 
+class _PreviousPackageChunks:
+    """
+    Index of the per-package XML chunks of previously published primary/filelists/other files.
+
+    Only byte offsets are kept in memory, chunks are read back from the (decompressed) files
+    on demand. Primary chunks are keyed on (pkgId, location_href), filelists and other chunks
+    on pkgId, which is what a publication with the same checksum type and layout will produce
+    for a package that did not change.
+    """
+
+    def __init__(self, metadata_paths: dict[str, str], workdir: str | None = None) -> None:
+        """
+        Index the chunks of the given files.
+
+        Args:
+            metadata_paths (dict): Mapping of "primary", "filelists" and "other" to the paths of
+                uncompressed metadata files.
+            workdir (str): A directory holding the files, which is removed on close().
+        """
+        self._workdir = workdir
+        self._files = {name: open(path, "rb") for name, path in metadata_paths.items()}
+        self._offsets: dict[str, dict] = {}
+        for name, metadata_file in self._files.items():
+            self._offsets[name] = self._index(name, metadata_file)
+
+    @staticmethod
+    def _index(name, metadata_file):
+        offsets = {}
+        offset = 0
+        start = None
+        for line in metadata_file:
+            if line.startswith(b"<package"):
+                start = offset
+                chunk = [line]
+            elif start is not None:
+                chunk.append(line)
+            offset += len(line)
+            if start is not None and line == b"</package>\n":
+                data = b"".join(chunk)
+                if name == "primary":
+                    pkgid = _PRIMARY_PKGID_RE.search(data)
+                    href = _PRIMARY_HREF_RE.search(data)
+                    key = (
+                        pkgid and pkgid.group(1).decode(),
+                        href and unescape(href.group(1).decode(), {"&quot;": '"', "&apos;": "'"}),
+                    )
+                else:
+                    pkgid = _PKGID_RE.search(data)
+                    key = pkgid and pkgid.group(1).decode()
+                offsets[key] = (start, offset - start)
+                start = None
+        return offsets
+
+    def _read(self, name, key):
+        position = self._offsets[name].get(key)
+        if position is None:
+            return None
+        metadata_file = self._files[name]
+        metadata_file.seek(position[0])
+        return metadata_file.read(position[1]).decode("utf-8")
+
+    def get(self, pkgid, location_href):
+        """
+        Get the primary, filelists and other chunks of a previously published package.
+
+        Args:
+            pkgid (str): The checksum the package is published with.
+            location_href (str): The path the package is published at.
+
+        Returns:
+            tuple: The (primary, filelists, other) chunks, or None if any of them is missing.
+        """
+        chunks = (
+            self._read("primary", (pkgid, location_href)),
+            self._read("filelists", pkgid),
+            self._read("other", pkgid),
+        )
+        if None in chunks:
+            return None
+        return chunks
+
+    def close(self):
+        """Close the underlying metadata files and remove their directory."""
+        for metadata_file in self._files.values():
+            metadata_file.close()
+        if self._workdir:
+            shutil.rmtree(self._workdir, ignore_errors=True)
+
+    @classmethod
+    def from_publication(cls, publication, repodata_path):
+        """
+        Fetch and index the package metadata of a publication.
+
+        Args:
+            publication (pulp_rpm.app.models.RpmPublication): A complete publication.
+            repodata_path (str): The relative path of the repodata directory within the
+                publication.
+
+        Returns:
+            _PreviousPackageChunks: The index, or None if the metadata could not be found.
+        """
+        prefix = os.path.dirname(repodata_path)
+        published_artifacts = {
+            pa.relative_path: pa.content_artifact.artifact
+            for pa in PublishedArtifact.objects.filter(
+                publication=publication, relative_path__startswith=repodata_path
+            ).select_related("content_artifact__artifact")
+        }
+        repomd_artifact = published_artifacts.get(os.path.join(repodata_path, "repomd.xml"))
+        if not repomd_artifact:
+            return None
+
+        workdir = tempfile.mkdtemp(dir=".")
+        try:
+            repomd_path = os.path.join(workdir, "repomd.xml")
+            cls._copy_artifact(repomd_artifact, repomd_path)
+            records = {record.type: record for record in cr.Repomd(repomd_path).records}
+
+            metadata_paths = {}
+            for name in PACKAGE_METADATA_TYPES:
+                record = records.get(name)
+                artifact = record and published_artifacts.get(
+                    os.path.join(prefix, record.location_href)
+                )
+                if not artifact:
+                    shutil.rmtree(workdir)
+                    return None
+                compressed_path = os.path.join(workdir, os.path.basename(record.location_href))
+                cls._copy_artifact(artifact, compressed_path)
+                metadata_paths[name] = os.path.join(workdir, f"{name}.xml")
+                if cr.detect_compression(compressed_path) == cr.NO_COMPRESSION:
+                    os.rename(compressed_path, metadata_paths[name])
+                else:
+                    cr.decompress_file(
+                        compressed_path, metadata_paths[name], cr.AUTO_DETECT_COMPRESSION
+                    )
+                    os.remove(compressed_path)
+            return cls(metadata_paths, workdir=workdir)
+        except Exception:
+            shutil.rmtree(workdir, ignore_errors=True)
+            raise
+
+    @staticmethod
+    def _copy_artifact(artifact, path):
+        artifact_file = artifact.pulp_domain.get_storage().open(artifact.file.name)
+        with open(path, "wb") as new_file:
+            shutil.copyfileobj(artifact_file, new_file)
+        artifact_file.close()
+
+
 class PublicationData:
     """
     Encapsulates data relative to publication.
 
     Attributes:
         publication (pulpcore.plugin.models.Publication): A Publication to populate.
-        sub_repos (list): A list of tuples with sub_repos data.
+        sub_repos (list): A list of (name, repository version) tuples of the sub-repos.
         repomdrecords (list): A list of tuples with repomdrecords data.
 
     """
@@ -487,7 +677,7 @@ class PublicationData:
                     self.sub_repos.append(
                         (
                             addon_or_variant_id,
-                            repository_version.content,
+                            repository_version,
                         )
                     )
 
@@ -514,8 +704,10 @@ class PublicationData:
         for distribution_tree in distribution_trees:
             self.handle_sub_repos(distribution_tree)
 
-        for name, content in self.sub_repos:
+        for name, repository_version in self.sub_repos:
+            content = repository_version.content
             os.mkdir(name)
+            setattr(self, f"{name}_repository_version", repository_version)
             setattr(self, f"{name}_content", content)
             setattr(self, f"{name}_checksums", self.checksum_types)
             setattr(self, f"{name}_repomdrecords", self.prepare_metadata_files(content, name))
@@ -540,6 +732,46 @@ def get_checksum_type(checksum_types, default=CHECKSUM_TYPES.SHA256):
     return normalized_checksum_type
 
 
+def get_previous_publication(publication):
+    """
+    Get the publication whose metadata can be reused by an incremental publish.
+
+    That is the latest complete publication of the same repository, provided that it was created
+    with the same checksum type, compression type and layout as the new one. Otherwise (or if
+    there is none) the metadata has to be fully rebuilt.
+
+    Args:
+        publication (pulp_rpm.app.models.RpmPublication): The publication being created.
+
+    Returns:
+        pulp_rpm.app.models.RpmPublication: The previous publication, or None.
+    """
+    previous = (
+        RpmPublication.objects.filter(
+            repository_version__repository=publication.repository, complete=True
+        )
+        .exclude(pk=publication.pk)
+        .select_related("repository_version")
+        .order_by("-pulp_created")
+        .first()
+    )
+    if not previous:
+        return None
+    if (
+        previous.checksum_type != publication.checksum_type
+        or previous.compression_type != publication.compression_type
+        or previous.layout != publication.layout
+    ):
+        log.info(
+            _(
+                "Checksum type, compression type or layout changed since publication "
+                "{publication}, rebuilding the repository metadata from scratch."
+            ).format(publication=previous.pk)
+        )
+        return None
+    return previous
+
+
 def cr_checksum_type_from_string(checksum_type):
     """
     Convert checksum type from string to createrepo_c enum variant.
@@ -610,6 +842,10 @@ def publish(
             publication_data = PublicationData(publication, checksum_types)
             publication_data.populate()
 
+            previous_publication = None
+            if RPM_INCREMENTAL_PUBLISH and not RPM_METADATA_USE_REPO_PACKAGE_TIME:
+                previous_publication = get_previous_publication(publication)
+
             total_repos = 1 + len(publication_data.sub_repos)
             pb_data = dict(
                 message="Generating repository metadata",
@@ -618,35 +854,34 @@ def publish(
             )
             with ProgressReport(**pb_data) as publish_pb:
                 content = publication.repository_version.content
-
-                # Main repo
-                generate_repo_metadata(
-                    content,
-                    publication,
-                    checksum_types,
-                    publication_data.repomdrecords,
-                    metadata_signing_service=metadata_signing_service,
-                    compression_type=compression_type,
-                    retained_packages=publication_data.packages,
-                )
-                publish_pb.increment()
-
+                sub_repos = []
                 for sub_repo in publication_data.sub_repos:
                     name = sub_repo[0]
-                    content = getattr(publication_data, f"{name}_content")
-                    extra_repomdrecords = getattr(publication_data, f"{name}_repomdrecords")
-                    packages = getattr(publication_data, f"{name}_packages")
+                    repository_version = getattr(publication_data, f"{name}_repository_version")
+                    sub_repo_kwargs = dict(
+                        publication=publication,
+                        checksum_types=checksum_types,
+                        extra_repomdrecords=getattr(publication_data, f"{name}_repomdrecords"),
+                        sub_folder=name,
+                        metadata_signing_service=metadata_signing_service,
+                        compression_type=compression_type,
+                        retained_packages=getattr(publication_data, f"{name}_packages"),
+                    )
+                    sub_repos.append((repository_version.pk, sub_repo_kwargs))
+
+                def generate_main_repo_metadata():
                     generate_repo_metadata(
                         content,
                         publication,
                         checksum_types,
-                        extra_repomdrecords,
-                        name,
+                        publication_data.repomdrecords,
                         metadata_signing_service=metadata_signing_service,
                         compression_type=compression_type,
-                        retained_packages=packages,
+                        retained_packages=publication_data.packages,
+                        previous_publication=previous_publication,
                     )
-                    publish_pb.increment()
+
+                generate_metadata(generate_main_repo_metadata, sub_repos, publish_pb)
 
             log.info(_("Publication: {publication} created").format(publication=publication.pk))
             serialized_pub = RpmPublicationSerializer(
@@ -655,6 +890,328 @@ def publish(
             return serialized_pub
 
 
+# Whether this is a worker process generating the metadata of sub-repos. The sub-repos are
+# already generated in parallel, so their workers must not start pools of their own.
+_in_sub_repo_worker = False
+
+
+def _init_sub_repo_worker():
+    global _in_sub_repo_worker
+    _in_sub_repo_worker = True
+
+
+def generate_metadata(generate_main_repo_metadata, sub_repos, progress_report):
+    """
+    Generate the metadata of a repository and of its sub-repos.
+
+    If MAX_PUBLISH_METADATA_WORKERS allows it, the sub-repos are generated in forked processes
+    while the main repository is generated in this one.
+
+    Args:
+        generate_main_repo_metadata (callable): Generates the metadata of the main repository.
+        sub_repos (list): Tuples of the repository version pk and the keyword arguments of
+            `generate_repo_version_metadata` of each sub-repo.
+        progress_report (ProgressReport): Incremented for each generated repository.
+    """
+    with contextlib.ExitStack() as stack:
+        futures = []
+        # Even a single sub-repo can be generated at the same time as the main repo. Closing the
+        # connections would break an ongoing transaction.
+        if sub_repos and MAX_PUBLISH_METADATA_WORKERS > 1 and not connection.in_atomic_block:
+            # The sub-repos are generated in forked processes, which must not share the database
+            # connections of this one. Django reconnects on demand.
+            connections.close_all()
+            executor = stack.enter_context(
+                ProcessPoolExecutor(
+                    max_workers=min(MAX_PUBLISH_METADATA_WORKERS, len(sub_repos)),
+                    mp_context=multiprocessing.get_context("fork"),
+                    initializer=_init_sub_repo_worker,
+                )
+            )
+            for repository_version_pk, sub_repo_kwargs in sub_repos:
+                futures.append(
+                    executor.submit(
+                        generate_repo_version_metadata, repository_version_pk, **sub_repo_kwargs
+                    )
+                )
+            sub_repos = []
+
+        generate_main_repo_metadata()
+        progress_report.increment()
+
+        for future in as_completed(futures):
+            future.result()
+            progress_report.increment()
+
+    for repository_version_pk, sub_repo_kwargs in sub_repos:
+        generate_repo_version_metadata(repository_version_pk, **sub_repo_kwargs)
+        progress_report.increment()
+
+
+def generate_repo_version_metadata(repository_version_pk, **kwargs):
+    """
+    Generate the repository metadata for the content of a repository version.
+
+    Used to generate the metadata of sub-repos in worker processes, to which QuerySets can not be
+    passed without evaluating them.
+
+    Args:
+        repository_version_pk (str): The repository version to generate metadata for.
+        kwargs: Passed on to `generate_repo_metadata`.
+    """
+    content = RepositoryVersion.objects.get(pk=repository_version_pk).content
+    generate_repo_metadata(content, **kwargs)
+
+
+def package_to_createrepo_c(package, pkg_info, time_file=None):
+    """
+    Convert a Package to a createrepo_c package as it is published.
+
+    Args:
+        package (pulp_rpm.app.models.Package): The package to convert.
+        pkg_info (PackageInfo): The publication-specific data of the package.
+        time_file (float): An optional time to use as the file time of the package.
+
+    Returns:
+        createrepo_c.Package: The package, with the checksum and location of the publication.
+    """
+    pkg = package.to_createrepo_c()
+
+    # rewrite these fields with the desired ones
+    pkg.checksum_type = pkg_info.checksum_type
+    pkg.pkgId = pkg_info.checksum
+    pkg.location_href = pkg_info.path
+
+    if time_file is not None:
+        pkg.time_file = time_file
+
+    return pkg
+
+
+def _set_time_file(primary, time_file):
+    """Set the file time of a package entry of primary.xml, the way createrepo_c renders it."""
+    return _PRIMARY_TIME_FILE_RE.sub(f'<time file="{int(time_file)}"', primary, count=1)
+
+
+def add_packages_in_batches(
+    writer,
+    packages,
+    retained_packages,
+    repo_pkg_times,
+    previous_chunks=None,
+    added_pks=frozenset(),
+):
+    """
+    Add packages to the metadata, reusing already rendered XML where possible.
+
+    The package entries are taken from the previous publication if the package was not added
+    since, else from the PackageXmlSnippet cache (if enabled), and the package is only rendered
+    by createrepo_c if neither has it. Rendered entries are stored in the cache.
+
+    Args:
+        writer (createrepo_c.RepositoryWriter): The writer of the repository metadata.
+        packages (django.db.models.QuerySet): The ordered packages of the repository.
+        retained_packages (dict): Mapping of content_id to PackageInfo of the packages to add.
+        repo_pkg_times (dict): Mapping of content_id to the file time to publish the package with.
+        previous_chunks (_PreviousPackageChunks): The package entries of a previous publication.
+        added_pks (set): The pks of the content added since the previous publication.
+
+    Returns:
+        int: The number of packages taken from the previous publication.
+    """
+    reused = 0
+    pks = [pk for pk in packages.values_list("pk", flat=True) if pk in retained_packages]
+    for i in range(0, len(pks), 200):
+        batch = pks[i : i + 200]
+        batch_chunks = {}
+        if previous_chunks is not None:
+            for pk in batch:
+                if pk in added_pks:
+                    continue
+                pkg_info = retained_packages[pk]
+                chunks = previous_chunks.get(pkg_info.checksum, pkg_info.path)
+                if chunks:
+                    batch_chunks[pk] = chunks
+            reused += len(batch_chunks)
+
+        digests = {}
+        if RPM_PACKAGE_XML_CACHE:
+            for pk in batch:
+                if pk in batch_chunks:
+                    continue
+                pkg_info = retained_packages[pk]
+                digests[pk] = PackageXmlSnippet.calculate_digest(
+                    pk, pkg_info.checksum_type, pkg_info.checksum, pkg_info.path
+                )
+            snippets = PackageXmlSnippet.objects.filter(digest__in=digests.values()).values_list(
+                "digest", "primary", "filelists", "other"
+            )
+            cached = {digest: chunks for digest, *chunks in snippets}
+            for pk, digest in digests.items():
+                if digest in cached:
+                    batch_chunks[pk] = cached[digest]
+
+        to_render = Package.objects.in_bulk([pk for pk in batch if pk not in batch_chunks])
+        new_snippets = []
+        for pk in batch:
+            chunks = batch_chunks.get(pk)
+            if chunks is None:
+                if not RPM_PACKAGE_XML_CACHE:
+                    writer.add_pkg(
+                        package_to_createrepo_c(
+                            to_render[pk], retained_packages[pk], repo_pkg_times.get(pk)
+                        )
+                    )
+                    continue
+                # The snippets are shared by all the repositories the package is in, so they
+                # are rendered with the file time of the package itself
+                chunks = cr.xml_dump(package_to_createrepo_c(to_render[pk], retained_packages[pk]))
+                new_snippets.append(
+                    PackageXmlSnippet(
+                        package_id=pk,
+                        digest=digests[pk],
+                        primary=chunks[0],
+                        filelists=chunks[1],
+                        other=chunks[2],
+                    )
+                )
+            if pk in digests and repo_pkg_times.get(pk) is not None:
+                chunks = (_set_time_file(chunks[0], repo_pkg_times[pk]), *chunks[1:])
+            for name, chunk in zip(PACKAGE_METADATA_TYPES, chunks):
+                writer.working_metadata_files[name].writer.add_chunk(chunk)
+
+        PackageXmlSnippet.objects.bulk_create(new_snippets, ignore_conflicts=True)
+    return reused
+
+
+def _compress_metadata_file(record_type, path, compression_type, checksum_type):
+    """
+    Compress a metadata file and create the repomd record of the compressed file.
+
+    The uncompressed file is removed. Since this runs in a worker process and createrepo_c
+    records can not be pickled, the attributes of the record are returned instead.
+
+    Args:
+        record_type (str): The type of the repomd record, e.g. "primary".
+        path (str): The path of the uncompressed file, prefixed with its checksum.
+        compression_type (int): The createrepo_c compression type.
+        checksum_type (int): The createrepo_c checksum type.
+
+    Returns:
+        dict: The attributes of the filled repomd record.
+    """
+    filename = os.path.basename(path).split("-", 1)[1] + cr.compression_suffix(compression_type)
+    compressed_path = os.path.join(os.path.dirname(path), filename)
+    cr.compress_file(path, compressed_path, compression_type)
+    os.remove(path)
+
+    record = cr.RepomdRecord(record_type, compressed_path)
+    record.fill(checksum_type)
+    record.rename_file()
+    if compression_type == cr.ZCK_COMPRESSION:
+        return {attr: getattr(record, attr) for attr in ZCHUNK_REPOMD_RECORD_ATTRS}
+    return {attr: getattr(record, attr) for attr in REPOMD_RECORD_ATTRS}
+
+
+def _compress_metadata_files(record_types, paths, compression_type, checksum_type):
+    """
+    Compress metadata files with `_compress_metadata_file`, each in its own process.
+
+    Returns:
+        dict: The attributes of the filled repomd record of each record type.
+    """
+    args = (record_types, paths, repeat(compression_type), repeat(checksum_type))
+    # The sub-repo workers compress their files one after another, so that the number of
+    # processes stays bounded by MAX_PUBLISH_METADATA_WORKERS
+    if len(paths) > 1 and not _in_sub_repo_worker:
+        with ProcessPoolExecutor(
+            max_workers=len(paths), mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            compressed_records = list(executor.map(_compress_metadata_file, *args))
+    else:
+        compressed_records = list(map(_compress_metadata_file, *args))
+    return dict(zip(record_types, compressed_records))
+
+
+def _write_repomd(writer):
+    with open(writer.repodata_dir / "repomd.xml", "w") as repomd_xml_file:
+        repomd_xml_file.write(writer.repomd.xml_dump())
+
+
+def compress_repo_metadata(writer, compression_type, checksum_type):
+    """
+    Compress the metadata files written by an uncompressed RepositoryWriter, in parallel.
+
+    The files are compressed exactly as the writer would have compressed them, and repomd.xml
+    is rewritten to reference the compressed files.
+
+    Args:
+        writer (createrepo_c.RepositoryWriter): A finished writer which did not compress.
+        compression_type (int): The createrepo_c compression type.
+        checksum_type (int): The createrepo_c checksum type.
+    """
+    records = [
+        (record.type, str(writer.path / record.location_href))
+        for record in writer.repomd.records
+        if record.type not in UNCOMPRESSED_METADATA_TYPES
+    ]
+    record_types, paths = zip(*records)
+    compressed_records = _compress_metadata_files(
+        record_types, paths, compression_type, checksum_type
+    )
+
+    # Replaced records are moved to the end, so set all of them to keep the original order.
+    for record in writer.repomd.records:
+        if record.type in compressed_records:
+            record = cr.RepomdRecord(record.type, None)
+            for attr, value in compressed_records[record.type].items():
+                setattr(record, attr, value)
+        writer.repomd.set_record(record)
+
+    _write_repomd(writer)
+
+
+def add_zchunk_repo_metadata(writer, checksum_type):
+    """
+    Add zchunk variants of the package and advisory metadata files of a finished RepositoryWriter.
+
+    The zchunk files are referenced by `<type>_zck` records in repomd.xml, like createrepo_c does
+    with `--zck`. zchunk splits the files into chunks based on their content, and packages are
+    always written in the same order, so chunks which don't change between publications stay
+    identical and clients only need to download the changed ones.
+
+    Args:
+        writer (createrepo_c.RepositoryWriter): A finished writer.
+        checksum_type (int): The createrepo_c checksum type.
+    """
+    records = []
+    for record in writer.repomd.records:
+        if record.type not in ZCHUNK_METADATA_TYPES:
+            continue
+        path = str(writer.path / record.location_href)
+        # The prefix is stripped from the name of the zchunk file
+        uncompressed_path = str(writer.repodata_dir / f"zck-{record.type}.xml")
+        if cr.detect_compression(path) == cr.NO_COMPRESSION:
+            shutil.copyfile(path, uncompressed_path)
+        else:
+            cr.decompress_file(path, uncompressed_path, cr.AUTO_DETECT_COMPRESSION)
+        records.append((f"{record.type}_zck", uncompressed_path))
+    if not records:
+        return
+
+    record_types, paths = zip(*records)
+    zchunk_records = _compress_metadata_files(
+        record_types, paths, cr.ZCK_COMPRESSION, checksum_type
+    )
+    for record_type, attrs in zchunk_records.items():
+        record = cr.RepomdRecord(record_type, None)
+        for attr, value in attrs.items():
+            setattr(record, attr, value)
+        writer.repomd.set_record(record)
+
+    _write_repomd(writer)
+
+
 def generate_repo_metadata(
     content,
     publication,
@@ -664,6 +1221,7 @@ def generate_repo_metadata(
     metadata_signing_service=None,
     compression_type=COMPRESSION_TYPES.GZ,
     retained_packages: dict[UUID, PackageInfo] = {},
+    previous_publication=None,
 ):
     """
     Creates a repomd.xml file.
@@ -680,6 +1238,10 @@ def generate_repo_metadata(
         retained_packages(dict):
             A dictionary of content_id to PackageInfo for packages that should actually be included
             in the repository metadata. Will be used to filter `content` and add additional info.
+        previous_publication(pulp_rpm.app.models.RpmPublication):
+            A publication of an earlier version of the repository. The package metadata of packages
+            that were not added since that version is copied over from its metadata files instead
+            of being generated again.
 
     """
     cwd = os.getcwd()
@@ -723,9 +1285,16 @@ def generate_repo_metadata(
 
     cr_checksum_type = cr_checksum_type_from_string(publication.checksum_type)
 
+    # With parallel compression, the writer produces uncompressed files which are compressed
+    # afterwards, each in its own process.
+    parallel_compression = (
+        RPM_PARALLEL_METADATA_COMPRESSION and cr_compression_type != cr.NO_COMPRESSION
+    )
+    writer_compression_type = cr.NO_COMPRESSION if parallel_compression else cr_compression_type
+
     # Process all packages
     with cr.RepositoryWriter(
-        cwd, compression=cr_compression_type, checksum_type=cr_checksum_type
+        cwd, compression=writer_compression_type, checksum_type=cr_checksum_type
     ) as writer:
         writer.set_num_of_pkgs(total_packages)
 
@@ -733,28 +1302,45 @@ def generate_repo_metadata(
         # See: https://pulp.plan.io/issues/9402
         if not content.exists():
             writer.repomd.revision = "0"
-        for package in (
-            Package.objects.filter(pk__in=content).order_by("name", "evr").iterator(chunk_size=200)
-        ):
-            if package.pk not in retained_packages:
-                continue
-            pkg = package.to_createrepo_c()
-
-            # rewrite these fields with the desired ones
-            retained_pkg_info = retained_packages[package.pk]
-            pkg.checksum_type = retained_pkg_info.checksum_type
-            pkg.pkgId = retained_pkg_info.checksum
-            pkg.location_href = retained_pkg_info.path
-
-            if RPM_METADATA_USE_REPO_PACKAGE_TIME:
-                pkg.time_file = repo_pkg_times[package.pk]
-
-            writer.add_pkg(pkg)
+        packages = Package.objects.filter(pk__in=content).order_by("name", "evr")
+        if not RPM_METADATA_USE_REPO_PACKAGE_TIME:
+            repo_pkg_times = {}
+        previous_chunks = None
+        if previous_publication:
+            previous_chunks = _PreviousPackageChunks.from_publication(
+                previous_publication, repodata_path
+            )
+        if previous_chunks is not None:
+            added_pks = set(
+                publication.repository_version.added(
+                    base_version=previous_publication.repository_version
+                ).values_list("pk", flat=True)
+            )
+            try:
+                reused = add_packages_in_batches(
+                    writer, packages, retained_packages, repo_pkg_times, previous_chunks, added_pks
+                )
+            finally:
+                previous_chunks.close()
+            log.info(
+                _("Reused the metadata of {reused} of {total} packages from {publication}.").format(
+                    reused=reused, total=total_packages, publication=previous_publication.pk
+                )
+            )
+        elif RPM_PACKAGE_XML_CACHE:
+            add_packages_in_batches(writer, packages, retained_packages, repo_pkg_times)
+        else:
+            for package in packages.iterator(chunk_size=200):
+                if package.pk not in retained_packages:
+                    continue
+                time_file = repo_pkg_times.get(package.pk)
+                pkg = package_to_createrepo_c(package, retained_packages[package.pk], time_file)
+                writer.add_pkg(pkg)
 
         # Process update records
         update_records = UpdateRecord.objects.filter(pk__in=content).order_by("id", "digest")
-        for update_record in update_records.iterator():
-            writer.add_update_record(update_record.to_createrepo_c())
+        for update_record in update_records_to_createrepo_c(update_records):
+            writer.add_update_record(update_record)
 
         # Process modulemd, modulemd_defaults and obsoletes
         with open(mod_yml_path, "ab") as mod_yml:
@@ -820,6 +1406,12 @@ def generate_repo_metadata(
         for name, record in extra_repomdrecords:
             writer.add_repomd_metadata(name, record)
 
+    if parallel_compression:
+        compress_repo_metadata(writer, cr_compression_type, cr_checksum_type)
+
+    if RPM_ZCHUNK_PUBLISH:
+        add_zchunk_repo_metadata(writer, cr_checksum_type)
+
     for record in writer.repomd.records:
         path = os.path.join(repodata_path, os.path.basename(record.location_href))
         with open(path, "rb") as repodata_fd:
@@ -861,7 +1453,8 @@ def generate_repo_metadata(
 
         # publish a public key required for further verification
         pubkey_name = "repomd.xml.key"
-        with open(pubkey_name, "wb+") as f:
+        # written next to repomd.xml, as the metadata of sub-repos may be generated concurrently
+        with open(os.path.join(repodata_path, pubkey_name), "wb+") as f:
             f.write(signing_service.public_key.encode("utf-8"))
             f.flush()
             # important! as the file has already been opened and used, it will be treated as a
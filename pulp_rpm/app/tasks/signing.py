@@ -21,7 +21,11 @@ from pulp_rpm.app.exceptions import PackageSigningError
 from pulp_rpm.app.models.content import RpmPackageSigningResult, RpmPackageSigningService
 from pulp_rpm.app.models.package import Package
 from pulp_rpm.app.models.repository import RpmRepository
-from pulp_rpm.app.shared_utils import extract_signing_keys, signing_key_matches
+from pulp_rpm.app.shared_utils import (
+    extract_signing_keys,
+    read_signing_keys_from_artifact,
+    signing_key_matches,
+)
 
 log = logging.getLogger(__name__)
 
@@ -40,16 +44,33 @@ def _save_upload(uploadobj, final_package):
     final_package.flush()
 
 
-def _verify_package_fingerprint(path, fingerprint):
-    """Verify if the package at path is signed with signing_fingerprint or not."""
-    signing_keys = extract_signing_keys(path)
+def _verify_signing_keys(name, signing_keys, fingerprint):
+    """Verify if a package with signing_keys is signed with signing_fingerprint or not."""
     if signing_key_matches(fingerprint, signing_keys):
         return True
 
-    log.debug(f"Fingerprint mismatch for {path}: expected {fingerprint}, found {signing_keys}.")
+    log.debug(f"Fingerprint mismatch for {name}: expected {fingerprint}, found {signing_keys}.")
     return False
 
 
+def _verify_package_fingerprint(path, fingerprint):
+    """Verify if the package at path is signed with signing_fingerprint or not."""
+    return _verify_signing_keys(path, extract_signing_keys(path), fingerprint)
+
+
+def _verify_stored_fingerprint(package, artifact, fingerprint):
+    """
+    Verify if a package is signed with signing_fingerprint or not.
+
+    The stored signing_keys of the package are used. Only packages whose signing keys are unknown,
+    e.g. synced packages, are read from their artifact, and the keys read are stored.
+    """
+    if package.signing_keys is None:
+        package.signing_keys = read_signing_keys_from_artifact(artifact)
+        Package.objects.filter(pk=package.pk).update(signing_keys=package.signing_keys)
+    return _verify_signing_keys(package.filename, package.signing_keys, fingerprint)
+
+
 def _sign_file(package_file, signing_service, signing_fingerprint):
     """Sign a package and return the local path of the signed file."""
     prefix, raw_fingerprint = signing_fingerprint.split(":", 1)
@@ -74,80 +95,167 @@ def _save_artifact(artifact_path):
     return artifact
 
 
-def _sign_package(package, signing_service, signing_fingerprint):
+def _sign_files(package_files, signing_service, signing_fingerprint):
+    """Sign many packages with one call of the signing script and return the signed paths."""
+    prefix, raw_fingerprint = signing_fingerprint.split(":", 1)
+    log.info(f"Signing {len(package_files)} packages with fingerprint {signing_fingerprint}.")
+    result = signing_service.sign_batch(
+        [package_file.name for package_file in package_files],
+        env_vars={"PULP_SIGNING_FINGERPRINT_TYPE": prefix},
+        pubkey_fingerprint=raw_fingerprint,
+    )
+    signed_package_paths = [Path(path) for path in result.get("rpm_packages", [])]
+    if len(signed_package_paths) != len(package_files) or not all(
+        path.exists() for path in signed_package_paths
+    ):
+        raise PackageSigningError(result)
+    return signed_package_paths
+
+
+def _packages_to_sign(packages, signing_fingerprint):
     """
-    Sign a package or reuse an existing signed result.
+    Find the packages which have been signed with the fingerprint before, with a single query.
 
-    Returns None if already signed with the fingerprint, otherwise a
-    tuple of (original_package_id, new_package_id).
+    Packages whose stored signing_keys match the fingerprint are already signed, and left out
+    without opening their artifacts.
+
+    Returns:
+        tuple: A list of (original_package_id, new_package_id) tuples of the packages which were
+            signed before, and a list of (package, content_artifact) tuples of the packages which
+            may need to be signed.
     """
     # the viewset is currently already checking (and rejecting) on demand content
     # but in the future we could just download it instead
-    content_artifact = package.contentartifact_set.first()
-    artifact_obj = content_artifact.artifact
+    content_artifacts = {
+        content_artifact.content_id: content_artifact
+        for content_artifact in ContentArtifact.objects.filter(
+            content__in=[package.pk for package in packages]
+        ).select_related("artifact")
+    }
+    signing_results = dict(
+        RpmPackageSigningResult.objects.filter(
+            original_package_sha256__in=[
+                content_artifact.artifact.sha256 for content_artifact in content_artifacts.values()
+            ],
+            package_signing_fingerprint=signing_fingerprint,
+        ).values_list("original_package_sha256", "result_package_id")
+    )
+
+    signed_before = []
+    to_sign = []
+    for package in packages:
+        content_artifact = content_artifacts[package.pk]
+        if result_package_id := signing_results.get(content_artifact.artifact.sha256):
+            log.info(f"Reusing previously signed package for {package.filename}.")
+            signed_before.append((str(package.pk), str(result_package_id)))
+        elif package.signing_keys is not None and _verify_signing_keys(
+            package.filename, package.signing_keys, signing_fingerprint
+        ):
+            log.info(f"Package {package.filename} is already signed with {signing_fingerprint}.")
+        else:
+            to_sign.append((package, content_artifact))
+    return signed_before, to_sign
+
+
+def _create_signed_package(package, content_artifact, signed_package_path, signing_fingerprint):
+    """
+    Create the Package of a signed RPM, or reuse the one which was created concurrently.
+
+    Returns a tuple of (original_package_id, new_package_id).
+    """
     package_id = str(package.pk)
+    artifact_obj = content_artifact.artifact
+    # Read signing key fingerprints directly from the signed RPM's signature packets.
+    signing_keys = extract_signing_keys(str(signed_package_path))
+    # Read all updated metadata from the signed RPM
+    cr_pkg = cr.package_from_rpm(str(signed_package_path))
+    new_pkg_dict = Package.createrepo_to_dict(cr_pkg, signing_keys=signing_keys)
+    artifact = _save_artifact(signed_package_path)
+    extra_fields = {}
+    if settings.RPM_SIGNING_COPY_LABELS:
+        extra_fields["pulp_labels"] = package.pulp_labels
+    signed_package = Package(
+        **new_pkg_dict,
+        is_modular=package.is_modular,
+        **extra_fields,
+    )
+    signed_package.location_href = signed_package.filename
+    signed_package.save()
+    ContentArtifact.objects.create(
+        artifact=artifact,
+        content=signed_package,
+        relative_path=content_artifact.relative_path,
+    )
+    # get_or_create guards against concurrent signing of the same package, which
+    # would otherwise violate the unique constraint and fail the task.
+    signing_result, created = RpmPackageSigningResult.objects.get_or_create(
+        original_package_sha256=artifact_obj.sha256,
+        package_signing_fingerprint=signing_fingerprint,
+        defaults={"result_package": signed_package},
+    )
+    if not created:
+        # Another worker won the race; reuse its result and let orphan cleanup
+        # reap the redundant package we just created.
+        log.info(f"Package {package.filename} was signed concurrently; reusing existing result.")
+        return (package_id, str(signing_result.result_package.pk))
 
-    with NamedTemporaryFile(mode="wb", dir=".", delete=False) as final_package:
-        artifact_file = artifact_obj.file
-        _save_file(artifact_file, final_package)
+    resource = CreatedResource(content_object=signed_package)
+    resource.save()
+    log.info(f"Signed package {package.filename}.")
+    return (package_id, str(signed_package.pk))
 
-        # check if the package is already signed with our fingerprint
-        if _verify_package_fingerprint(final_package.name, signing_fingerprint):
-            log.info(f"Package {package.filename} is already signed with {signing_fingerprint}.")
-            return None
 
-        # check if the package has been signed in the past with our fingerprint and replace
-        # it with the previously-created signed package if so
-        if existing_result := RpmPackageSigningResult.objects.filter(
-            original_package_sha256=content_artifact.artifact.sha256,
-            package_signing_fingerprint=signing_fingerprint,
-        ).first():
-            log.info(f"Reusing previously signed package for {package.filename}.")
-            return (package_id, str(existing_result.result_package.pk))
+def _sign_package(package, content_artifact, signing_service, signing_fingerprint):
+    """
+    Sign a package which hasn't been signed with the fingerprint by Pulp before.
+
+    Returns None if already signed with the fingerprint, otherwise a
+    tuple of (original_package_id, new_package_id).
+    """
+    # check if the package is already signed with our fingerprint, its header is only read if
+    # its signing keys are unknown
+    if _verify_stored_fingerprint(package, content_artifact.artifact, signing_fingerprint):
+        log.info(f"Package {package.filename} is already signed with {signing_fingerprint}.")
+        return None
+
+    with NamedTemporaryFile(mode="wb", dir=".", delete=False) as final_package:
+        _save_file(content_artifact.artifact.file, final_package)
 
         # create a new signed version of the package
         log.info(f"Signing package {package.filename}.")
         signed_package_path = _sign_file(final_package, signing_service, signing_fingerprint)
-        # Read signing key fingerprints directly from the signed RPM's signature packets.
-        signing_keys = extract_signing_keys(str(signed_package_path))
-        # Read all updated metadata from the signed RPM
-        cr_pkg = cr.package_from_rpm(str(signed_package_path))
-        new_pkg_dict = Package.createrepo_to_dict(cr_pkg, signing_keys=signing_keys)
-        artifact = _save_artifact(signed_package_path)
-        extra_fields = {}
-        if settings.RPM_SIGNING_COPY_LABELS:
-            extra_fields["pulp_labels"] = package.pulp_labels
-        signed_package = Package(
-            **new_pkg_dict,
-            is_modular=package.is_modular,
-            **extra_fields,
-        )
-        signed_package.location_href = signed_package.filename
-        signed_package.save()
-        ContentArtifact.objects.create(
-            artifact=artifact,
-            content=signed_package,
-            relative_path=content_artifact.relative_path,
-        )
-        # get_or_create guards against concurrent signing of the same package, which
-        # would otherwise violate the unique constraint and fail the task.
-        signing_result, created = RpmPackageSigningResult.objects.get_or_create(
-            original_package_sha256=artifact_obj.sha256,
-            package_signing_fingerprint=signing_fingerprint,
-            defaults={"result_package": signed_package},
+        return _create_signed_package(
+            package, content_artifact, signed_package_path, signing_fingerprint
         )
-        if not created:
-            # Another worker won the race; reuse its result and let orphan cleanup
-            # reap the redundant package we just created.
-            log.info(
-                f"Package {package.filename} was signed concurrently; reusing existing result."
-            )
-            return (package_id, str(signing_result.result_package.pk))
 
-        resource = CreatedResource(content_object=signed_package)
-        resource.save()
-        log.info(f"Signed package {package.filename}.")
-        return (package_id, str(signed_package.pk))
+
+def _sign_package_batch(batch, signing_service, signing_fingerprint):
+    """
+    Sign many packages which haven't been signed with the fingerprint by Pulp before, with a
+    single call of the signing script.
+
+    Returns a list of (original_package_id, new_package_id) tuples of the signed packages.
+    """
+    unsigned = []
+    for package, content_artifact in batch:
+        if _verify_stored_fingerprint(package, content_artifact.artifact, signing_fingerprint):
+            log.info(f"Package {package.filename} is already signed with {signing_fingerprint}.")
+        else:
+            unsigned.append((package, content_artifact))
+    if not unsigned:
+        return []
+
+    package_files = []
+    for package, content_artifact in unsigned:
+        with NamedTemporaryFile(mode="wb", dir=".", delete=False) as final_package:
+            _save_file(content_artifact.artifact.file, final_package)
+        package_files.append(final_package)
+
+    signed_package_paths = _sign_files(package_files, signing_service, signing_fingerprint)
+    return [
+        _create_signed_package(package, content_artifact, signed_package_path, signing_fingerprint)
+        for (package, content_artifact), signed_package_path in zip(unsigned, signed_package_paths)
+    ]
 
 
 def sign_and_create(
@@ -206,23 +314,49 @@ def signed_add_and_remove(
             f"Signing packages for repository {repo.name} with {repo.package_signing_service}."
         )
         add_content_units = set(add_content_units)
-        packages = list(Package.objects.filter(pk__in=add_content_units).all())
+        # the large package fields aren't needed to find out whether packages are signed
+        packages = list(
+            Package.objects.filter(pk__in=add_content_units).only(
+                "pk",
+                "name",
+                "epoch",
+                "version",
+                "release",
+                "arch",
+                "is_modular",
+                "pulp_labels",
+                "signing_keys",
+            )
+        )
+        signing_service = repo.package_signing_service
+        signing_fingerprint = repo.package_signing_fingerprint
+        # packages signed by Pulp before are resolved before any file is copied
+        signed_before, to_sign = _packages_to_sign(packages, signing_fingerprint)
+
+        batch_size = settings.RPM_PACKAGE_SIGNING_BATCH_SIZE
+        if batch_size:
+            jobs = [
+                (_sign_package_batch, to_sign[i : i + batch_size])
+                for i in range(0, len(to_sign), batch_size)
+            ]
+        else:
+            jobs = [(_sign_package, *package_to_sign) for package_to_sign in to_sign]
 
         async def _sign_packages():
             semaphore = asyncio.Semaphore(settings.MAX_PACKAGE_SIGNING_WORKERS)
 
-            async def _bounded_sign(pkg):
+            async def _bounded_sign(sign, *args):
                 async with semaphore:
                     return await asyncio.to_thread(
-                        _sign_package,
-                        pkg,
-                        repo.package_signing_service,
-                        repo.package_signing_fingerprint,
+                        sign, *args, signing_service, signing_fingerprint
                     )
 
-            return await asyncio.gather(*(_bounded_sign(pkg) for pkg in packages))
+            return await asyncio.gather(*(_bounded_sign(*job) for job in jobs))
 
-        for result in asyncio.run(_sign_packages()):
+        results = asyncio.run(_sign_packages())
+        if batch_size:
+            results = [result for batch_results in results for result in batch_results]
+        for result in signed_before + results:
             if not result:
                 continue
             old_id, new_id = result
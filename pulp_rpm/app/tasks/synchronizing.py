@@ -1,27 +1,37 @@
 import asyncio
 import collections
-import functools
+import contextvars
+import hashlib
 import json
 import logging
 import os
 import re
+import shutil
+import sqlite3
+import sys
 import tempfile
+import threading
+import time
 import uuid
+import zlib
+from array import array
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from gettext import gettext as _  # noqa:F401
 
 import createrepo_c as cr
 import libcomps
-from aiohttp.client_exceptions import ClientResponseError
+from aiohttp.client_exceptions import ClientError, ClientResponseError
 from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
 from django.core.files import File
-from django.db import transaction
+from django.db import connections, transaction
 from django.db.models import Q
 from rpm_rs import Evr
 
-from pulpcore.plugin.exceptions import SyncError
+from pulpcore.plugin.exceptions import DigestValidationError, SizeValidationError, SyncError
 from pulpcore.plugin.models import (
     Artifact,
     ContentArtifact,
@@ -46,7 +56,7 @@ from pulpcore.plugin.stages import (
 )
 from pulpcore.plugin.util import get_domain
 
-from pulp_rpm.app.advisory import hash_update_record
+from pulp_rpm.app.advisory import update_record_digest
 from pulp_rpm.app.comps import dict_digest, strdict_to_dict
 from pulp_rpm.app.constants import (
     CHECKSUM_TYPES,
@@ -96,19 +106,22 @@ from pulp_rpm.app.shared_utils import (
     is_previous_version,
     urlpath_sanitize,
 )
+from pulp_rpm.app.stage_profiling import (
+    PipelineProfiler,
+    stage_profile_name,
+    stage_profiling_requested,
+)
+from pulp_rpm.app.zchunk import (
+    ZchunkError,
+    download_zchunk_delta,
+    supports_range_requests,
+    update_zchunk_cache,
+    zchunk_cache_path,
+)
 
 log = logging.getLogger(__name__)
 
 
-# TODO: https://pulp.plan.io/issues/8687
-# A global dictionary for storing data about the remote's metadata files, used for mirroring
-# Indexed by repository.pk due to sub-repos.
-metadata_files_for_mirroring = collections.defaultdict(dict)
-# A global dictionary for storing data mapping pkgid to location_href for all packages, used
-# for mirroring. Indexed by repository.pk due to sub-repos.
-pkgid_to_location_href = collections.defaultdict(functools.partial(collections.defaultdict, set))
-
-
 MIRROR_INCOMPATIBLE_REPO_ERR_MSG = (
     "This repository uses features which are incompatible with 'mirror' sync. "
     "Please sync without mirroring enabled."
@@ -123,52 +136,228 @@ DUPLICATE_WARN_MSG = (
 
 # lift dynaconf lookups outside of loops
 ALLOWED_CONTENT_CHECKSUMS = settings.ALLOWED_CONTENT_CHECKSUMS
-
-# sentinel
-ALREADY_SEEN = object()
+MAX_SUBREPO_SYNC_WORKERS = settings.MAX_SUBREPO_SYNC_WORKERS
+RPM_MIRROR_RANKING_TTL = settings.RPM_MIRROR_RANKING_TTL
+RPM_MIRROR_FAILOVER_COUNT = settings.RPM_MIRROR_FAILOVER_COUNT
+# zchunk metadata can only be used if createrepo_c was built with zchunk support
+RPM_ZCHUNK_SYNC = settings.RPM_ZCHUNK_SYNC and bool(cr.HAS_ZCK)
+RPM_SYNC_CHECKPOINTS = settings.RPM_SYNC_CHECKPOINTS
+
+# Above this many new packages, filelists.xml and other.xml are streamed together with primary.xml
+# instead of only being parsed for the new packages, which are held in memory until then.
+SELECTIVE_PARSE_MAX_NEW_PACKAGES = 10000
+
+# The parts of primary.xml needed to add a package already in the repository to a sync.
+PrimaryLocation = collections.namedtuple(
+    "PrimaryLocation", ["pkgId", "name", "location_href", "location_base"]
+)
 
 
-def store_metadata_for_mirroring(repo, md_path, relative_path):
-    """Used to store data about the downloaded metadata for mirror-publishing after the sync.
+class MirroringStore:
+    """
+    The metadata files and package locations of the repositories synced by a task, for mirroring.
 
-    Args:
-        repo: Which repository the metadata is associated with
-        md_path: The path to the metadata file
-        relative_path: The relative path to the metadata file within the repository
+    They are kept in a sqlite database in the working directory of the task, instead of in memory,
+    and are discarded with it when the task ends. Indexed by repository.pk due to sub-repos.
     """
-    global metadata_files_for_mirroring
-    metadata_files_for_mirroring[str(repo.pk)][relative_path] = md_path
 
+    BATCH_SIZE = 1000
 
-def store_package_for_mirroring(repo, pkgid, location_href):
-    """Used to store data about the packages for mirror-publishing after the sync.
+    def __init__(self, path="mirroring.sqlite3"):
+        """
+        Args:
+            path (str): The path of the database, relative to the working directory.
+        """
+        # Sub-repos may be synced concurrently, each in its own thread.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._packages = []
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode = OFF")
+            self._connection.execute("PRAGMA synchronous = OFF")
+            self._connection.execute(
+                "CREATE TABLE metadata_files (repository TEXT, relative_path TEXT, path TEXT, "
+                "PRIMARY KEY (repository, relative_path)) WITHOUT ROWID"
+            )
+            # Some repositories have the same package present in multiple places, with the same
+            # pkgid and different location_hrefs.
+            self._connection.execute(
+                "CREATE TABLE packages (repository TEXT, pkgid TEXT, location_href TEXT, "
+                "PRIMARY KEY (repository, pkgid, location_href)) WITHOUT ROWID"
+            )
 
-    Args:
-        repo: Which repository the metadata is associated with
-        pkgid: The checksum of the package
-        location_href: The relative path to the package within the repository
+    def add_metadata_file(self, repo, relative_path, md_path):
+        """
+        Store a downloaded metadata file of a repository.
+
+        Args:
+            repo: Which repository the metadata is associated with
+            relative_path: The relative path to the metadata file within the repository
+            md_path: The path to the metadata file
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO metadata_files VALUES (?, ?, ?)",
+                (str(repo.pk), relative_path, md_path),
+            )
+
+    def add_package(self, repo, pkgid, location_href):
+        """
+        Store the location of a package of a repository.
+
+        Args:
+            repo: Which repository the package is associated with
+            pkgid: The checksum of the package
+            location_href: The relative path to the package within the repository
+        """
+        self._packages.append((str(repo.pk), pkgid, location_href))
+        if len(self._packages) >= self.BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        with self._lock, self._connection:
+            packages, self._packages = self._packages, []
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO packages VALUES (?, ?, ?)", packages
+            )
+
+    def metadata_files(self, repo):
+        """
+        The downloaded metadata files of a repository.
+
+        Returns:
+            list: Tuples of the relative path of each file within the repository and its path
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT relative_path, path FROM metadata_files WHERE repository = ?",
+                (str(repo.pk),),
+            ).fetchall()
+
+    def package_locations(self, repo, pkgids):
+        """
+        The locations of packages of a repository.
+
+        Args:
+            repo: Which repository the packages are associated with
+            pkgids (list): The checksums of the packages, at most `BATCH_SIZE`
+
+        Returns:
+            dict: The set of relative paths of each package within the repository, by pkgid
+        """
+        self._flush()
+        locations = collections.defaultdict(set)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT pkgid, location_href FROM packages WHERE repository = ? "
+                "AND pkgid IN ({})".format(", ".join("?" * len(pkgids))),
+                (str(repo.pk), *pkgids),
+            )
+            for pkgid, location_href in rows:
+                locations[pkgid].add(location_href)
+        return locations
+
+    def close(self):
+        """Close the database."""
+        self._flush()
+        self._connection.close()
+
+
+class SyncCheckpoint:
     """
-    global pkgid_to_location_href
-    # this shouldn't really add the location_href to a list, really it ought to set the value
-    # but unfortunately some repositories have the same packages present in multiple places
-    # same pkgid, >1 different location_hrefs
-    pkgid_to_location_href[str(repo.pk)][pkgid].add(location_href)
+    The packages an immediate sync of a repository has saved, along with their artifacts.
 
+    They are kept in a sqlite database in the worker's `WORKING_DIRECTORY`, so that when the sync
+    fails, the next sync of the repository with the same remote resumes from where it stopped. The
+    database is removed when a sync of the repository finishes, or when it expires.
+    """
 
-def add_metadata_to_publication(publication, version, prefix=""):
-    """Create a mirrored publication for the given repository version.
+    BATCH_SIZE = 10000
+    # The checkpoints of a repository which weren't written to for this many seconds, e.g.
+    # because the repository or the remote was deleted, are removed when a sync starts
+    MAX_AGE = 7 * 24 * 60 * 60
+
+    def __init__(self, repository, remote):
+        """
+        Args:
+            repository (RpmRepository): The repository being synced
+            remote (RpmRemote or UlnRemote): The remote it is synced with
+        """
+        self.directory = os.path.join(self.root(), str(repository.pk))
+        os.makedirs(self.directory, exist_ok=True)
+        self._connection = sqlite3.connect(
+            os.path.join(self.directory, f"{remote.pk}.sqlite3"), check_same_thread=False
+        )
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS packages (pk TEXT PRIMARY KEY) WITHOUT ROWID"
+            )
+
+    def add_packages(self, pks):
+        """Record packages which have been saved, along with their artifacts."""
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO packages VALUES (?)", ((str(pk),) for pk in pks)
+            )
+
+    def saved_packages(self):
+        """
+        The packages saved by the previous syncs, which still exist and have their artifacts.
+
+        Returns:
+            list: Tuples of values for `ExistingPackages.FIELDS`
+        """
+        pks = [pk for (pk,) in self._connection.execute("SELECT pk FROM packages")]
+        packages = []
+        for start in range(0, len(pks), self.BATCH_SIZE):
+            packages.extend(
+                Package.objects.filter(
+                    pk__in=pks[start : start + self.BATCH_SIZE],
+                    contentartifact__artifact__isnull=False,
+                ).values_list(*ExistingPackages.FIELDS)
+            )
+        return packages
 
-    Uses the `metadata_files` global data.
+    def remove(self):
+        """Remove the checkpoints of the repository, once it has been synced."""
+        self._connection.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @staticmethod
+    def root():
+        """The directory of the checkpoints of all repositories."""
+        return os.path.join(settings.WORKING_DIRECTORY, "rpm-sync-checkpoints")
+
+    @classmethod
+    def remove_expired(cls):
+        """Remove the checkpoints of the repositories which weren't written to for `MAX_AGE`."""
+        expiry = time.time() - cls.MAX_AGE
+        try:
+            directories = list(os.scandir(cls.root()))
+        except FileNotFoundError:
+            return
+        for directory in directories:
+            try:
+                entries = [directory, *os.scandir(directory.path)]
+                expired = all(entry.stat().st_mtime < expiry for entry in entries)
+            except FileNotFoundError:
+                continue
+            if expired:
+                log.info(f"Removing the expired sync checkpoints in {directory.path}")
+                shutil.rmtree(directory.path, ignore_errors=True)
+
+
+def add_metadata_to_publication(publication, version, mirroring_store, prefix=""):
+    """Create a mirrored publication for the given repository version.
 
     Args:
         publication: The publication to add downloaded repo metadata to
         version: The repository version the repo corresponds to
+        mirroring_store (MirroringStore): The metadata files and package locations of the sync
     Kwargs:
         prefix: Subdirectory underneath the root repository (if a sub-repo)
     """
-    repo_metadata_files = metadata_files_for_mirroring[str(version.repository.pk)]
-
-    for relative_path, metadata_file_path in repo_metadata_files.items():
+    for relative_path, metadata_file_path in mirroring_store.metadata_files(version.repository):
         with open(metadata_file_path, "rb") as metadata_fd:
             PublishedMetadata.create_from_file(
                 file=File(metadata_fd),
@@ -181,17 +370,29 @@ def add_metadata_to_publication(publication, version, prefix=""):
     # Handle packages
     pkg_data = ContentArtifact.objects.filter(
         content__in=version.content, content__pulp_type=Package.get_pulp_type()
-    ).values("pk", "content__rpm_package__pkgId")
+    ).values_list("pk", "content__rpm_package__pkgId")
+
+    def publish_packages(content_artifacts):
+        locations = mirroring_store.package_locations(
+            version.repository, [pkgid for pk, pkgid in content_artifacts]
+        )
+        for pk, pkgid in content_artifacts:
+            for relative_path in locations[pkgid]:
+                pa = PublishedArtifact(
+                    content_artifact_id=pk,
+                    relative_path=os.path.join(prefix, relative_path),
+                    publication=publication,
+                )
+                published_artifacts.append(pa)
+
+    content_artifacts = []
     for ca in pkg_data.iterator():
-        for relative_path in pkgid_to_location_href[str(version.repository.pk)][
-            ca["content__rpm_package__pkgId"]
-        ]:
-            pa = PublishedArtifact(
-                content_artifact_id=ca["pk"],
-                relative_path=os.path.join(prefix, relative_path),
-                publication=publication,
-            )
-            published_artifacts.append(pa)
+        content_artifacts.append(ca)
+        if len(content_artifacts) >= MirroringStore.BATCH_SIZE:
+            publish_packages(content_artifacts)
+            content_artifacts = []
+    if content_artifacts:
+        publish_packages(content_artifacts)
 
     # Handle everything else
     # TODO: this code is copied directly from publication, we should deduplicate it later
@@ -247,48 +448,187 @@ def get_repomd_file(remote, url):
     return downloader.fetch()
 
 
-def fetch_mirror(remote):
-    """Fetch the first valid mirror from a list of all available mirrors from a mirror list feed.
+# A downloaded repomd.xml and its parsed content
+FetchedRepomd = collections.namedtuple("FetchedRepomd", ["result", "repomd"])
+
+
+class RepomdSession:
+    """
+    The repomd.xml files downloaded from a remote during a task, by URL.
+
+    Each repomd.xml is downloaded and parsed only once, no matter how many times it is needed to
+    probe mirrors, to decide whether the sync can be optimized and to sync the repository.
+    """
+
+    def __init__(self, remote):
+        """
+        Args:
+            remote (RpmRemote or UlnRemote): The remote to download with.
+        """
+        self.remote = remote
+        self._repomds = {}
+        # The fastest healthy mirrors, fastest first, if the remote is a mirrorlist
+        self.mirror_urls = []
+
+    @staticmethod
+    def _key(url):
+        return urlpath_sanitize(url.split("?")[0], "repodata/repomd.xml")
+
+    def add(self, url, fetched):
+        """
+        Add a repomd.xml which was already downloaded.
+
+        Args:
+            url (str): A remote repository URL
+            fetched (FetchedRepomd): The download result and the parsed repomd.xml
+
+        """
+        self._repomds[self._key(url)] = fetched
+
+    def get(self, url):
+        """
+        Get the repomd.xml of the repository at a URL, downloading it if needed.
+
+        Args:
+            url (str): A remote repository URL
+
+        Returns:
+            FetchedRepomd: The download result and the parsed repomd.xml
+
+        """
+        key = self._key(url)
+        fetched = self._repomds.get(key)
+        if fetched is None:
+            result = get_repomd_file(remote_for_event_loop(self.remote), url)
+            fetched = FetchedRepomd(result, cr.Repomd(result.path))
+            self._repomds[key] = fetched
+        return fetched
+
+
+def read_mirrorlist(remote):
+    """Get the URLs of all available mirrors from a mirror list feed.
 
     URLs which are commented out or have any punctuations in front of them are being ignored.
     """
     downloader = remote.get_downloader(url=remote.url.rstrip("/"), urlencode=False)
     result = downloader.fetch()
 
+    mirror_urls = []
     url_pattern = re.compile(r"(^|^[\w\s=]+\s)((http(s)?)://.*)")
     with open(result.path) as mirror_list_file:
         for mirror in mirror_list_file:
             match = re.match(url_pattern, mirror)
-            if not match:
-                continue
+            if match:
+                mirror_urls.append(match.group(2).strip())
+    return mirror_urls
 
-            mirror_url = match.group(2)
-            try:
-                get_repomd_file(remote, mirror_url)
-                # just check if the metadata exists
-                return mirror_url
-            except Exception as exc:
-                log.warning(
-                    "Url '{}' from mirrorlist was tried and failed with error: {}".format(
-                        mirror_url, exc
+
+async def probe_mirrors(remote, mirror_urls, count):
+    """
+    Download the repomd.xml of all mirrors concurrently, until `count` of them succeeded.
+
+    The mirrors are ranked in the order their repomd.xml was downloaded and parsed, which accounts
+    for both their latency and their throughput. Slower mirrors are not waited for, so a mirror
+    which doesn't respond at all doesn't delay the sync.
+
+    Args:
+        remote (RpmRemote): The remote to download with.
+        mirror_urls (list): The URLs of the mirrors to probe.
+        count (int): How many mirrors to rank.
+
+    Returns:
+        list: Tuples of the mirror URL and its FetchedRepomd, fastest first.
+
+    """
+
+    async def probe(mirror_url):
+        downloader = remote.get_downloader(
+            url=urlpath_sanitize(mirror_url.split("?")[0], "repodata/repomd.xml")
+        )
+        result = await downloader.run()
+        return FetchedRepomd(result, cr.Repomd(result.path))
+
+    pending = {asyncio.ensure_future(probe(mirror_url)): mirror_url for mirror_url in mirror_urls}
+    ranked = []
+    try:
+        while pending and len(ranked) < count:
+            done, not_done = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                mirror_url = pending.pop(future)
+                try:
+                    ranked.append((mirror_url, future.result()))
+                except Exception as exc:
+                    log.warning(
+                        "Url '{}' from mirrorlist was tried and failed with error: {}".format(
+                            mirror_url, exc
+                        )
                     )
+    finally:
+        for future in pending:
+            future.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+    return ranked[:count]
+
+
+def rank_mirrors(remote, session=None):
+    """Get the fastest healthy mirrors from a mirror list feed, fastest first.
+
+    The ranking is cached per remote for `RPM_MIRROR_RANKING_TTL` seconds. While it is cached,
+    the mirrors are not probed again, only the first one which still works is checked.
+
+    Args:
+        remote (RpmRemote): The remote with the mirror list feed URL.
+        session (RepomdSession): Where to keep the downloaded repomd.xml files.
+
+    Returns:
+        list: Up to `RPM_MIRROR_FAILOVER_COUNT` mirror URLs.
+
+    """
+    session = session or RepomdSession(remote)
+    cache_key = "pulp_rpm:mirror_ranking:{}:{}".format(
+        remote.pk, hashlib.sha256(remote.url.encode()).hexdigest()
+    )
+    ranking = cache.get(cache_key) or []
+    for position, mirror_url in enumerate(ranking):
+        try:
+            session.get(mirror_url)
+        except Exception as exc:
+            log.warning(
+                "Url '{}' from mirrorlist was tried and failed with error: {}".format(
+                    mirror_url, exc
                 )
-                continue
+            )
+            continue
+        return ranking[position:]
 
-    return None
+    mirror_urls = read_mirrorlist(remote)
+    ranked = asyncio.get_event_loop().run_until_complete(
+        probe_mirrors(remote, mirror_urls, RPM_MIRROR_FAILOVER_COUNT)
+    )
+    for mirror_url, fetched in ranked:
+        session.add(mirror_url, fetched)
+    ranking = [mirror_url for mirror_url, fetched in ranked]
+    if ranking:
+        cache.set(cache_key, ranking, RPM_MIRROR_RANKING_TTL)
+    return ranking
 
 
-def fetch_remote_url(remote, custom_url=None):
-    """Fetch a single remote from which can be content synced."""
+def fetch_remote_url(remote, custom_url=None, session=None):
+    """Fetch a single remote from which can be content synced.
+
+    The repomd.xml downloaded to check the URL is kept in the `session`, if one is passed, and so
+    are the fastest mirrors if the URL is a mirror list feed.
+    """
 
     def normalize_url(url_to_normalize):
         return url_to_normalize.rstrip("/") + "/"
 
     url = custom_url or remote.url
+    session = session or RepomdSession(remote)
 
     try:
         normalized_remote_url = normalize_url(url)
-        get_repomd_file(remote, normalized_remote_url)
+        session.get(normalized_remote_url)
         # just check if the metadata exists
         return normalized_remote_url
     except ClientResponseError as exc:
@@ -301,28 +641,112 @@ def fetch_remote_url(remote, custom_url=None):
         log.info(
             _("Attempting to resolve a true url from potential mirrolist url '{}'").format(url)
         )
-        remote_url = fetch_mirror(remote)
-        if remote_url:
+        mirror_urls = rank_mirrors(remote, session=session)
+        if mirror_urls:
+            remote_url = mirror_urls[0]
             log.info(
                 _("Using url '{}' from mirrorlist in place of the provided url {}").format(
                     remote_url, url
                 )
             )
+            session.mirror_urls = [normalize_url(mirror_url) for mirror_url in mirror_urls]
             return normalize_url(remote_url)
 
         raise RemoteFetchError(url, exc.status, exc.message)
 
 
-def should_optimize_sync(sync_details, last_sync_details):
+# The state of the call made by run_concurrently() in the current worker thread
+_worker_call = threading.local()
+
+
+def remote_for_event_loop(remote):
     """
-    Check whether the sync should be optimized by comparing its parameters with the previous sync.
+    Get the copy of a remote to download with in the event loop of the current thread.
+
+    The downloaders of a remote share an aiohttp session, which can only be used in the event loop
+    it was created in. Each call made by run_concurrently() in a worker thread has its own event
+    loop, so it gets its own copy of the remote, fetched from the database on first use.
+
+    Args:
+        remote (RpmRemote or UlnRemote): The remote of the task
+
+    Returns:
+        RpmRemote or UlnRemote: The remote itself outside of worker threads, or the copy of it of
+            the current call otherwise.
+    """
+    remotes = getattr(_worker_call, "remotes", None)
+    if remotes is None:
+        return remote
+    if remote.pk not in remotes:
+        remotes[remote.pk] = type(remote).objects.get(pk=remote.pk)
+    return remotes[remote.pk]
+
+
+def _close_download_sessions(loop, remotes):
+    """
+    Close the aiohttp sessions the downloaders of the remotes created in an event loop.
+    """
+    for remote in remotes:
+        factory = getattr(remote, "_download_factory", None)
+        session = getattr(factory, "_session", None)
+        if session is not None and not session.closed:
+            loop.run_until_complete(session.close())
+
+
+def _call_in_worker_thread(context, func, *args):
+    """
+    Call a function in the context of the task, in a worker thread with its own event loop.
+    """
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    _worker_call.remotes = {}
+    try:
+        return context.run(func, *args)
+    finally:
+        _close_download_sessions(loop, _worker_call.remotes.values())
+        del _worker_call.remotes
+        asyncio.set_event_loop(None)
+        loop.close()
+        # Each thread has its own database connections
+        connections.close_all()
+
+
+def run_concurrently(func, args_list, max_workers):
+    """
+    Call a function with each of the argument tuples, in up to `max_workers` threads.
+
+    The function may download (or otherwise run an event loop) and use the database. It must
+    download with the remote returned by `remote_for_event_loop()`. With a single worker, or a
+    single call, the calls are made one after another in this thread.
+
+    Returns:
+        list: The results, in the order of `args_list`.
+
+    Raises:
+        The exception raised by the first failing call, after all calls have finished.
+    """
+    if max_workers <= 1 or len(args_list) <= 1:
+        return [func(*args) for args in args_list]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_call_in_worker_thread, contextvars.copy_context(), func, *args)
+            for args in args_list
+        ]
+    return [future.result() for future in futures]
+
+
+def is_sync_config_unchanged(sync_details, last_sync_details):
+    """
+    Check whether the sync can build upon the content of the previous sync.
 
     Args:
         sync_details (dict): A collection of details about the current sync configuration.
         last_sync_details (dict): A collection of details about the previous sync configuration.
 
     Returns:
-        bool: True, if sync is optimized; False, otherwise.
+        bool: True, if the previous sync was configured the same way and the repository
+            hasn't been modified since; False, otherwise.
 
     """
     might_download_content = (
@@ -346,6 +770,24 @@ def should_optimize_sync(sync_details, last_sync_details):
     if url_has_changed or repository_has_been_modified or retain_package_versions_has_changed:
         return False
 
+    return True
+
+
+def should_optimize_sync(sync_details, last_sync_details):
+    """
+    Check whether the sync should be optimized by comparing its parameters with the previous sync.
+
+    Args:
+        sync_details (dict): A collection of details about the current sync configuration.
+        last_sync_details (dict): A collection of details about the previous sync configuration.
+
+    Returns:
+        bool: True, if sync is optimized; False, otherwise.
+
+    """
+    if not is_sync_config_unchanged(sync_details, last_sync_details):
+        return False
+
     old_revision = is_previous_version(sync_details["revision"], last_sync_details.get("revision"))
     same_revision = last_sync_details.get("revision") == sync_details["revision"]
     same_repomd_checksum = (
@@ -360,6 +802,41 @@ def should_optimize_sync(sync_details, last_sync_details):
     return True
 
 
+def unchanged_repodata(sync_details, last_sync_details):
+    """
+    Find the types of metadata which haven't changed since the previous sync.
+
+    Args:
+        sync_details (dict): A collection of details about the current sync configuration.
+        last_sync_details (dict): A collection of details about the previous sync configuration.
+
+    Returns:
+        set: The types of the repomd.xml records with the same checksum as in the previous sync,
+            including the types neither sync had. Empty if the content of the previous sync
+            can't be built upon.
+
+    """
+    last_checksums = last_sync_details.get("repomd_checksums")
+    if last_checksums is None or not is_sync_config_unchanged(sync_details, last_sync_details):
+        return set()
+    if last_sync_details.get("skip_types") != sync_details["skip_types"]:
+        return set()
+
+    checksums = sync_details["repomd_checksums"]
+    all_types = (
+        set(checksums)
+        | set(PACKAGE_REPODATA)
+        | set(UPDATE_REPODATA)
+        | set(COMPS_REPODATA)
+        | set(MODULAR_REPODATA)
+    )
+    return {
+        record_type
+        for record_type in all_types
+        if checksums.get(record_type) == last_checksums.get(record_type)
+    }
+
+
 def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url=None, **kwargs):
     """
     Sync content from the remote repository.
@@ -403,10 +880,22 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
     log.info(_("Synchronizing: repository={r} remote={p}").format(r=repository.name, p=remote.name))
 
     deferred_download = remote.policy != Remote.IMMEDIATE  # Interpret download policy
+    mirror = sync_policy.startswith("mirror")
+    mirror_metadata = sync_policy == SYNC_POLICIES.MIRROR_COMPLETE
+    # The metadata files and package locations are only needed for the mirrored publication
+    mirroring_store = MirroringStore() if mirror_metadata else None
     skip_treeinfo = "treeinfo" in skip_types
+    # The repomd.xml and treeinfo of each URL are downloaded only once
+    repomd_session = RepomdSession(remote)
+    treeinfo_by_url = {}
 
     def get_treeinfo_data(remote, remote_url):
         """Get Treeinfo data from remote."""
+        if remote_url not in treeinfo_by_url:
+            treeinfo_by_url[remote_url] = fetch_treeinfo_data(remote, remote_url)
+        return treeinfo_by_url[remote_url]
+
+    def fetch_treeinfo_data(remote, remote_url):
         treeinfo_serialized = {}
         if skip_treeinfo:
             return treeinfo_serialized
@@ -454,7 +943,8 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             )
             treeinfo_file = tempfile.NamedTemporaryFile(dir=".", delete=False)
             treeinfo.dump(treeinfo_file.name, main_variant=main_variant)
-            store_metadata_for_mirroring(repository, treeinfo_file.name, namespace)
+            if mirroring_store:
+                mirroring_store.add_metadata_file(repository, namespace, treeinfo_file.name)
             break
 
         return treeinfo_serialized
@@ -462,10 +952,8 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
     def get_sync_details(remote, url, sync_policy, repository):
         version = repository.latest_version()
         with tempfile.TemporaryDirectory(dir="."):
-            result = get_repomd_file(remote, url)
-            repomd_path = result.path
-            repomd = cr.Repomd(repomd_path)
-            repomd_checksum = get_sha256(repomd_path)
+            result, repomd = repomd_session.get(url)
+            repomd_checksum = get_sha256(result.path)
             treeinfo_file_data = get_treeinfo_data(remote, url)
             treeinfo_checksum = treeinfo_file_data.get("hash", "")
 
@@ -476,13 +964,12 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             "most_recent_version": version.number,
             "revision": repomd.revision,
             "repomd_checksum": repomd_checksum,
+            "repomd_checksums": {record.type: record.checksum for record in repomd.records},
             "treeinfo_checksum": treeinfo_checksum,
             "retain_package_versions": repository.retain_package_versions,
+            "skip_types": sorted(skip_types),
         }
 
-    mirror = sync_policy.startswith("mirror")
-    mirror_metadata = sync_policy == SYNC_POLICIES.MIRROR_COMPLETE
-
     repo_sync_config = {}
     # this is the "directory" of the repo within the target repo location - for the primary
     # repo, they are the same
@@ -492,12 +979,13 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
         return directory != PRIMARY_REPO
 
     with tempfile.TemporaryDirectory(dir="."):
-        remote_url = fetch_remote_url(remote, url)
+        remote_url = fetch_remote_url(remote, url, session=repomd_session)
 
         # Find and set up to deal with any subtrees
         treeinfo = get_treeinfo_data(remote, remote_url)
         if treeinfo:
             treeinfo["repositories"] = {}
+            sub_repos = []
             for repodata in set(treeinfo["download"]["repodatas"]):
                 if repodata == DIST_TREE_MAIN_REPO_PATH:
                     treeinfo["repositories"].update({repodata: None})
@@ -510,15 +998,27 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
                 treeinfo["repositories"].update({directory: str(sub_repo.pk)})
                 path = f"{repodata}/"
                 new_url = urlpath_sanitize(remote_url, path)
+                sub_repos.append((directory, sub_repo, new_url))
 
+            def get_subrepo_sync_details(directory, sub_repo, new_url):
                 try:
-                    subrepo_sync_details = get_sync_details(remote, new_url, sync_policy, sub_repo)
+                    return get_sync_details(
+                        remote_for_event_loop(remote), new_url, sync_policy, sub_repo
+                    )
                 except ClientResponseError as exc:
                     if is_subrepo(directory) and exc.status == 404:
                         log.warning("Unable to sync sub-repo '{}' from treeinfo.".format(directory))
-                        continue
+                        return None
                     raise exc
 
+            all_subrepo_sync_details = run_concurrently(
+                get_subrepo_sync_details, sub_repos, MAX_SUBREPO_SYNC_WORKERS
+            )
+            for (directory, sub_repo, new_url), subrepo_sync_details in zip(
+                sub_repos, all_subrepo_sync_details
+            ):
+                if subrepo_sync_details is None:
+                    continue
                 repo_sync_config[directory] = {
                     "should_skip": should_optimize_sync(
                         subrepo_sync_details, sub_repo.last_sync_details
@@ -549,21 +1049,26 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
 
         skipped_syncs = 0
         repo_sync_results = {}
+        if RPM_SYNC_CHECKPOINTS and not deferred_download:
+            SyncCheckpoint.remove_expired()
 
-        # If some repos need to be synced and others do not, we go through them all
-        # items() returns in insertion-order - make sure PRIMARY is the LAST thing we process
-        # here, or autopublish will fail to find any subrepo-content.
-        for directory, repo_config in repo_sync_config.items():
+        def sync_repo(directory, repo_config):
             repo = repo_config["repo"]
-            # If metadata_mirroring is enabled we cannot skip any syncs, because the generated
-            # publication needs to contain exactly the same metadata at the same paths.
-            if not mirror_metadata and optimize and repo_config["should_skip"]:
-                skipped_syncs += 1
-                repo_sync_results[directory] = repo.latest_version()
-                continue
+            repo_remote = remote_for_event_loop(remote)
+            # Packages can also be downloaded from the other fastest mirrors
+            relative_path = repo_config["url"][len(remote_url) :]
+            mirror_urls = [
+                urlpath_sanitize(mirror_url, relative_path)
+                for mirror_url in repomd_session.mirror_urls
+            ]
 
+            checkpoint = (
+                SyncCheckpoint(repo, repo_remote)
+                if RPM_SYNC_CHECKPOINTS and not deferred_download
+                else None
+            )
             stage = RpmFirstStage(
-                remote,
+                repo_remote,
                 repo,
                 deferred_download,
                 mirror_metadata,
@@ -571,16 +1076,52 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
                 new_url=repo_config["url"],
                 treeinfo=(treeinfo if not is_subrepo(directory) else None),
                 namespace=directory,
+                repomd=repomd_session.get(repo_config["url"]),
+                mirror_urls=mirror_urls,
+                mirroring_store=mirroring_store,
+                unchanged_repodata=(
+                    unchanged_repodata(repo_config["sync_details"], repo.last_sync_details)
+                    if optimize and not mirror_metadata
+                    else None
+                ),
+                checkpoint=checkpoint,
             )
 
-            dv = RpmDeclarativeVersion(first_stage=stage, repository=repo, mirror=mirror)
+            dv = RpmDeclarativeVersion(
+                first_stage=stage, repository=repo, mirror=mirror, namespace=directory
+            )
             repo_version = dv.create() or repo.latest_version()
+            if checkpoint:
+                checkpoint.remove()
 
             repo_config["sync_details"]["most_recent_version"] = repo_version.number
             repo.last_sync_details = repo_config["sync_details"]
             repo.save()
 
+            return repo_version
+
+        # If some repos need to be synced and others do not, we go through them all.
+        # If metadata_mirroring is enabled we cannot skip any syncs, because the generated
+        # publication needs to contain exactly the same metadata at the same paths.
+        repos_to_sync = []
+        for directory, repo_config in repo_sync_config.items():
+            if not mirror_metadata and optimize and repo_config["should_skip"]:
+                skipped_syncs += 1
+                repo_sync_results[directory] = repo_config["repo"].latest_version()
+            else:
+                repos_to_sync.append((directory, repo_config))
+
+        # Make sure PRIMARY is the LAST thing we sync, after all of the sub-repos (which may be
+        # synced concurrently) have finished, or autopublish will fail to find any
+        # subrepo-content.
+        subrepos_to_sync = [(d, config) for d, config in repos_to_sync if is_subrepo(d)]
+        subrepo_versions = run_concurrently(sync_repo, subrepos_to_sync, MAX_SUBREPO_SYNC_WORKERS)
+        for (directory, repo_config), repo_version in zip(subrepos_to_sync, subrepo_versions):
             repo_sync_results[directory] = repo_version
+        if PRIMARY_REPO not in repo_sync_results:
+            repo_sync_results[PRIMARY_REPO] = sync_repo(
+                PRIMARY_REPO, repo_sync_config[PRIMARY_REPO]
+            )
 
     if skipped_syncs:
         with ProgressReport(
@@ -594,8 +1135,8 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             repo_sync_results[PRIMARY_REPO], pass_through=False
         ) as publication:
             gpgcheck = repository.repo_config.get("gpgcheck", 0)
-            has_repomd_signature = (
-                "repodata/repomd.xml.asc" in metadata_files_for_mirroring[str(repository.pk)].keys()
+            has_repomd_signature = "repodata/repomd.xml.asc" in dict(
+                mirroring_store.metadata_files(repository)
             )
             repo_gpgcheck = has_repomd_signature and repository.repo_config.get("repo_gpgcheck", 0)
 
@@ -606,7 +1147,8 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
             }
 
             for path, repo_version in repo_sync_results.items():
-                add_metadata_to_publication(publication, repo_version, prefix=path)
+                add_metadata_to_publication(publication, repo_version, mirroring_store, prefix=path)
+        mirroring_store.close()
 
     try:
         # This isn't exported for plugins until core/3.88 - but neither is the deprecation around
@@ -622,19 +1164,125 @@ def synchronize(remote_pk, repository_pk, sync_policy, skip_types, optimize, url
         return None
 
 
+class ExistingPackages:
+    """
+    A compact index of the packages in a repository version, by pkgId.
+
+    Only the fields needed to add a package to a sync are kept, in a tuple per package, and the
+    Package is only created when it is looked up. All other fields of it are deferred.
+    """
+
+    # In the order of Package._meta.concrete_fields, as expected by Package.from_db()
+    FIELDS = (
+        "pk",
+        "name",
+        "epoch",
+        "version",
+        "release",
+        "arch",
+        "pkgId",
+        "checksum_type",
+        "location_href",
+        "size_package",
+    )
+    __slots__ = ("_packages",)
+
+    def __init__(self, packages=()):
+        """
+        Args:
+            packages: An iterable of tuples of values for `FIELDS`.
+        """
+        self._packages = {}
+        self.update(packages)
+
+    def update(self, packages):
+        """
+        Add packages to the index.
+
+        Args:
+            packages: An iterable of tuples of values for `FIELDS`.
+        """
+        intern = sys.intern
+        for pk, name, epoch, version, release, arch, pkgId, *rest in packages:
+            # Names, architectures etc. are shared by many packages
+            self._packages[pkgId] = (
+                pk,
+                intern(name),
+                intern(epoch),
+                intern(version),
+                intern(release),
+                intern(arch),
+                *rest,
+            )
+
+    @classmethod
+    def from_repository_version(cls, repository_version):
+        """
+        Build the index for the packages in a repository version.
+        """
+        if repository_version is None:
+            return cls()
+        packages = (
+            Package.objects.filter(pk__in=repository_version.content)
+            .values_list(*cls.FIELDS)
+            .iterator()
+        )
+        return cls(packages)
+
+    def __contains__(self, pkgId):
+        return pkgId in self._packages
+
+    def __len__(self):
+        return len(self._packages)
+
+    def pop(self, pkgId, default=None):
+        """
+        Remove the package with the pkgId from the index and return it as a saved Package.
+        """
+        values = self._packages.pop(pkgId, None)
+        if values is None:
+            return default
+        pk, name, epoch, version, release, arch, *rest = values
+        # The primary key of Package is the pointer to its Content
+        return Package.from_db(
+            Package.objects.db,
+            ("pulp_id", "pulp_type", "content_ptr_id", *self.FIELDS[1:]),
+            (pk, Package.get_pulp_type(), pk, name, epoch, version, release, arch, pkgId, *rest),
+        )
+
+
 class RpmDeclarativeVersion(DeclarativeVersion):
     """
     Subclassed Declarative version creates a custom pipeline for RPM sync.
     """
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, namespace="", **kwargs):
         """
         Adding support for ACS.
 
         Adding it here, because we call RpmDeclarativeVersion multiple times in sync.
+
+        Keyword Args:
+            namespace(str): Path where this repo is located relative to some parent repo.
         """
         kwargs["acs"] = True
         super().__init__(*args, **kwargs)
+        self.namespace = namespace
+        self.profiler = None
+
+    def create(self):
+        """
+        Perform the work, profiling the pipeline if the task asked for it.
+
+        Returns: The created RepositoryVersion or None if it represents no change from the latest.
+        """
+        if stage_profiling_requested():
+            self.profiler = PipelineProfiler()
+        new_version = super().create()
+        if self.profiler:
+            # each repository of a kickstart tree is synced with its own pipeline
+            self.profiler.save(stage_profile_name(self.namespace))
+        return new_version
 
     def pipeline_stages(self, new_version):
         """
@@ -668,6 +1316,11 @@ class RpmDeclarativeVersion(DeclarativeVersion):
                 RemoteArtifactSaver(fix_mismatched_remote_artifacts=True),
             ]
         )
+        checkpoint = getattr(self.first_stage, "checkpoint", None)
+        if checkpoint:
+            pipeline.append(SyncCheckpointRecorder(checkpoint))
+        if self.profiler:
+            pipeline = self.profiler.wrap(pipeline)
         return pipeline
 
 
@@ -679,6 +1332,18 @@ class RpmFirstStage(Stage):
     that should exist in the new :class:`~pulpcore.plugin.models.RepositoryVersion`.
     """
 
+    # The content which is carried forward from the latest repository version when none of the
+    # types of metadata it is parsed from have changed since the previous sync. Packages and
+    # modules are related to each other, so they're parsed together.
+    CARRY_FORWARD = (
+        (
+            PACKAGE_REPODATA + MODULAR_REPODATA,
+            (Package, Modulemd, ModulemdDefaults, ModulemdObsolete),
+        ),
+        (COMPS_REPODATA, (PackageGroup, PackageCategory, PackageEnvironment, PackageLangpacks)),
+        (UPDATE_REPODATA, (UpdateRecord,)),
+    )
+
     def __init__(
         self,
         remote,
@@ -689,6 +1354,11 @@ class RpmFirstStage(Stage):
         new_url=None,
         treeinfo=None,
         namespace="",
+        repomd=None,
+        mirror_urls=None,
+        mirroring_store=None,
+        unchanged_repodata=None,
+        checkpoint=None,
     ):
         """
         The first stage of a pulp_rpm sync pipeline.
@@ -706,6 +1376,16 @@ class RpmFirstStage(Stage):
             new_url(str): URL to replace remote url
             treeinfo(dict): Treeinfo data
             namespace(str): Path where this repo is located relative to some parent repo.
+            repomd(FetchedRepomd): The already downloaded repomd.xml of the repository
+            mirror_urls(list): URLs of mirrors of the repository packages can be downloaded from,
+                fastest first, starting with the URL the repository is synced from
+            mirroring_store(MirroringStore): Where to keep the metadata files and package
+                locations for the mirrored publication, if mirroring metadata
+            unchanged_repodata(set): The types of metadata which haven't changed since the
+                previous sync, the content parsed from them is carried forward from the latest
+                repository version instead
+            checkpoint(SyncCheckpoint): The packages saved by the previous syncs which failed,
+                to resume from
 
         """
         super().__init__()
@@ -721,13 +1401,48 @@ class RpmFirstStage(Stage):
         self.namespace_depth = 0 if not namespace else len(namespace.strip("/").split("/"))
 
         self.treeinfo = treeinfo
+        self.repomd = repomd
         self.skip_types = [] if skip_types is None else skip_types
 
         self.remote_url = new_url or self.remote.url
+        self.mirror_urls = mirror_urls or []
+        self.mirroring_store = mirroring_store
+        self.checkpoint = checkpoint
+        # The packages which were saved along with their artifacts by a previous sync which failed
+        self.resumed_pkgids = set()
+
+        unchanged_repodata = unchanged_repodata or set()
+        self.carried_repodata = set()
+        self.carried_models = []
+        for repodata, models in self.CARRY_FORWARD:
+            if unchanged_repodata.issuperset(repodata):
+                self.carried_repodata.update(repodata)
+                self.carried_models.extend(models)
 
         self.nevra_to_module = defaultdict(dict)
         self.pkgname_to_groups = defaultdict(list)
 
+    def store_metadata_for_mirroring(self, md_path, relative_path):
+        """Keep a downloaded metadata file for the mirrored publication, if mirroring metadata."""
+        if self.mirroring_store:
+            self.mirroring_store.add_metadata_file(self.repository, relative_path, md_path)
+
+    def get_package_urls(self, location_base, location_href):
+        """
+        The URLs a package can be downloaded from.
+
+        If the repository is synced from a mirror list feed, packages are downloaded from all of the
+        fastest mirrors, failing over to the next mirror if one fails.
+        """
+        if location_base or not self.mirror_urls:
+            return [urlpath_sanitize(location_base or self.remote_url, location_href)]
+        urls = [urlpath_sanitize(mirror_url, location_href) for mirror_url in self.mirror_urls]
+        if not self.deferred_download:
+            # Spread the downloads over the mirrors
+            start = zlib.crc32(location_href.encode()) % len(urls)
+            urls = urls[start:] + urls[:start]
+        return urls
+
     def is_illegal_relative_path(self, path):
         """Whether a relative path points outside the repository being synced."""
         return path.count("../") > self.namespace_depth
@@ -757,17 +1472,18 @@ class RpmFirstStage(Stage):
                 message="Downloading Metadata Files", code="sync.downloading.metadata"
             )
             async with ProgressReport(**progress_data) as metadata_pb:
-                # download repomd.xml
-                downloader = self.remote.get_downloader(
-                    url=urlpath_sanitize(self.remote_url, "repodata/repomd.xml")
-                )
-                result = await downloader.run()
-                store_metadata_for_mirroring(self.repository, result.path, "repodata/repomd.xml")
+                # download repomd.xml, unless it already was
+                if self.repomd:
+                    result, repomd = self.repomd
+                else:
+                    downloader = self.remote.get_downloader(
+                        url=urlpath_sanitize(self.remote_url, "repodata/repomd.xml")
+                    )
+                    result = await downloader.run()
+                    repomd = cr.Repomd(result.path)
+                self.store_metadata_for_mirroring(result.path, "repodata/repomd.xml")
                 await metadata_pb.aincrement()
 
-                repomd_path = result.path
-                repomd = cr.Repomd(repomd_path)
-
                 if repomd.warnings:
                     for warn_type, warn_msg in repomd.warnings:
                         log.warn(warn_msg)
@@ -794,6 +1510,27 @@ class RpmFirstStage(Stage):
                     result = await downloader.run()
                     return name, location_href, result
 
+                async def run_zchunk_download(name, location_href, downloader, zck_record):
+                    try:
+                        result = await self.download_zchunk(zck_record)
+                    except (
+                        ZchunkError,
+                        ClientError,
+                        OSError,
+                        asyncio.TimeoutError,
+                        DigestValidationError,
+                        SizeValidationError,
+                    ) as exc:
+                        log.info(
+                            "Downloading '{}' failed with error: {}, downloading '{}' instead".format(
+                                zck_record.location_href, exc, location_href
+                            )
+                        )
+                        result = await downloader.run()
+                    return name, location_href, result
+
+                records_by_type = {record.type: record for record in repomd.records}
+
                 for record in repomd.records:
                     record_checksum_type = getattr(CHECKSUM_TYPES, record.checksum_type.upper())
                     checksum_types[record.type] = record_checksum_type
@@ -810,7 +1547,9 @@ class RpmFirstStage(Stage):
                         ):
                             raise MirrorIncompatibleRepositoryError()
 
-                    if not self.mirror_metadata and record.type not in types_to_download:
+                    if not self.mirror_metadata and (
+                        record.type not in types_to_download or record.type in self.carried_repodata
+                    ):
                         continue
 
                     base_url = record.location_base or self.remote_url
@@ -819,6 +1558,14 @@ class RpmFirstStage(Stage):
                         expected_size=record.size,
                         expected_digests={record_checksum_type: record.checksum},
                     )
+                    zck_record = records_by_type.get(f"{record.type}_zck")
+                    if RPM_ZCHUNK_SYNC and zck_record and not self.mirror_metadata:
+                        repomd_downloaders[record.type] = asyncio.ensure_future(
+                            run_zchunk_download(
+                                record.type, record.location_href, downloader, zck_record
+                            )
+                        )
+                        continue
                     repomd_downloaders[record.type] = asyncio.ensure_future(
                         run_repomdrecord_download(record.type, record.location_href, downloader)
                     )
@@ -826,7 +1573,7 @@ class RpmFirstStage(Stage):
                 try:
                     for future in asyncio.as_completed(list(repomd_downloaders.values())):
                         name, location_href, result = await future
-                        store_metadata_for_mirroring(self.repository, result.path, location_href)
+                        self.store_metadata_for_mirroring(result.path, location_href)
                         repomd_files[name] = result
                         await metadata_pb.aincrement()
                 except ClientResponseError as exc:
@@ -847,7 +1594,7 @@ class RpmFirstStage(Stage):
                                 silence_errors_for_response_status_codes={403, 404},
                             )
                             result = await downloader.run()
-                            store_metadata_for_mirroring(self.repository, result.path, file_href)
+                            self.store_metadata_for_mirroring(result.path, file_href)
                             await metadata_pb.aincrement()
                         except (ClientResponseError, FileNotFoundError):
                             pass
@@ -859,9 +1606,7 @@ class RpmFirstStage(Stage):
                             silence_errors_for_response_status_codes={403, 404},
                         )
                         result = await downloader.run()
-                        store_metadata_for_mirroring(
-                            self.repository, result.path, "extra_files.json"
-                        )
+                        self.store_metadata_for_mirroring(result.path, "extra_files.json")
                         await metadata_pb.aincrement()
                     except (ClientResponseError, FileNotFoundError):
                         pass
@@ -881,9 +1626,7 @@ class RpmFirstStage(Stage):
                                         expected_digests=filtered_checksums,
                                     )
                                     result = await downloader.run()
-                                    store_metadata_for_mirroring(
-                                        self.repository, result.path, data["file"]
-                                    )
+                                    self.store_metadata_for_mirroring(result.path, data["file"])
                                     await metadata_pb.aincrement()
                         except ClientResponseError as exc:
                             raise RemoteFetchError(
@@ -896,6 +1639,40 @@ class RpmFirstStage(Stage):
 
             await self.parse_repository_metadata(repomd, repomd_files)
 
+    async def download_zchunk(self, record):
+        """
+        Download a zchunk metadata file, reusing the chunks of the one downloaded by the last sync.
+
+        The downloaded file is kept for the next sync of the same repository with this remote.
+
+        Args:
+            record (createrepo_c.RepomdRecord): The repomd.xml record of the zchunk file
+
+        Returns:
+            pulpcore.plugin.download.DownloadResult: The downloaded zchunk file
+
+        """
+        record.checksum_type = getattr(CHECKSUM_TYPES, record.checksum_type.upper())
+        url = urlpath_sanitize(record.location_base or self.remote_url, record.location_href)
+        cache_path = zchunk_cache_path(self.remote, urlpath_sanitize(self.remote_url, record.type))
+        downloader = self.remote.get_downloader(
+            url=url,
+            expected_size=record.size,
+            expected_digests={record.checksum_type: record.checksum},
+        )
+        # e.g. file:// remotes can only download the whole file
+        if os.path.exists(cache_path) and supports_range_requests(downloader):
+            result, downloaded = await download_zchunk_delta(downloader, record, cache_path)
+            log.info(
+                "Downloaded {} of {} bytes of '{}', reused the rest from the last sync".format(
+                    downloaded, record.size, url
+                )
+            )
+        else:
+            result = await downloader.run()
+        update_zchunk_cache(result.path, cache_path)
+        return result
+
     async def parse_distribution_tree(self):
         """Parse content from the file treeinfo if present."""
         if self.treeinfo:
@@ -926,18 +1703,52 @@ class RpmFirstStage(Stage):
             dc.extra_data = self.treeinfo
             await self.put(dc)
 
+    async def carry_forward_content(self):
+        """
+        Pass on the content of the latest repository version parsed from unchanged metadata.
+
+        The content is passed on as saved, partially loaded objects, so that the later stages
+        only associate it with the new repository version.
+        """
+
+        def _carried_content():
+            latest_version = self.repository.latest_version()
+            return [
+                content
+                for model in self.carried_models
+                for content in model.objects.filter(pk__in=latest_version.content)
+                .only("pulp_id", "pulp_type")
+                .iterator()
+            ]
+
+        if not self.carried_models:
+            return
+
+        log.info(
+            "Metadata '{}' unchanged since the previous sync, carrying its content forward".format(
+                "', '".join(sorted(self.carried_repodata))
+            )
+        )
+        for content in await sync_to_async(_carried_content)():
+            dc = DeclarativeContent(content=content)
+            dc.extra_data = defaultdict(list)
+            await self.put(dc)
+
     async def parse_repository_metadata(self, repomd, metadata_results):
         """Parse repository metadata."""
-        if "primary" not in metadata_results.keys():
-            raise MissingPrimaryMetadataError()
+        parse_packages = "primary" not in self.carried_repodata
+        if parse_packages:
+            if "primary" not in metadata_results.keys():
+                raise MissingPrimaryMetadataError()
 
-        if "filelists" not in metadata_results.keys():
-            log.warn("Repository doesn't contain metadata file 'filelists.xml'")
+            if "filelists" not in metadata_results.keys():
+                log.warn("Repository doesn't contain metadata file 'filelists.xml'")
 
-        if "other" not in metadata_results.keys():
-            log.warn("Repository doesn't contain metadata file 'other.xml'")
+            if "other" not in metadata_results.keys():
+                log.warn("Repository doesn't contain metadata file 'other.xml'")
 
         await self.parse_distribution_tree()
+        await self.carry_forward_content()
 
         # modularity-parsing MUST COME BEFORE package-parsing!
         # The only way to know if a package is 'modular' in a repo, is to
@@ -955,12 +1766,13 @@ class RpmFirstStage(Stage):
             modulemd_dcs, modulemd_list = await self.parse_modules_metadata(modulemd_result)
 
         # **Now** we can successfully parse package-metadata
-        await self.parse_packages(
-            metadata_results.get("primary"),
-            metadata_results.get("filelists"),
-            metadata_results.get("other"),
-            modulemd_list=modulemd_list,
-        )
+        if parse_packages:
+            await self.parse_packages(
+                metadata_results.get("primary"),
+                metadata_results.get("filelists"),
+                metadata_results.get("other"),
+                modulemd_list=modulemd_list,
+            )
 
         groups_list = []
         comps_result = metadata_results.get("group", None)
@@ -1204,8 +2016,9 @@ class RpmFirstStage(Stage):
 
         # skip SRPM if defined
         skip_srpms = "srpm" in self.skip_types
-        nevras = set()
-        checksums = set()
+        mirroring_store = self.mirroring_store
+        # only used to warn about duplicates, so the (much smaller) hashes are good enough
+        checksum_hashes = set()
         modular_artifact_nevras = set()
         pkgid_warning_triggered = False
         nevra_warning_triggered = False
@@ -1222,10 +2035,35 @@ class RpmFirstStage(Stage):
         # {"x86_64": {"glibc": [...]}, "i686": {"glibc": [...], "src": {"glibc": [...]}}
         latest_packages_by_arch_and_name = defaultdict(lambda: defaultdict(list))
         # duplicate NEVRA tiebreaker - if we have multiple packages with the same nevra then
-        # we might want to pick the latest based on the build time.
-        latest_build_time_by_nevra = {}
-        # A list of package names seen in which order - used to calculate heuristics used by caching
-        pkg_names_seen_order = []
+        # we might want to pick the latest based on the build time. Maps each NEVRA to the
+        # (build time, position in primary.xml) of the package picked so far.
+        latest_package_by_nevra = {}
+        # The ids of the package names in the order they were seen - used to calculate heuristics
+        # used by caching
+        pkg_name_ids = {}
+        pkg_name_ids_seen_order = array("I")
+        # The CRC32 of the NEVRA of every package, by position in primary.xml. The second pass
+        # relies on the packages being read in the same order, this is used to verify that.
+        nevra_crcs = array("I")
+
+        # Pre-load existing packages from the latest repo version keyed by pkgId.
+        # Cache hits reuse the saved model object, causing QueryExistingContents to
+        # skip them (because _state.adding is False on already-saved objects).
+        def _build_existing_packages_cache():
+            existing_packages = ExistingPackages.from_repository_version(
+                self.repository.latest_version()
+            )
+            if self.checkpoint:
+                resumed_packages = self.checkpoint.saved_packages()
+                pkgid_index = ExistingPackages.FIELDS.index("pkgId")
+                self.resumed_pkgids = {package[pkgid_index] for package in resumed_packages}
+                existing_packages.update(resumed_packages)
+            return existing_packages
+
+        existing_packages = await sync_to_async(_build_existing_packages_cache)()
+
+        # The positions of the packages already in the repository
+        known_package_positions = bytearray()
 
         # Perform various checks and potentially filter out unwanted packages
         # We parse all of primary.xml first and fail fast if something is wrong.
@@ -1236,17 +2074,21 @@ class RpmFirstStage(Stage):
             nonlocal package_skip_nevras
             nonlocal latest_packages_by_arch_and_name
             nonlocal total_packages
-            nonlocal latest_build_time_by_nevra
             nonlocal skipped_packages
 
+            position = total_packages
             total_packages += 1
             pkg_nevra = pkg.nevra()
             pkg_name = pkg.name
 
-            pkg_names_seen_order.append(pkg_name)
+            pkg_name_ids_seen_order.append(pkg_name_ids.setdefault(pkg_name, len(pkg_name_ids)))
+            nevra_crcs.append(zlib.crc32(pkg_nevra.encode()))
+            known_package_positions.append(pkg.pkgId in existing_packages)
 
-            duplicate_nevra = pkg_nevra in nevras
-            duplicate_pkgid = pkg.pkgId in checksums
+            latest_package = latest_package_by_nevra.get(pkg_nevra)
+            duplicate_nevra = latest_package is not None
+            pkgid_hash = hash(pkg.pkgId)
+            duplicate_pkgid = pkgid_hash in checksum_hashes
 
             # Check for packages with duplicate pkgids
             if not pkgid_warning_triggered and duplicate_pkgid:
@@ -1260,12 +2102,11 @@ class RpmFirstStage(Stage):
             # Keep track of the latest build time for each package - all but the latest should be
             # rejected. This matches what DNF ought to do, and should prevent Pulp from ever
             # publishing the repo with multiple packages sharing the same path. Only one can win
-            # so let's make sure it's the one that clients will pick.
-            latest_build_time_by_nevra[pkg_nevra] = max(
-                pkg.time_build, latest_build_time_by_nevra.get(pkg_nevra, 0)
-            )
-            nevras.add(pkg_nevra)
-            checksums.add(pkg.pkgId)
+            # so let's make sure it's the one that clients will pick. Ties are broken by
+            # first-seen.
+            if latest_package is None or pkg.time_build > latest_package[0]:
+                latest_package_by_nevra[pkg_nevra] = (pkg.time_build, position)
+            checksum_hashes.add(pkgid_hash)
 
             # Check that all packages are within the root of the repo (if in mirror_complete mode).
             # We can't allow mirroring metadata that references packages outside of the repo
@@ -1309,6 +2150,32 @@ class RpmFirstStage(Stage):
                     skipped_packages += 1
 
         del latest_packages_by_arch_and_name
+        checksum_hashes.clear()
+
+        # Decide which packages (by position in primary.xml) are synced, so that the second
+        # pass doesn't need to look anything up by NEVRA.
+        packages_to_sync = bytearray(total_packages)
+        for pkg_nevra, (build_time, position) in latest_package_by_nevra.items():
+            if pkg_nevra not in package_skip_nevras:
+                packages_to_sync[position] = 1
+        latest_package_by_nevra.clear()
+        del package_skip_nevras
+
+        # On a resync most packages are usually already in the repository, and their filelists
+        # and other metadata is never looked at. If there aren't too many new packages, only
+        # parse filelists.xml and other.xml for those.
+        new_packages_count = sum(
+            1
+            for to_sync, known in zip(packages_to_sync, known_package_positions)
+            if to_sync and not known
+        )
+        selective_parse = (
+            (filelists_xml or other_xml)
+            and not pkgid_warning_triggered
+            and len(existing_packages) > 0
+            and new_packages_count <= SELECTIVE_PARSE_MAX_NEW_PACKAGES
+        )
+        del known_package_positions[:]
 
         if skipped_packages:
             msg = (
@@ -1365,8 +2232,10 @@ class RpmFirstStage(Stage):
         last_seen_package_name = None
         # for specific repos that are highly random but also have a small nubmer of unique names,
         # let's use global caching for all packages instead of just like consecutive ones
-        pkg_names_count = len(set(pkg_names_seen_order))
-        repo_grouping_score = score_grouping(pkg_names_seen_order)
+        pkg_names_count = len(pkg_name_ids)
+        repo_grouping_score = score_grouping(pkg_name_ids_seen_order)
+        pkg_name_ids.clear()
+        del pkg_name_ids_seen_order[:]
         use_global_caching = repo_grouping_score < 0.25 and pkg_names_count < 25
         log.debug(
             f"use_global_caching: {use_global_caching} repo_grouping_score: {repo_grouping_score} "
@@ -1388,44 +2257,85 @@ class RpmFirstStage(Stage):
             "total": total_packages,
         }
         async with ProgressReport(**progress_data) as packages_pb:
-            # Pre-load existing packages from the latest repo version keyed by pkgId.
-            # Cache hits reuse the saved model object, causing QueryExistingContents to
-            # skip them (because _state.adding is False on already-saved objects).
-            def _build_existing_packages_cache():
-                cache = {}
-                latest_version = self.repository.latest_version()
-                if latest_version:
-                    # ignore particularly expensive metadata which we do not need to handle for already-synced packages
-                    for existing_pkg in (
-                        Package.objects.filter(pk__in=latest_version.content.all())
-                        .defer(
-                            "files",
-                            "requires",
-                            "provides",
-                            "changelogs",
-                        )
-                        .iterator()
-                    ):
-                        cache[existing_pkg.pkgId] = existing_pkg
-                return cache
-
-            existing_packages = await sync_to_async(_build_existing_packages_cache)()
-
             string_cache = {}
             tuple_cache = {}
 
-            for pkg in parser.iter_packages():
-                pkg_nevra = pkg.nevra()
-                # Skip over packages (retention feature, skip_types feature)
-                if package_skip_nevras and pkg_nevra in package_skip_nevras:
-                    continue
-                # Same heuristic as DNF / Yum / Zypper - in the event we encounter multiple package
-                # entries with the same NEVRA, pick the one with the larger build time. Ties are
-                # broken by first-seen: after the first package passes, the entry is replaced with
-                # a sentinel so that any subsequent package with the same NEVRA is filtered out.
-                elif pkg.time_build != latest_build_time_by_nevra[pkg_nevra]:
-                    continue
-                latest_build_time_by_nevra[pkg_nevra] = ALREADY_SEEN
+            def is_package_to_sync(position, pkg):
+                if (
+                    position >= total_packages
+                    or zlib.crc32(pkg.nevra().encode()) != nevra_crcs[position]
+                ):
+                    raise ValueError(
+                        _("Packages in {} do not match the first pass over it.").format(
+                            primary_xml.url
+                        )
+                    )
+                # Skip over packages (retention feature, skip_types feature), and all but one of
+                # the packages sharing a NEVRA - same heuristic as DNF / Yum / Zypper, the one
+                # with the larger build time is picked.
+                return packages_to_sync[position]
+
+            def iter_packages_to_sync():
+                for position, pkg in enumerate(parser.iter_packages()):
+                    if is_package_to_sync(position, pkg):
+                        yield pkg
+
+            def parse_packages_to_sync():
+                packages = collections.deque()
+                new_packages = {}
+                position = 0
+                mismatch = None
+
+                def primary_callback(pkg):
+                    nonlocal position
+                    nonlocal mismatch
+                    try:
+                        to_sync = is_package_to_sync(position, pkg)
+                    except ValueError as e:
+                        mismatch = e
+                        raise
+                    if to_sync:
+                        if pkg.pkgId in existing_packages:
+                            packages.append(
+                                PrimaryLocation(
+                                    pkg.pkgId, pkg.name, pkg.location_href, pkg.location_base
+                                )
+                            )
+                        else:
+                            packages.append(pkg)
+                            new_packages[pkg.pkgId] = pkg
+                    position += 1
+
+                # Returning None makes the parser skip the package
+                def new_package_callback(pkgId, name, arch):
+                    return new_packages.get(pkgId)
+
+                try:
+                    # Without filelists.xml, the files listed in primary.xml are all there is
+                    cr.xml_parse_primary(
+                        primary_xml.path, pkgcb=primary_callback, do_files=not filelists_xml
+                    )
+                except cr.CreaterepoCError:
+                    # createrepo_c replaces the exceptions raised by the callback with its own
+                    if mismatch is not None:
+                        raise mismatch from None
+                    raise
+                if filelists_xml:
+                    cr.xml_parse_filelists(filelists_xml.path, newpkgcb=new_package_callback)
+                if other_xml:
+                    cr.xml_parse_other(other_xml.path, newpkgcb=new_package_callback)
+                new_packages.clear()
+
+                while packages:
+                    yield packages.popleft()
+
+            if selective_parse:
+                log.debug(f"Parsing filelists and other only for {new_packages_count} packages")
+                packages_to_sync_iter = parse_packages_to_sync()
+            else:
+                packages_to_sync_iter = iter_packages_to_sync()
+
+            for pkg in packages_to_sync_iter:
                 # Typically (not always, but 90% of the time) like (same name, different arch
                 # or version) packages are grouped together metadata - this means that re-using
                 # the cache for runs of consecutive like packages is highly effective at saving
@@ -1439,23 +2349,29 @@ class RpmFirstStage(Stage):
                 # more expensive queries down the line in QueryExistingContents.
                 cached = existing_packages.pop(pkg.pkgId, None)
                 if cached is not None:
-                    base_url = pkg.location_base or self.remote_url
-                    url = urlpath_sanitize(base_url, pkg.location_href)
-                    store_package_for_mirroring(self.repository, cached.pkgId, pkg.location_href)
+                    urls = self.get_package_urls(pkg.location_base, pkg.location_href)
+                    if mirroring_store:
+                        mirroring_store.add_package(
+                            self.repository, cached.pkgId, pkg.location_href
+                        )
                     last_seen_package_name = pkg.name
                     del pkg
 
-                    artifact = Artifact(size=cached.size_package)
-                    checksum_type = getattr(CHECKSUM_TYPES, cached.checksum_type.upper())
-                    setattr(artifact, checksum_type, cached.pkgId)
-                    da = DeclarativeArtifact(
-                        artifact=artifact,
-                        url=url,
-                        relative_path=cached.location_href,
-                        remote=self.remote,
-                        deferred_download=self.deferred_download,
-                    )
-                    dc = DeclarativeContent(content=cached, d_artifacts=[da])
+                    if cached.pkgId in self.resumed_pkgids:
+                        # Its artifact and remote artifact were already saved
+                        dc = DeclarativeContent(content=cached)
+                    else:
+                        artifact = Artifact(size=cached.size_package)
+                        checksum_type = getattr(CHECKSUM_TYPES, cached.checksum_type.upper())
+                        setattr(artifact, checksum_type, cached.pkgId)
+                        da = DeclarativeArtifact(
+                            artifact=artifact,
+                            urls=urls,
+                            relative_path=cached.location_href,
+                            remote=self.remote,
+                            deferred_download=self.deferred_download,
+                        )
+                        dc = DeclarativeContent(content=cached, d_artifacts=[da])
                     dc.extra_data = defaultdict(list)
                 else:
                     # Implicit: There can be multiple package entries that are completely
@@ -1469,8 +2385,7 @@ class RpmFirstStage(Stage):
                     )
                     # TODO: set signing_keys when we support package signing during sync
                     package.signing_keys = None
-                    base_url = pkg.location_base or self.remote_url
-                    url = urlpath_sanitize(base_url, package.location_href)
+                    urls = self.get_package_urls(pkg.location_base, package.location_href)
                     last_seen_package_name = pkg.name
                     del pkg  # delete & free the memory as soon as we're done with it
 
@@ -1481,16 +2396,17 @@ class RpmFirstStage(Stage):
                     # [0] https://github.com/pulp/pulp_rpm/issues/2580
                     original_location_href = package.location_href
                     package.location_href = package.filename
-                    store_package_for_mirroring(
-                        self.repository, package.pkgId, original_location_href
-                    )
+                    if mirroring_store:
+                        mirroring_store.add_package(
+                            self.repository, package.pkgId, original_location_href
+                        )
 
                     artifact = Artifact(size=package.size_package)
                     checksum_type = getattr(CHECKSUM_TYPES, package.checksum_type.upper())
                     setattr(artifact, checksum_type, package.pkgId)
                     da = DeclarativeArtifact(
                         artifact=artifact,
-                        url=url,
+                        urls=urls,
                         relative_path=package.location_href,
                         remote=self.remote,
                         deferred_download=self.deferred_download,
@@ -1519,6 +2435,21 @@ class RpmFirstStage(Stage):
         updateinfo_xml_path = result.path
 
         updates = await RpmFirstStage.parse_updateinfo(updateinfo_xml_path)
+
+        # The advisories of the latest repo version by digest. The ones which are still the same
+        # upstream are passed on as saved UpdateRecords, without building their collections,
+        # packages and references again.
+        def _existing_advisories():
+            latest_version = self.repository.latest_version()
+            if latest_version is None:
+                return {}
+            advisories = UpdateRecord.objects.filter(pk__in=latest_version.content).values_list(
+                "digest", "pk", "id"
+            )
+            return {digest: (pk, advisory_id) for digest, pk, advisory_id in advisories.iterator()}
+
+        existing_advisories = await sync_to_async(_existing_advisories)()
+
         progress_data = {
             "message": "Parsed Advisories",
             "code": "sync.parsing.advisories",
@@ -1526,24 +2457,49 @@ class RpmFirstStage(Stage):
         }
         async with ProgressReport(**progress_data) as advisories_pb:
             for update in updates:
-                update_record = UpdateRecord(**UpdateRecord.createrepo_to_dict(update))
+                update_dict = UpdateRecord.createrepo_to_dict(update)
+                collections = [
+                    (
+                        UpdateCollection.createrepo_to_dict(collection),
+                        [
+                            UpdateCollectionPackage.createrepo_to_dict(package)
+                            for package in collection.packages
+                        ],
+                    )
+                    for collection in update.collections
+                ]
+                references = [
+                    UpdateReference.createrepo_to_dict(reference) for reference in update.references
+                ]
+                digest = update_record_digest(update_dict, collections, references)
+
+                existing = existing_advisories.pop(digest, None)
+                if existing is not None:
+                    pk, advisory_id = existing
+                    update_record = UpdateRecord.from_db(
+                        UpdateRecord.objects.db,
+                        ("pulp_id", "pulp_type", "content_ptr_id", "id", "digest"),
+                        (pk, UpdateRecord.get_pulp_type(), pk, advisory_id, digest),
+                    )
+                    await advisories_pb.aincrement()
+                    await self.put(DeclarativeContent(content=update_record))
+                    continue
+
+                update_record = UpdateRecord(**update_dict)
                 update_record.pulp_domain = get_domain()
-                update_record.digest = hash_update_record(update)
+                update_record.digest = digest
                 future_relations = {"collections": defaultdict(list), "references": []}
 
-                for collection in update.collections:
-                    coll_dict = UpdateCollection.createrepo_to_dict(collection)
+                for coll_dict, pkg_dicts in collections:
                     if coll_dict["name"] is None:
                         coll_dict["name"] = "collection-autofill-" + uuid.uuid4().hex[:12]
                     coll = UpdateCollection(**coll_dict)
 
-                    for package in collection.packages:
-                        pkg_dict = UpdateCollectionPackage.createrepo_to_dict(package)
+                    for pkg_dict in pkg_dicts:
                         pkg = UpdateCollectionPackage(**pkg_dict)
                         future_relations["collections"][coll].append(pkg)
 
-                for reference in update.references:
-                    reference_dict = UpdateReference.createrepo_to_dict(reference)
+                for reference_dict in references:
                     ref = UpdateReference(**reference_dict)
                     future_relations["references"].append(ref)
 
@@ -1553,6 +2509,38 @@ class RpmFirstStage(Stage):
                 await self.put(dc)
 
 
+class SyncCheckpointRecorder(Stage):
+    """
+    A stage that records the packages which have been saved, along with their artifacts.
+
+    It comes after all stages which save something, so that a sync which fails can be resumed
+    from the packages it recorded.
+    """
+
+    def __init__(self, checkpoint, *args, **kwargs):
+        """
+        Args:
+            checkpoint (SyncCheckpoint): Where to record the packages
+        """
+        super().__init__(*args, **kwargs)
+        self.checkpoint = checkpoint
+
+    async def run(self):
+        """
+        Record the packages of each batch.
+        """
+        async for batch in self.batches():
+            pks = [
+                d_content.content.pk
+                for d_content in batch
+                if d_content is not None and isinstance(d_content.content, Package)
+            ]
+            if pks:
+                await sync_to_async(self.checkpoint.add_packages)(pks)
+            for declarative_content in batch:
+                await self.put(declarative_content)
+
+
 class RpmInterrelateContent(Stage):
     """
     A stage that creates relationships between Packages and other related types.
@@ -1676,7 +2664,24 @@ class RpmContentSaver(ContentSaver):
         update_collection_to_save = []
         update_references_to_save = []
         update_collection_packages_to_save = []
-        seen_updaterecords = []
+        seen_updaterecords = set()
+
+        # existing content which was retrieved from the db at earlier stages already has its
+        # relations, find it with a single query for the whole batch
+        update_record_pks = [
+            declarative_content.content.pk
+            for declarative_content in batch
+            if declarative_content is not None
+            and isinstance(declarative_content.content, UpdateRecord)
+        ]
+        update_records_with_relations = set()
+        if update_record_pks:
+            update_records_with_relations = set(
+                UpdateRecord.objects.filter(pk__in=update_record_pks)
+                .filter(Q(collections__isnull=False) | Q(references__isnull=False))
+                .values_list("pk", flat=True)
+                .distinct()
+            )
 
         for declarative_content in batch:
             if declarative_content is None:
@@ -1688,11 +2693,7 @@ class RpmContentSaver(ContentSaver):
             elif isinstance(declarative_content.content, UpdateRecord):
                 update_record = declarative_content.content
 
-                relations_exist = (
-                    update_record.collections.count() or update_record.references.count()
-                )
-                if relations_exist:
-                    # existing content which was retrieved from the db at earlier stages
+                if update_record.pk in update_records_with_relations:
                     continue
 
                 # if there are same update_records in a batch, the relations to the references
@@ -1701,7 +2702,7 @@ class RpmContentSaver(ContentSaver):
                 # It can happen easily during pulp 2to3 migration, or in case of a bad repo.
                 if update_record.digest in seen_updaterecords:
                     continue
-                seen_updaterecords.append(update_record.digest)
+                seen_updaterecords.add(update_record.digest)
 
                 future_relations = declarative_content.extra_data
                 update_collections = future_relations.get("collections", {})
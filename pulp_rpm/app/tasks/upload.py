@@ -0,0 +1,241 @@
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connection, connections, transaction
+
+from pulpcore.plugin.files import PulpTemporaryUploadedFile
+from pulpcore.plugin.models import (
+    Artifact,
+    Content,
+    ContentArtifact,
+    CreatedResource,
+    Upload,
+    UploadChunk,
+)
+from pulpcore.plugin.util import get_domain_pk
+
+from pulp_rpm.app.exceptions import PackageParseError
+from pulp_rpm.app.models import Package, RpmRepository
+from pulp_rpm.app.shared_utils import format_nvra, read_crpackage_from_artifact
+
+log = logging.getLogger(__name__)
+
+
+def get_or_create_artifact(file):
+    """
+    Save an uploaded file as an Artifact, or reuse the existing Artifact with the same sha256.
+
+    Args:
+        file: A PulpTemporaryUploadedFile or an uploaded file with the hashers of an Artifact.
+
+    Returns:
+        Artifact: The saved Artifact.
+    """
+    artifact = Artifact.init_and_validate(file)
+    try:
+        artifact = Artifact.objects.get(sha256=artifact.sha256, pulp_domain=get_domain_pk())
+        if not artifact.pulp_domain.get_storage().exists(artifact.file.name):
+            # artifact.save() only stores the file again if it is set and dirty
+            artifact.file = file
+            raise Artifact.DoesNotExist
+        artifact.touch()
+    except (Artifact.DoesNotExist, DatabaseError):
+        try:
+            artifact.save()
+        except IntegrityError:
+            artifact = Artifact.objects.get(sha256=artifact.sha256, pulp_domain=get_domain_pk())
+            artifact.touch()
+    return artifact
+
+
+def _artifact_from_upload(upload):
+    """Assemble the chunks of an upload into an Artifact."""
+    chunks = UploadChunk.objects.filter(upload=upload).order_by("offset")
+    with NamedTemporaryFile(mode="ab", dir=".", delete=False) as temp_file:
+        for chunk in chunks:
+            temp_file.write(chunk.file.read())
+            chunk.file.close()
+        temp_file.flush()
+    return get_or_create_artifact(PulpTemporaryUploadedFile.from_file(open(temp_file.name, "rb")))
+
+
+def _parse_package(artifact):
+    """
+    Read the metadata of the RPM of an artifact.
+
+    Returns:
+        dict: The fields of the Package, or None if the RPM can't be parsed.
+    """
+    try:
+        cr_pkg, signing_keys = read_crpackage_from_artifact(artifact)
+    except (OSError, RuntimeError):
+        log.info(traceback.format_exc())
+        return None
+
+    package = Package.createrepo_to_dict(cr_pkg, signing_keys=signing_keys)
+    package["location_href"] = (
+        format_nvra(package["name"], package["version"], package["release"], package["arch"])
+        + ".rpm"
+    )
+    return package
+
+
+def parse_packages(artifacts):
+    """
+    Read the metadata of the RPMs of many artifacts, in up to MAX_PACKAGE_UPLOAD_WORKERS processes.
+
+    Returns:
+        list: The fields of each Package, or None for each RPM that can't be parsed, in the order
+            of the artifacts.
+    """
+    workers = min(settings.MAX_PACKAGE_UPLOAD_WORKERS, len(artifacts))
+    # Closing the connections would break an ongoing transaction, and the worker processes of a
+    # pool are not allowed to have children.
+    if (
+        workers > 1
+        and not connection.in_atomic_block
+        and not multiprocessing.current_process().daemon
+    ):
+        # The forked processes must not share the database connections of this one. Django
+        # reconnects on demand.
+        connections.close_all()
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            return list(executor.map(_parse_package, artifacts, chunksize=8))
+    return [_parse_package(artifact) for artifact in artifacts]
+
+
+def _save_packages(new_packages, existing_packages):
+    """
+    Save the parsed packages with their artifacts, and the artifacts of existing packages.
+
+    Args:
+        new_packages (list): Tuples of (Artifact, dict of the Package fields).
+        existing_packages (list): Tuples of (Artifact, Package) of the packages that already exist.
+
+    Returns:
+        list: All the packages.
+    """
+    # In the order of their natural key, like pulpcore saves content, to avoid deadlocks with
+    # concurrent uploads
+    new_packages = sorted(new_packages, key=lambda new_package: new_package[1]["pkgId"])
+    # Multi-table models like Package can't be bulk created. They are all saved in a single
+    # savepoint, unless some of them were created since the existing ones were looked up.
+    try:
+        with transaction.atomic():
+            packages = [Package.objects.create(**package_data) for _, package_data in new_packages]
+    except IntegrityError:
+        packages = []
+        for _, package_data in new_packages:
+            try:
+                with transaction.atomic():
+                    packages.append(Package.objects.create(**package_data))
+            except IntegrityError:
+                packages.append(None)
+
+    concurrent_pkgids = [
+        package_data["pkgId"]
+        for (_, package_data), package in zip(new_packages, packages)
+        if package is None
+    ]
+    concurrent_packages = Package.objects.filter(
+        pkgId__in=concurrent_pkgids, pulp_domain=get_domain_pk()
+    ).only("pk", "pkgId", "location_href")
+    concurrent_packages = {package.pkgId: package for package in concurrent_packages}
+    content_artifacts = []
+    for (artifact, package_data), package in zip(new_packages, packages):
+        if package is None:
+            existing_packages.append((artifact, concurrent_packages[package_data["pkgId"]]))
+        else:
+            content_artifacts.append(
+                ContentArtifact(
+                    artifact=artifact, content=package, relative_path=package.location_href
+                )
+            )
+    ContentArtifact.objects.bulk_create(content_artifacts)
+
+    # Ensure the existing packages now have the uploaded artifacts, e.g. if they were synced with
+    # the on_demand policy
+    Package.objects.filter(pk__in=[package.pk for _, package in existing_packages]).touch()
+    missing_artifacts = set(
+        ContentArtifact.objects.filter(
+            content__in=[package.pk for _, package in existing_packages], artifact=None
+        ).values_list("content_id", flat=True)
+    )
+    ContentArtifact.objects.bulk_create(
+        [
+            ContentArtifact(artifact=artifact, content=package, relative_path=package.location_href)
+            for artifact, package in existing_packages
+            if package.pk in missing_artifacts
+        ],
+        update_conflicts=True,
+        update_fields=["artifact"],
+        unique_fields=["content", "relative_path"],
+    )
+
+    return [content_artifact.content for content_artifact in content_artifacts] + [
+        package for _, package in existing_packages
+    ]
+
+
+def upload_packages(repository_pk, artifact_pks=None, upload_pks=None):
+    """
+    Create Packages from many uploaded RPMs and add them to a repository in one new version.
+
+    RPMs which are already known by their pkgId aren't parsed again. The headers of the others are
+    parsed in parallel.
+
+    Args:
+        repository_pk (str): The repository to add the packages to.
+        artifact_pks (list): Artifacts of uploaded RPM files.
+        upload_pks (list): Uploads of RPM files, which are removed after the packages are created.
+    """
+    repository = RpmRepository.objects.get(pk=repository_pk)
+    uploads = list(Upload.objects.filter(pk__in=upload_pks or []))
+    artifacts = list(Artifact.objects.filter(pk__in=artifact_pks or []))
+    artifacts.extend(_artifact_from_upload(upload) for upload in uploads)
+    # the same RPM uploaded more than once is only added once
+    artifacts = list({artifact.sha256: artifact for artifact in artifacts}.values())
+
+    existing_packages = Package.objects.filter(
+        pkgId__in=[artifact.sha256 for artifact in artifacts], pulp_domain=get_domain_pk()
+    ).only("pk", "pkgId", "location_href")
+    existing_packages = {package.pkgId: package for package in existing_packages}
+    new_artifacts = [artifact for artifact in artifacts if artifact.sha256 not in existing_packages]
+
+    log.info(
+        f"Parsing {len(new_artifacts)} of {len(artifacts)} uploaded packages, "
+        f"the others already exist."
+    )
+    parsed_packages = parse_packages(new_artifacts)
+    unparsable = [
+        artifact.sha256
+        for artifact, package_data in zip(new_artifacts, parsed_packages)
+        if package_data is None
+    ]
+    if unparsable:
+        raise PackageParseError(unparsable)
+
+    with transaction.atomic():
+        packages = _save_packages(
+            list(zip(new_artifacts, parsed_packages)),
+            [
+                (artifact, existing_packages[artifact.sha256])
+                for artifact in artifacts
+                if artifact.sha256 in existing_packages
+            ],
+        )
+        CreatedResource.objects.bulk_create(
+            [CreatedResource(content_object=package) for package in packages]
+        )
+        with repository.new_version() as new_version:
+            new_version.add_content(
+                Content.objects.filter(pk__in=[package.pk for package in packages])
+            )
+        for upload in uploads:
+            upload.delete()
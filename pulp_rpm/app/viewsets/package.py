@@ -1,7 +1,7 @@
 from django.db import transaction
 from django_filters import CharFilter
 from drf_spectacular.utils import extend_schema
-from rest_framework import status
+from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
@@ -18,6 +18,7 @@ from pulp_rpm.app import tasks as rpm_tasks
 from pulp_rpm.app.models import Package
 from pulp_rpm.app.serializers import (
     MinimalPackageSerializer,
+    PackageBulkUploadSerializer,
     PackageSerializer,
     PackageUploadSerializer,
 )
@@ -174,3 +175,54 @@ class PackageViewSet(SingleArtifactContentUploadViewSet):
 
         headers = self.get_success_headers(serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+
+
+class PackageBulkUploadViewSet(viewsets.ViewSet):
+    """
+    ViewSet for uploading many RPM packages into a repository at once.
+    """
+
+    DEFAULT_ACCESS_POLICY = {
+        "statements": [
+            {
+                "action": ["create"],
+                "principal": "authenticated",
+                "effect": "allow",
+                "condition": [
+                    "has_required_repo_perms_on_upload:rpm.modify_content_rpmrepository",
+                    "has_required_repo_perms_on_upload:rpm.view_rpmrepository",
+                ],
+            },
+        ],
+    }
+
+    @extend_schema(
+        description="Trigger an asynchronous task to create RPM packages from many files or "
+        "uploads, and add them to a repository in a single new repository version.",
+        summary="Upload RPM packages in bulk",
+        operation_id="rpm_packages_bulk_upload",
+        request=PackageBulkUploadSerializer,
+        responses={202: AsyncOperationResponseSerializer},
+    )
+    def create(self, request, **kwargs):
+        """Upload many RPM packages and add them to a repository."""
+        serializer = PackageBulkUploadSerializer(data=request.data, context={"request": request})
+        serializer.is_valid(raise_exception=True)
+
+        repository = serializer.validated_data["repository"]
+        uploads = serializer.validated_data.get("uploads", [])
+        artifacts = [
+            rpm_tasks.upload.get_or_create_artifact(file)
+            for file in serializer.validated_data.get("files", [])
+        ]
+
+        task = dispatch(
+            rpm_tasks.upload_packages,
+            exclusive_resources=[repository, *uploads],
+            args=(str(repository.pk),),
+            kwargs={
+                "artifact_pks": [str(artifact.pk) for artifact in artifacts],
+                "upload_pks": [str(upload.pk) for upload in uploads],
+            },
+        )
+        return OperationPostponedResponse(task, request)
@@ -0,0 +1,333 @@
+"""Download zchunk metadata files by reusing the chunks of a previously downloaded version.
+
+A zchunk file is a header, which lists the checksum and size of every chunk, followed by the
+independently compressed chunks. When a zchunk file changes upstream, most of its chunks usually
+don't, so a new version of the file can be put together from the chunks of the previous version
+plus the few changed chunks, downloaded with HTTP range requests.
+
+See https://github.com/zchunk/zchunk/blob/main/zchunk_format.txt for the file format.
+"""
+
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from logging import getLogger
+
+from django.conf import settings
+
+from pulpcore.plugin.download import DownloadResult, HttpDownloader
+
+log = getLogger(__name__)
+
+ZCK_MAGIC = b"\0ZCK1"
+
+# zchunk checksum type -> (hashlib name, digest size)
+ZCK_CHECKSUM_TYPES = {
+    0: ("sha1", 20),
+    1: ("sha256", 32),
+    2: ("sha512", 64),
+    3: ("sha512", 16),  # SHA-512/128, the first 128 bits of the SHA-512 checksum
+}
+
+ZCK_FLAG_STREAMS = 1
+ZCK_FLAG_OPTIONAL_ELEMENTS = 2
+ZCK_FLAG_UNCOMPRESSED_CHECKSUMS = 4
+
+# Changed chunks closer to each other than this are downloaded in a single range request
+MAX_RANGE_GAP = 16 * 1024
+
+ZchunkChunk = namedtuple("ZchunkChunk", ["checksum", "offset", "size"])
+
+
+class ZchunkError(Exception):
+    """A zchunk file is invalid or can't be downloaded in parts."""
+
+
+class ZchunkHeader:
+    """
+    The parsed header of a zchunk file.
+
+    Attributes:
+        size (int): The size of the header, including the lead
+        checksum (bytes): The header checksum stored in the lead
+        computed_checksum (bytes): The checksum of the header, computed as the lead's is
+        data_size (int): The size of the chunks following the header
+        chunks (list): The ZchunkChunk of the dictionary and of every data chunk, in order, with
+            offsets relative to the beginning of the file
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data (bytes): The beginning of a zchunk file, at least the whole header.
+
+        Raises:
+            ZchunkError: If the data doesn't start with a valid zchunk header.
+        """
+        if not data.startswith(ZCK_MAGIC):
+            raise ZchunkError("Not a zchunk file")
+        try:
+            self._parse(data)
+        except (IndexError, KeyError) as exc:
+            raise ZchunkError(f"Invalid zchunk header: {exc!r}")
+
+    def _parse(self, data):
+        offset = len(ZCK_MAGIC)
+        checksum_type, offset = read_compint(data, offset)
+        size_after_lead, offset = read_compint(data, offset)
+        hash_name, digest_size = ZCK_CHECKSUM_TYPES[checksum_type]
+
+        checksum_offset = offset
+        self.checksum = data[offset : offset + digest_size]
+        offset += digest_size
+        self.size = offset + size_after_lead
+        if len(data) < self.size:
+            raise ZchunkError("Truncated zchunk header")
+        digest = hashlib.new(hash_name, data[:checksum_offset])
+        digest.update(data[offset : self.size])
+        self.computed_checksum = digest.digest()[:digest_size]
+
+        # preface
+        offset += digest_size  # data checksum
+        flags, offset = read_compint(data, offset)
+        compression_type, offset = read_compint(data, offset)
+        if flags & ZCK_FLAG_OPTIONAL_ELEMENTS:
+            count, offset = read_compint(data, offset)
+            for _i in range(count):
+                element_type, offset = read_compint(data, offset)
+                element_size, offset = read_compint(data, offset)
+                offset += element_size
+
+        # index
+        index_size, offset = read_compint(data, offset)
+        chunk_checksum_type, offset = read_compint(data, offset)
+        chunk_count, offset = read_compint(data, offset)
+        chunk_digest_size = ZCK_CHECKSUM_TYPES[chunk_checksum_type][1]
+
+        self.chunks = []
+        chunk_offset = self.size
+        for _i in range(chunk_count):
+            if flags & ZCK_FLAG_STREAMS:
+                stream, offset = read_compint(data, offset)
+            checksum = data[offset : offset + chunk_digest_size]
+            offset += chunk_digest_size
+            if flags & ZCK_FLAG_UNCOMPRESSED_CHECKSUMS:
+                offset += chunk_digest_size
+            size, offset = read_compint(data, offset)
+            uncompressed_size, offset = read_compint(data, offset)
+            self.chunks.append(ZchunkChunk(checksum, chunk_offset, size))
+            chunk_offset += size
+        if offset > self.size:
+            raise ZchunkError("Truncated zchunk index")
+        self.data_size = chunk_offset - self.size
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        Read the header of a zchunk file.
+
+        Args:
+            path (str): The path of the zchunk file
+
+        Returns:
+            ZchunkHeader: The parsed header
+        """
+        with open(path, "rb") as zck_file:
+            data = zck_file.read(64)
+            size = header_size(data)
+            if size > len(data):
+                data += zck_file.read(size - len(data))
+        return cls(data)
+
+
+def header_size(lead):
+    """
+    The size of the header of a zchunk file, including the lead, read from the lead.
+
+    Raises:
+        ZchunkError: If the data doesn't start with a valid zchunk lead.
+    """
+    if not lead.startswith(ZCK_MAGIC):
+        raise ZchunkError("Not a zchunk file")
+    try:
+        checksum_type, offset = read_compint(lead, len(ZCK_MAGIC))
+        size, offset = read_compint(lead, offset)
+        return offset + ZCK_CHECKSUM_TYPES[checksum_type][1] + size
+    except (IndexError, KeyError) as exc:
+        raise ZchunkError(f"Invalid zchunk lead: {exc!r}")
+
+
+def read_compint(data, offset):
+    """
+    Read a zchunk compressed integer.
+
+    Compressed integers are little-endian, with 7 bits per byte, and the most significant bit
+    set on the last byte.
+
+    Returns:
+        tuple: The integer and the offset just after it
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            return value, offset
+        shift += 7
+
+
+def plan_chunks(header, previous_header):
+    """
+    Decide which chunks of a zchunk file to reuse from its previous version and which to download.
+
+    Args:
+        header (ZchunkHeader): The header of the new version
+        previous_header (ZchunkHeader): The header of the previous version
+
+    Returns:
+        tuple: A list of (offset in the previous file, offset in the new file, size) of the chunks
+            to copy, and a list of (start, end) byte ranges of the new file to download, with
+            inclusive ends.
+    """
+    previous_chunks = {
+        (chunk.checksum, chunk.size): chunk for chunk in previous_header.chunks if chunk.size
+    }
+    reused = []
+    ranges = []
+    for chunk in header.chunks:
+        if not chunk.size:
+            continue
+        previous_chunk = previous_chunks.get((chunk.checksum, chunk.size))
+        if previous_chunk:
+            reused.append((previous_chunk.offset, chunk.offset, chunk.size))
+            continue
+        end = chunk.offset + chunk.size - 1
+        if ranges and chunk.offset - ranges[-1][1] <= MAX_RANGE_GAP:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((chunk.offset, end))
+    return reused, ranges
+
+
+def zchunk_cache_path(remote, url):
+    """
+    The path where the last downloaded version of a zchunk file is kept.
+
+    Args:
+        remote (RpmRemote): The remote the file is downloaded with
+        url (str): The URL of the repository the file belongs to, and its metadata type
+
+    Returns:
+        str: The path of the cached file
+    """
+    name = hashlib.sha256(url.encode()).hexdigest()
+    return os.path.join(settings.WORKING_DIRECTORY, "rpm-zchunk", str(remote.pk), f"{name}.zck")
+
+
+def update_zchunk_cache(path, cache_path):
+    """Keep a downloaded zchunk file for the next sync, replacing the previous version."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(cache_path), delete=False) as cache_file:
+        with open(path, "rb") as zck_file:
+            shutil.copyfileobj(zck_file, cache_file)
+    os.replace(cache_file.name, cache_path)
+
+
+def supports_range_requests(downloader):
+    """Whether the changed chunks of a zchunk file can be downloaded with a downloader."""
+    return (
+        isinstance(downloader, HttpDownloader) and getattr(downloader, "session", None) is not None
+    )
+
+
+async def download_zchunk_delta(downloader, record, previous_path):
+    """
+    Download a zchunk file, reusing the chunks of a previous version of it.
+
+    Only the header and the changed chunks are downloaded, with HTTP range requests. The file
+    put together is verified against the checksum of the repomd.xml record.
+
+    Args:
+        downloader (HttpDownloader): The downloader of the zchunk file, its session is used for
+            the range requests
+        record (createrepo_c.RepomdRecord): The repomd.xml record of the zchunk file, with its
+            checksum type already converted to a pulpcore digest name
+        previous_path (str): The path of the previous version of the zchunk file
+
+    Returns:
+        tuple: The DownloadResult of the file and the number of bytes downloaded
+
+    Raises:
+        ZchunkError: If the file can't be put together, e.g. the server doesn't support range
+            requests or the previous version isn't a valid zchunk file.
+    """
+    url = downloader.url
+    if not supports_range_requests(downloader):
+        raise ZchunkError(f"Range requests aren't supported for {url}")
+
+    async def fetch_range(start, end):
+        async with downloader.semaphore:
+            async with downloader.session.get(
+                downloader.url,
+                headers={"Range": f"bytes={start}-{end}"},
+                proxy=downloader.proxy,
+                proxy_auth=downloader.proxy_auth,
+                auth=downloader.auth,
+            ) as response:
+                response.raise_for_status()
+                if response.status != 206:
+                    raise ZchunkError(f"The server doesn't support range requests for {url}")
+                data = await response.read()
+        if len(data) != end - start + 1:
+            raise ZchunkError(f"Unexpected response size for range {start}-{end} of {url}")
+        return data
+
+    header_data = await fetch_range(0, record.size_header - 1)
+    header = ZchunkHeader(header_data)
+    if header.checksum != header.computed_checksum:
+        raise ZchunkError(f"Header checksum mismatch for {url}")
+    if record.checksum_header and header.checksum.hex() != record.checksum_header:
+        raise ZchunkError(f"The header of {url} doesn't match repomd.xml")
+    if header.size + header.data_size != record.size:
+        raise ZchunkError(f"The size of {url} doesn't match repomd.xml")
+    previous_header = ZchunkHeader.from_file(previous_path)
+    reused, ranges = plan_chunks(header, previous_header)
+
+    with tempfile.NamedTemporaryFile(dir=".", suffix=".zck", delete=False) as zck_file:
+        zck_file.write(header_data[: header.size])
+        zck_file.truncate(record.size)
+        with open(previous_path, "rb") as previous_file:
+            for previous_offset, offset, size in reused:
+                previous_file.seek(previous_offset)
+                zck_file.seek(offset)
+                zck_file.write(previous_file.read(size))
+
+        async def download_range(start, end):
+            data = await fetch_range(start, end)
+            os.pwrite(zck_file.fileno(), data, start)
+            return len(data)
+
+        downloaded = header.size + sum(
+            await asyncio.gather(*[download_range(start, end) for start, end in ranges])
+        )
+
+    digest = hashlib.new(record.checksum_type)
+    with open(zck_file.name, "rb") as zck_file_read:
+        for block in iter(lambda: zck_file_read.read(1024 * 1024), b""):
+            digest.update(block)
+    if digest.hexdigest() != record.checksum:
+        os.remove(zck_file.name)
+        raise ZchunkError(f"Checksum mismatch for {url} put together from chunks")
+
+    result = DownloadResult(
+        url=url,
+        artifact_attributes={"size": record.size, record.checksum_type: record.checksum},
+        path=zck_file.name,
+        headers=None,
+    )
+    return result, downloaded
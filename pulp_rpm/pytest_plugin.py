@@ -15,6 +15,7 @@ from pulpcore.client.pulp_rpm import (
     RemotesRpmApi,
     RepositoriesRpmApi,
     RepositoriesRpmVersionsApi,
+    RpmCopyApi,
     RpmPruneApi,
     RpmRepositorySyncURL,
 )
@@ -46,6 +47,12 @@ def rpm_prune_api(rpm_client):
     return RpmPruneApi(rpm_client)
 
 
+@pytest.fixture(scope="session")
+def rpm_copy_api(rpm_client):
+    """Fixture for RPM copy API."""
+    return RpmCopyApi(rpm_client)
+
+
 @pytest.fixture(scope="session")
 def rpm_client(bindings_cfg):
     """Fixture for RPM client."""
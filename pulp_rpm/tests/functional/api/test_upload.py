@@ -1,6 +1,7 @@
 """Tests that perform actions over content unit."""
 
 import os
+import uuid
 from tempfile import NamedTemporaryFile
 
 import pytest
@@ -35,6 +36,7 @@ from pulp_rpm.tests.functional.constants import (
     SMALL_GROUPS,
     SMALL_LANGPACK,
 )
+from pulp_rpm.tests.functional.utils import Nevra
 
 SMALL_CONTENT = SMALL_GROUPS + SMALL_CATEGORY + SMALL_LANGPACK + SMALL_ENVIRONMENTS
 CENTOS8_CONTENT = BIG_GROUPS + BIG_CATEGORY + BIG_LANGPACK + BIG_ENVIRONMENTS
@@ -496,6 +498,50 @@ def test_async_upload_with_newer_fixture_rpm(
     assert package.signing_keys == [f"v4:{KEY_V4_RSA4K.signing_fingerprint}"]
 
 
+def test_bulk_package_upload(
+    rpm_repository_factory,
+    rpm_repository_api,
+    rpm_package_api,
+    monitor_task,
+    rpm_create_package,
+    pulp_api_v3_url,
+    bindings_cfg,
+    pulpcore_chunked_file_factory,
+    pulpcore_upload_chunks,
+):
+    """Files and uploads, including an existing package, are added in a single new version."""
+    names = [f"bulk-{uuid.uuid4().hex[:8]}-{i}" for i in range(3)]
+    paths = [rpm_create_package(Nevra(name, 0, "1.0", "1", "noarch")) for name in names]
+    existing = rpm_package_api.read(
+        monitor_task(rpm_package_api.create(file=str(paths[0])).task).created_resources[0]
+    )
+    chunked_file = pulpcore_chunked_file_factory(paths[2])
+    upload = pulpcore_upload_chunks(
+        chunked_file["size"], chunked_file["chunks"], chunked_file["digest"]
+    )
+    repo = rpm_repository_factory()
+
+    with open(paths[0], "rb") as existing_file, open(paths[1], "rb") as new_file:
+        response = requests.post(
+            f"{pulp_api_v3_url}rpm/packages/upload/",
+            files=[("files", existing_file), ("files", new_file)],
+            data={"repository": repo.pulp_href, "uploads": [upload.pulp_href]},
+            auth=(bindings_cfg.username, bindings_cfg.password),
+            verify=False,
+        )
+    assert response.status_code == 202
+    task = monitor_task(response.json()["task"])
+
+    repo = rpm_repository_api.read(repo.pulp_href)
+    assert repo.latest_version_href.endswith("/versions/1/")
+    assert [href for href in task.created_resources if "/versions/" in href] == [
+        repo.latest_version_href
+    ]
+    packages = rpm_package_api.list(repository_version=repo.latest_version_href).results
+    assert sorted(package.name for package in packages) == names
+    assert existing.pulp_href in {package.pulp_href for package in packages}
+
+
 def eval_resources(resources, is_small=True):
     """Eval created_resources counts."""
     groups = [g for g in resources if "packagegroups" in g]
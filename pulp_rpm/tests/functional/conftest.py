@@ -24,7 +24,6 @@ from pulpcore.client.pulp_rpm import (
     RemotesUlnApi,
     RepositoriesRpmVersionsApi,
     RpmCompsApi,
-    RpmCopyApi,
     RpmRepositorySyncURL,
 )
 
@@ -127,11 +126,6 @@ def rpm_content_distribution_trees_api(rpm_client):
     return ContentDistributionTreesApi(rpm_client)
 
 
-@pytest.fixture(scope="session")
-def rpm_copy_api(rpm_client):
-    return RpmCopyApi(rpm_client)
-
-
 @pytest.fixture(scope="session")
 def rpm_repository_versions_api(rpm_client):
     return RepositoriesRpmVersionsApi(rpm_client)
@@ -9,6 +9,7 @@ import tempfile
 import uuid
 import xml.etree.ElementTree as ET
 from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import NamedTuple, Optional
 
@@ -24,6 +25,19 @@ from pulp_rpm.tests.functional.constants import (
 )
 
 
+def parse_date_from_string(s, parse_format="%Y-%m-%dT%H:%M:%S.%fZ"):
+    """Parse string to datetime object.
+
+    :param s: str like '2018-11-18T21:03:32.493697Z'
+    :param parse_format: str defaults to %Y-%m-%dT%H:%M:%S.%fZ
+    :return: datetime.datetime
+    """
+    if isinstance(s, datetime):
+        return s
+    else:
+        return datetime.strptime(s, parse_format)
+
+
 def gen_rpm_content_attrs(artifact, rpm_name):
     """Generate a dict with content unit attributes.
 
@@ -0,0 +1,34 @@
+import os
+
+import pytest
+
+from pulp_rpm.tests.performance.synthetic_repo import generate_synthetic_repo
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "performance: marks benchmarks which don't depend on any external repositories",
+    )
+
+
+@pytest.fixture(scope="class")
+def synthetic_repo_server(tmp_path_factory, gen_fixture_server):
+    """A local HTTP server serving the generated synthetic repositories."""
+    fixtures_root = tmp_path_factory.mktemp("synthetic_repos")
+    return fixtures_root, gen_fixture_server(fixtures_root, None)
+
+
+@pytest.fixture(scope="class")
+def synthetic_repo_url(synthetic_repo_server):
+    """Generate a synthetic repository (once per config and revision) and return its URL."""
+    fixtures_root, server = synthetic_repo_server
+
+    def _synthetic_repo_url(config, revision=1):
+        name = f"{abs(hash(config)):x}-{revision}"
+        path = os.path.join(fixtures_root, name)
+        if not os.path.exists(path):
+            generate_synthetic_repo(path, config, revision=revision)
+        return server.make_url(f"/{name}/")
+
+    return _synthetic_repo_url
@@ -0,0 +1,248 @@
+"""Generate deterministic synthetic RPM repositories for the offline benchmarks.
+
+The "packages" are not real RPMs, just files with deterministic content, but the metadata
+describing them (primary, filelists, other, updateinfo, comps and modules) is complete and
+consistent with them, which is everything a sync, publish or copy looks at.
+"""
+
+import hashlib
+import os
+import random
+from dataclasses import dataclass
+
+import createrepo_c as cr
+import libcomps
+
+
+@dataclass(frozen=True)
+class SyntheticRepoConfig:
+    """The shape of a synthetic repository.
+
+    Attributes:
+        packages: Number of packages.
+        files_per_package: Number of files listed in the filelists metadata of each package.
+        changelogs_per_package: Number of changelog entries of each package.
+        versions_per_name: Number of versions of each package name, packages of the same name
+            are listed next to each other like in most real repositories.
+        advisories: Number of advisories, each referring to a few of the packages.
+        modules: Number of module streams, each containing a few of the packages.
+        groups: Number of comps groups, each containing a few of the package names.
+        package_size: Size of each package file in bytes.
+        seed: Seed for the pseudo-random parts of the metadata.
+    """
+
+    packages: int = 1000
+    files_per_package: int = 20
+    changelogs_per_package: int = 10
+    versions_per_name: int = 2
+    advisories: int = 100
+    modules: int = 10
+    groups: int = 10
+    package_size: int = 1024
+    seed: int = 0
+
+
+def _package_payload(nevra, size):
+    """The deterministic content of the package file with the given NEVRA."""
+    block = hashlib.sha256(nevra.encode()).digest()
+    return (block * (size // len(block) + 1))[:size]
+
+
+def _packages(config, revision):
+    """Yield the createrepo_c packages of the repository, with their file content."""
+    rand = random.Random(config.seed)
+    names = (config.packages + config.versions_per_name - 1) // config.versions_per_name
+    for index in range(config.packages):
+        name_index, version_index = divmod(index, config.versions_per_name)
+        name = f"synthetic-{name_index:06}"
+        pkg = cr.Package()
+        pkg.name = name
+        pkg.epoch = "0"
+        pkg.version = f"1.{version_index}"
+        pkg.release = f"{revision}.el9"
+        pkg.arch = "noarch" if name_index % 5 == 0 else "x86_64"
+        pkg.summary = f"Synthetic package {name}"
+        pkg.description = f"Synthetic package {name} generated for benchmarking."
+        pkg.url = f"https://example.com/{name}"
+        pkg.rpm_license = "MIT"
+        pkg.rpm_group = "Unspecified"
+        pkg.rpm_buildhost = "builder.example.com"
+        pkg.rpm_sourcerpm = f"{name}-{pkg.version}-{pkg.release}.src.rpm"
+        pkg.rpm_vendor = "Pulp Project"
+        pkg.rpm_packager = "Pulp Project"
+        pkg.time_build = 1700000000 + index
+        pkg.time_file = 1700000000 + index
+        pkg.provides = [(name, "EQ", "0", pkg.version, pkg.release, False)]
+        pkg.requires = [
+            (f"synthetic-{rand.randrange(names):06}", None, None, None, None, False)
+            for _ in range(3)
+        ]
+        pkg.files = [
+            ("dir" if i == 0 else "", f"/usr/share/{name}/", f"file-{i:04}")
+            for i in range(config.files_per_package)
+        ]
+        pkg.changelogs = [
+            (
+                f"Packager <packager@example.com> - {pkg.version}-{i}",
+                1600000000 + i,
+                f"- Change {i}",
+            )
+            for i in range(config.changelogs_per_package)
+        ]
+        payload = _package_payload(pkg.nevra(), config.package_size)
+        pkg.checksum_type = "sha256"
+        pkg.pkgId = hashlib.sha256(payload).hexdigest()
+        pkg.size_package = len(payload)
+        pkg.size_installed = len(payload) * 2
+        pkg.size_archive = len(payload)
+        pkg.location_href = f"Packages/{name[-1]}/{pkg.nvra()}.rpm"
+        yield pkg, payload
+
+
+def _advisory(config, index, packages):
+    """An advisory for a few of the packages."""
+    update = cr.UpdateRecord()
+    update.id = f"SYNTH-{config.seed}-{index:06}"
+    update.fromstr = "security@example.com"
+    update.status = "final"
+    update.type = ("security", "bugfix", "enhancement")[index % 3]
+    update.version = "1"
+    update.title = f"Synthetic advisory {index}"
+    update.issued_date = 1700000000 + index
+    update.rights = "Copyright Pulp Project"
+    update.release = "Synthetic"
+    update.summary = f"Synthetic advisory {index}"
+    update.description = f"Synthetic advisory {index} generated for benchmarking."
+    update.solution = "Update the packages."
+
+    reference = cr.UpdateReference()
+    reference.href = f"https://bugzilla.example.com/{index}"
+    reference.id = str(index)
+    reference.type = "bugzilla"
+    reference.title = f"Bug {index}"
+    update.append_reference(reference)
+
+    collection = cr.UpdateCollection()
+    collection.shortname = f"synthetic-{index}"
+    collection.name = f"Synthetic collection {index}"
+    for pkg in packages:
+        collection_package = cr.UpdateCollectionPackage()
+        collection_package.name = pkg.name
+        collection_package.epoch = pkg.epoch
+        collection_package.version = pkg.version
+        collection_package.release = pkg.release
+        collection_package.arch = pkg.arch
+        collection_package.filename = os.path.basename(pkg.location_href)
+        collection_package.sum = pkg.pkgId
+        collection_package.sum_type = cr.SHA256
+        collection.append(collection_package)
+    update.append_collection(collection)
+    return update
+
+
+def _modules_yaml(config, packages):
+    """The modules.yaml documents for module streams containing a few of the packages each."""
+    documents = []
+    for index in range(config.modules):
+        artifacts = packages[index :: max(config.modules, 1)][:5]
+        rpms = "".join(
+            f"      - {pkg.name}-{pkg.epoch}:{pkg.version}-{pkg.release}.{pkg.arch}\n"
+            for pkg in artifacts
+        )
+        documents.append(
+            "---\n"
+            "document: modulemd\n"
+            "version: 2\n"
+            "data:\n"
+            f"  name: synthetic-module-{index}\n"
+            '  stream: "1"\n'
+            f"  version: {1700000000 + index}\n"
+            "  context: deadbeef\n"
+            "  arch: x86_64\n"
+            f"  summary: Synthetic module {index}\n"
+            f"  description: Synthetic module {index} generated for benchmarking.\n"
+            "  license:\n"
+            "    module:\n"
+            "    - MIT\n"
+            "  artifacts:\n"
+            "    rpms:\n"
+            f"{rpms}"
+            "...\n"
+        )
+        documents.append(
+            "---\n"
+            "document: modulemd-defaults\n"
+            "version: 1\n"
+            "data:\n"
+            f"  module: synthetic-module-{index}\n"
+            '  stream: "1"\n'
+            "  profiles:\n"
+            '    "1": [default]\n'
+            "...\n"
+        )
+    return "".join(documents)
+
+
+def _comps_xml(config, packages):
+    """The comps.xml with groups containing a few of the package names each."""
+    comps = libcomps.Comps()
+    names = sorted({pkg.name for pkg in packages})
+    for index in range(config.groups):
+        group = libcomps.Group()
+        group.id = f"synthetic-group-{index}"
+        group.name = f"Synthetic group {index}"
+        group.desc = f"Synthetic group {index} generated for benchmarking."
+        for name in names[index :: max(config.groups, 1)][:10]:
+            group.packages.append(libcomps.Package(name, libcomps.PACKAGE_TYPE_MANDATORY))
+        comps.groups.append(group)
+    return comps.xml_str()
+
+
+def generate_synthetic_repo(path, config=SyntheticRepoConfig(), revision=1):
+    """Write a synthetic RPM repository to a directory.
+
+    The same config and revision always produce the same repository. Increasing the revision
+    rebuilds all packages with a new release, to simulate an upstream update.
+
+    Args:
+        path (str): The directory to write the repository to.
+        config (SyntheticRepoConfig): The shape of the repository.
+        revision (int): The release of all packages.
+
+    Returns:
+        list: The NEVRAs of the packages in the repository.
+    """
+    os.makedirs(path, exist_ok=True)
+    packages = []
+    with cr.RepositoryWriter(path, compression=cr.GZ_COMPRESSION) as writer:
+        writer.set_num_of_pkgs(config.packages)
+        for pkg, payload in _packages(config, revision):
+            package_path = os.path.join(path, pkg.location_href)
+            os.makedirs(os.path.dirname(package_path), exist_ok=True)
+            with open(package_path, "wb") as package_file:
+                package_file.write(payload)
+            writer.add_pkg(pkg)
+            # the files and changelogs aren't needed anymore
+            pkg.files = []
+            pkg.changelogs = []
+            packages.append(pkg)
+
+        for index in range(config.advisories):
+            advisory_packages = packages[index :: max(config.advisories, 1)][:3]
+            writer.add_update_record(_advisory(config, index, advisory_packages))
+
+        if config.modules:
+            modules_path = os.path.join(path, "modules.yaml")
+            with open(modules_path, "w") as modules_file:
+                modules_file.write(_modules_yaml(config, packages))
+            writer.add_repomd_metadata("modules", modules_path)
+            os.remove(modules_path)
+
+        if config.groups:
+            comps_path = os.path.join(path, "comps.xml")
+            with open(comps_path, "w") as comps_file:
+                comps_file.write(_comps_xml(config, packages))
+            writer.add_repomd_metadata("group", comps_path, use_compression=False)
+            os.remove(comps_path)
+
+    return [pkg.nevra() for pkg in packages]
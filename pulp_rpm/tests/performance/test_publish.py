@@ -1,6 +1,5 @@
 """Tests that publish rpm plugin repositories."""
 
-from datetime import datetime
 from html.parser import HTMLParser
 from tempfile import NamedTemporaryFile
 from urllib.parse import urljoin
@@ -14,6 +13,7 @@ from pulp_rpm.tests.functional.constants import (
     CENTOS8_STREAM_BASEOS_URL,
     RPM_PACKAGE_CONTENT_NAME,
 )
+from pulp_rpm.tests.functional.utils import parse_date_from_string
 
 
 class PackagesHtmlParser(HTMLParser):
@@ -34,19 +34,6 @@ class PackagesHtmlParser(HTMLParser):
             super().handle_starttag(tag, attrs)
 
 
-def parse_date_from_string(s, parse_format="%Y-%m-%dT%H:%M:%S.%fZ"):
-    """Parse string to datetime object.
-
-    :param s: str like '2018-11-18T21:03:32.493697Z'
-    :param parse_format: str defaults to %Y-%m-%dT%H:%M:%S.%fZ
-    :return: datetime.datetime
-    """
-    if isinstance(s, datetime):
-        return s
-    else:
-        return datetime.strptime(s, parse_format)
-
-
 @pytest.fixture
 def centos_8stream_baseos_extra_tests(
     rpm_distribution_factory,
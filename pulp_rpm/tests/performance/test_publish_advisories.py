@@ -0,0 +1,54 @@
+"""Benchmark of the advisory metadata generated during a publish."""
+
+import logging
+import time
+
+import createrepo_c as cr
+import pytest
+
+from pulp_rpm.app.advisory import update_records_to_createrepo_c
+from pulp_rpm.app.models import UpdateRecord
+from pulp_rpm.tests.unit.utils.content_factory import RepoContentFactory
+from pulp_rpm.tests.unit.utils.query_recorder import QueryRecorder
+
+log = logging.getLogger(__name__)
+
+ADVISORY_COUNT = 20000
+
+
+@pytest.mark.django_db
+def test_publish_advisories(tmp_path, record_property):
+    """Report the number of queries and the time needed to write updateinfo for many advisories.
+
+    Each advisory has a collection with two packages and two references, like typical errata.
+    """
+    with RepoContentFactory() as repo:
+        for i in range(ADVISORY_COUNT):
+            repo.add_advisory(
+                f"PERF-{i:05}",
+                package_names=[f"perf-pkg-{i}-{j}" for j in range(2)],
+                reference_hrefs=[f"https://bugzilla.example.com/{i}-{j}" for j in range(2)],
+            )
+    update_records = UpdateRecord.objects.filter(pk__in=repo.version.content).order_by(
+        "id", "digest"
+    )
+
+    with QueryRecorder() as recorder:
+        start = time.perf_counter()
+        with cr.RepositoryWriter(str(tmp_path), compression=cr.NO_COMPRESSION) as writer:
+            for update_record in update_records_to_createrepo_c(update_records):
+                writer.add_update_record(update_record)
+        duration = time.perf_counter() - start
+
+    # reported in the log and as properties of the test in the junit XML report
+    record_property("duration", round(duration, 2))
+    record_property("queries", len(recorder.queries))
+    log.info(
+        "Published %d advisories in %.2fs with %d queries",
+        ADVISORY_COUNT,
+        duration,
+        len(recorder.queries),
+    )
+    assert "updateinfo" in [record.type for record in writer.repomd.records]
+    # the related objects are fetched per batch of advisories, not per advisory
+    assert len(recorder.queries) < ADVISORY_COUNT / 100
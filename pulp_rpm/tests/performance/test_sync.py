@@ -1,7 +1,6 @@
 """Tests that sync rpm plugin repositories."""
 
 import os
-from datetime import datetime
 
 import pytest
 
@@ -18,19 +17,7 @@ from pulp_rpm.tests.functional.constants import (
     RPM_KICKSTART_CONTENT_NAME,
     RPM_KICKSTART_COUNT,
 )
-
-
-def parse_date_from_string(s, parse_format="%Y-%m-%dT%H:%M:%S.%fZ"):
-    """Parse string to datetime object.
-
-    :param s: str like '2018-11-18T21:03:32.493697Z'
-    :param parse_format: str defaults to %Y-%m-%dT%H:%M:%S.%fZ
-    :return: datetime.datetime
-    """
-    if isinstance(s, datetime):
-        return s
-    else:
-        return datetime.strptime(s, parse_format)
+from pulp_rpm.tests.functional.utils import parse_date_from_string
 
 
 @pytest.mark.parametrize(
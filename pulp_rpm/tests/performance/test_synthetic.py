@@ -0,0 +1,134 @@
+"""Offline benchmarks of sync, resync, publish and copy using generated repositories.
+
+The repositories are generated locally and served by a local HTTP server, so the results don't
+depend on the network or on upstream repositories changing. Peak memory usage is reported when
+the `rpm-sync-stages` task diagnostic is enabled in the `TASK_DIAGNOSTICS` setting.
+"""
+
+import pytest
+import requests
+
+from pulpcore.client.pulp_rpm import Copy, RpmRpmPublication
+
+from pulp_rpm.tests.functional.constants import RPM_PACKAGE_CONTENT_NAME
+from pulp_rpm.tests.functional.utils import parse_date_from_string
+from pulp_rpm.tests.performance.synthetic_repo import SyntheticRepoConfig
+
+pytestmark = pytest.mark.performance
+
+STAGE_PROFILE_ARTIFACT_NAME = "rpm_sync_stages_profile"
+
+CONFIGS = {
+    "small": SyntheticRepoConfig(packages=1000, advisories=100, modules=10, groups=10),
+    "large": SyntheticRepoConfig(
+        packages=20000, files_per_package=50, advisories=2000, modules=100, groups=50
+    ),
+}
+
+
+@pytest.fixture
+def report_task(pulpcore_bindings):
+    """Print the duration, throughput and (if profiled) peak memory usage of a task."""
+
+    def _report_task(step, task, packages):
+        started_at = parse_date_from_string(task.started_at)
+        finished_at = parse_date_from_string(task.finished_at)
+        duration = (finished_at - started_at).total_seconds()
+        peak_rss = "n/a"
+        urls = pulpcore_bindings.TasksApi.profile_artifacts(task.pulp_href).urls
+        if STAGE_PROFILE_ARTIFACT_NAME in urls:
+            profile = requests.get(urls[STAGE_PROFILE_ARTIFACT_NAME]).json()
+            peak_rss = f"{profile['peak_rss'] / 2**20:.0f} MiB"
+        print(
+            f"\n-> {step:<8} => Service time (s): {duration:.2f} | "
+            f"Packages/s: {packages / duration:.0f} | Peak RSS: {peak_rss}"
+        )
+        return duration
+
+    return _report_task
+
+
+@pytest.fixture
+def sync_repository(pulp_requests, monitor_task):
+    """Sync a repository, asking for the sync pipeline to be profiled."""
+
+    def _sync_repository(repository, remote, optimize=True):
+        response = pulp_requests.post(
+            f"{repository.pulp_href}sync/",
+            json={"remote": remote.pulp_href, "optimize": optimize},
+            headers={"X-Task-Diagnostics": "rpm-sync-stages"},
+        )
+        response.raise_for_status()
+        return monitor_task(response.json()["task"])
+
+    return _sync_repository
+
+
+@pytest.mark.parametrize("config", CONFIGS.values(), ids=CONFIGS.keys())
+def test_synthetic_repo(
+    config,
+    synthetic_repo_url,
+    sync_repository,
+    report_task,
+    rpm_repository_factory,
+    rpm_rpmremote_factory,
+    rpm_rpmremote_api,
+    rpm_repository_api,
+    rpm_repository_version_api,
+    rpm_publication_api,
+    rpm_copy_api,
+    monitor_task,
+    delete_orphans_pre,
+):
+    """Sync, resync, publish and copy a synthetic repository.
+
+    1. Sync the repository with the immediate policy.
+    2. Sync it again without optimization, nothing changes.
+    3. Sync a new revision of the repository, in which every package has been updated.
+    4. Publish the latest repository version.
+    5. Copy all packages of the latest repository version to another repository.
+    """
+    repository = rpm_repository_factory()
+    remote = rpm_rpmremote_factory(url=synthetic_repo_url(config), policy="immediate")
+
+    task = sync_repository(repository, remote)
+    report_task("Sync", task, config.packages)
+    repository = rpm_repository_api.read(repository.pulp_href)
+    present = rpm_repository_version_api.read(repository.latest_version_href).content_summary
+    assert present.present[RPM_PACKAGE_CONTENT_NAME]["count"] == config.packages
+
+    latest_version_href = repository.latest_version_href
+    task = sync_repository(repository, remote, optimize=False)
+    report_task("Resync", task, config.packages)
+    repository = rpm_repository_api.read(repository.pulp_href)
+    assert repository.latest_version_href == latest_version_href
+
+    monitor_task(
+        rpm_rpmremote_api.partial_update(
+            remote.pulp_href, {"url": synthetic_repo_url(config, revision=2)}
+        ).task
+    )
+    task = sync_repository(repository, remote)
+    report_task("Update", task, config.packages)
+    repository = rpm_repository_api.read(repository.pulp_href)
+
+    publish_response = rpm_publication_api.create(
+        RpmRpmPublication(repository=repository.pulp_href)
+    )
+    task = monitor_task(publish_response.task)
+    report_task("Publish", task, config.packages * 2)
+
+    destination = rpm_repository_factory()
+    copy_response = rpm_copy_api.copy_content(
+        Copy(
+            config=[
+                {
+                    "source_repo_version": repository.latest_version_href,
+                    "dest_repo": destination.pulp_href,
+                }
+            ],
+            dependency_solving=False,
+        )
+    )
+    task = monitor_task(copy_response.task)
+    report_task("Copy", task, config.packages * 2)
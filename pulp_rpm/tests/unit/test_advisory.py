@@ -1,15 +1,32 @@
+import importlib
 import json
 import unittest
 
+from django.apps import apps
 from django.test import TestCase
 
 # The code we're testing relies on createrepo_c, which is not available everywhere.
 # If we can't import pulp_rpm.app.advisory, set a flag so we know to skip this test on the
 # platform we're running on at the moment.
 try:
-    from pulp_rpm.app.advisory import resolve_advisory_conflict
+    import createrepo_c as cr
+
+    from pulp_rpm.app.advisory import (
+        hash_update_record,
+        resolve_advisory_conflict,
+        update_record_digest,
+        update_records_to_createrepo_c,
+    )
     from pulp_rpm.app.exceptions import AdvisoryConflict
+    from pulp_rpm.app.models import (
+        UpdateCollection,
+        UpdateCollectionPackage,
+        UpdateRecord,
+        UpdateReference,
+    )
     from pulp_rpm.app.serializers.advisory import UpdateRecordSerializer
+    from pulp_rpm.tests.unit.utils.content_factory import RepoContentFactory
+    from pulp_rpm.tests.unit.utils.query_recorder import QueryRecorder
 
     no_createrepo = False
 except ModuleNotFoundError:
@@ -460,3 +477,173 @@ class TestAdvisoryConflicts(TestCase):
         finally:
             existing.delete()
             incoming.delete()
+
+
+@unittest.skipIf(
+    no_createrepo,
+    "This test can only be run on a system that supports createrepo_c",
+)
+class TestBulkAdvisoryConversion(TestCase):
+    """Test converting advisories to createrepo_c objects in bulk."""
+
+    def test_update_records_to_createrepo_c(self):
+        """
+        Converting in bulk gives the same advisories as converting them one by one, with a
+        number of queries that does not depend on the number of advisories in a batch.
+        """
+        urs = UpdateRecordSerializer()
+        pks = []
+        for i, data in enumerate((BEAR_DOG_JSON, BIRD_JSON, CAMEL_BEAR_BIRD_JSON)):
+            data = json.loads(data)
+            data["references"] = [
+                {"href": f"https://bugzilla.example.com/{i}{j}", "id": f"{i}{j}", "type": "bz"}
+                for j in range(2)
+            ]
+            pks.append(urs.create(data).pk)
+        update_records = UpdateRecord.objects.filter(pk__in=pks).order_by("id", "digest")
+
+        expected = [hash_update_record(rec.to_createrepo_c()) for rec in update_records]
+        with QueryRecorder() as recorder:
+            converted = [
+                hash_update_record(rec)
+                for rec in update_records_to_createrepo_c(update_records, batch_size=2)
+            ]
+        self.assertEqual(converted, expected)
+        # one query for the advisories, three for the related objects of each batch
+        self.assertLessEqual(len(recorder.queries), 1 + 3 * 2)
+
+    def test_update_records_to_createrepo_c_queries(self):
+        """The related objects of many advisories are fetched per batch, not per advisory."""
+        with RepoContentFactory() as repo:
+            for i in range(50):
+                repo.add_advisory(
+                    f"TEST-{i:03}",
+                    package_names=[f"test-pkg-{i}-{j}" for j in range(2)],
+                    reference_hrefs=[f"https://bugzilla.example.com/{i}-{j}" for j in range(2)],
+                )
+        update_records = UpdateRecord.objects.filter(pk__in=repo.version.content).order_by(
+            "id", "digest"
+        )
+
+        with QueryRecorder() as recorder:
+            converted = list(update_records_to_createrepo_c(update_records, batch_size=10))
+        self.assertEqual([update.id for update in converted], [f"TEST-{i:03}" for i in range(50)])
+        self.assertEqual([len(update.references) for update in converted], [2] * 50)
+        self.assertLessEqual(len(recorder.queries), 1 + 3 * 5)
+
+
+def _cr_advisory(collection_names=("first", "second"), references=("1", "2")):
+    update = cr.UpdateRecord()
+    update.id = "TEST-2024-0001"
+    update.title = "Test advisory"
+    update.issued_date = 1700000000
+    for name in collection_names:
+        collection = cr.UpdateCollection()
+        collection.name = name
+        for package_name in ("bear", "dog"):
+            package = cr.UpdateCollectionPackage()
+            package.name = f"{name}-{package_name}"
+            package.version = "1.0"
+            package.sum_type = cr.SHA256
+            collection.append(package)
+        update.append_collection(collection)
+    for ref_id in references:
+        reference = cr.UpdateReference()
+        reference.href = f"https://bugzilla.example.com/{ref_id}"
+        reference.id = ref_id
+        update.append_reference(reference)
+    return update
+
+
+@unittest.skipIf(
+    no_createrepo,
+    "This test can only be run on a system that supports createrepo_c",
+)
+class TestAdvisoryDigest(unittest.TestCase):
+    """Test the canonical digest of advisories."""
+
+    def test_canonical_digest(self):
+        """
+        The digest depends on the contents of an advisory, not on the order of its collections
+        and references, and is the same when computed from the model fields.
+        """
+        digest = hash_update_record(_cr_advisory())
+        self.assertEqual(hash_update_record(_cr_advisory(("second", "first"), ("2", "1"))), digest)
+        self.assertNotEqual(hash_update_record(_cr_advisory(("first",))), digest)
+        self.assertNotEqual(hash_update_record(_cr_advisory(references=("1", "3"))), digest)
+
+        # e.g. as read from the database, with the primary keys and relations of the models
+        update = _cr_advisory()
+        self.assertEqual(
+            update_record_digest(
+                {"pulp_id": 1, **UpdateRecord.createrepo_to_dict(update)},
+                [
+                    (
+                        {"pulp_id": 2, **UpdateCollection.createrepo_to_dict(collection)},
+                        [
+                            {
+                                "update_collection_id": 2,
+                                **UpdateCollectionPackage.createrepo_to_dict(package),
+                            }
+                            for package in reversed(collection.packages)
+                        ],
+                    )
+                    for collection in update.collections
+                ],
+                [UpdateReference.createrepo_to_dict(reference) for reference in update.references],
+            ),
+            digest,
+        )
+
+
+def _save_advisory(update, digest):
+    record = UpdateRecord.objects.create(digest=digest, **UpdateRecord.createrepo_to_dict(update))
+    for collection in update.collections:
+        update_collection = UpdateCollection.objects.create(
+            update_record=record, **UpdateCollection.createrepo_to_dict(collection)
+        )
+        for package in collection.packages:
+            UpdateCollectionPackage.objects.create(
+                update_collection=update_collection,
+                **UpdateCollectionPackage.createrepo_to_dict(package),
+            )
+    for reference in update.references:
+        UpdateReference.objects.create(
+            update_record=record, **UpdateReference.createrepo_to_dict(reference)
+        )
+    return record
+
+
+@unittest.skipIf(
+    no_createrepo,
+    "This test can only be run on a system that supports createrepo_c",
+)
+class TestCanonicalDigestMigration(TestCase):
+    """Test the migration of the advisory digests to canonical ones."""
+
+    def test_recompute_advisory_digests(self):
+        """
+        The advisories get the digest of their contents, unless another advisory with the same
+        contents already got it.
+        """
+        migration = importlib.import_module(
+            "pulp_rpm.app.migrations.0076_DATA_canonical_advisory_digest"
+        )
+        pks = [
+            _save_advisory(_cr_advisory(), "xml-digest-1").pk,
+            _save_advisory(_cr_advisory(("second", "first"), ("2", "1")), "xml-digest-2").pk,
+        ]
+        single = _save_advisory(_cr_advisory(("first",)), "xml-digest-3")
+
+        with self.assertLogs(migration.logger, "WARNING") as logs:
+            migration.recompute_advisory_digests(apps, None)
+
+        digest = hash_update_record(_cr_advisory())
+        digests = set(UpdateRecord.objects.filter(pk__in=pks).values_list("digest", flat=True))
+        self.assertIn(digest, digests)
+        (kept,) = digests - {digest}
+        self.assertIn(kept, ("xml-digest-1", "xml-digest-2"))
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(kept, logs.output[0])
+        single.refresh_from_db()
+        self.assertEqual(single.digest, hash_update_record(_cr_advisory(("first",))))
@@ -0,0 +1,58 @@
+import asyncio
+
+from pulp_rpm.app.downloaders import UlnSessionKeys
+
+
+def test_uln_session_keys():
+    """Concurrent downloaders share one login per account, until the key is invalidated."""
+    session_keys = UlnSessionKeys(ttl=60)
+    logins = []
+
+    async def login():
+        logins.append(None)
+        await asyncio.sleep(0.01)
+        return f"key-{len(logins)}"
+
+    async def get_keys(account, count):
+        return await asyncio.gather(*(session_keys.get(account, login) for _ in range(count)))
+
+    assert asyncio.run(get_keys(("server", "user", "pass"), 5)) == ["key-1"] * 5
+    assert asyncio.run(get_keys(("server", "other", "pass"), 2)) == ["key-2"] * 2
+    assert len(logins) == 2
+
+    # an outdated key doesn't invalidate the new one
+    session_keys.invalidate(("server", "user", "pass"), "key-1")
+    session_keys.invalidate(("server", "user", "pass"), "key-1")
+    assert asyncio.run(get_keys(("server", "user", "pass"), 3)) == ["key-3"] * 3
+    session_keys.invalidate(("server", "user", "pass"), "key-1")
+    assert asyncio.run(get_keys(("server", "user", "pass"), 1)) == ["key-3"]
+
+    session_keys.ttl = 0
+    session_keys.invalidate(("server", "user", "pass"), "key-3")
+    assert asyncio.run(get_keys(("server", "user", "pass"), 1)) == ["key-4"]
+    assert asyncio.run(get_keys(("server", "user", "pass"), 1)) == ["key-5"]
+
+
+def test_uln_session_keys_concurrent_invalidation():
+    """A key invalidated by another thread at the same time is only forgotten once."""
+    session_keys = UlnSessionKeys(ttl=60)
+
+    class InvalidatedKeys(dict):
+        def get(self, account, default=None):
+            # the other thread forgets the key right after this one has checked it
+            value = super().get(account, default)
+            self.pop(account, None)
+            return value
+
+    session_keys._keys = InvalidatedKeys({("server", "user", "pass"): ("key-1", 0)})
+    session_keys.invalidate(("server", "user", "pass"), "key-1")
+    assert session_keys._keys == {}
+
+
+def test_uln_session_keys_account():
+    """Accounts are told apart by their password without keeping it."""
+    account = UlnSessionKeys.account("server", "user", "pass")
+    assert "pass" not in account
+    assert account == UlnSessionKeys.account("server", "user", "pass")
+    assert account != UlnSessionKeys.account("server", "user", "other")
+    assert account != UlnSessionKeys.account("other", "user", "pass")
@@ -1,6 +1,28 @@
+import hashlib
+import os
+import re
+from types import SimpleNamespace
+from unittest import mock
+
+import createrepo_c as cr
+import pytest
+from django.core.files.storage import FileSystemStorage
 from django.test import TestCase
 
-from pulp_rpm.app.tasks.publishing import PkgBuild, _CollisionManager
+from pulp_rpm.app.models import Package, PackageXmlSnippet
+from pulp_rpm.app.tasks import publishing
+from pulp_rpm.app.tasks.publishing import (
+    PACKAGE_METADATA_TYPES,
+    PackageInfo,
+    PkgBuild,
+    _CollisionManager,
+    _PreviousPackageChunks,
+    add_packages_in_batches,
+    add_zchunk_repo_metadata,
+    compress_repo_metadata,
+    generate_metadata,
+)
+from pulp_rpm.tests.unit.utils.content_factory import RepoContentFactory
 
 
 class TestPublishing(TestCase):
@@ -30,3 +52,309 @@ class TestPublishing(TestCase):
         self.assertEqual([mid_build_time.cid], cm.retained_cids())
         cm.add(high_build_time, "nevra2", "path")
         self.assertEqual([high_build_time.cid], cm.retained_cids())
+
+
+def _write_repo(path, pkgs, chunks=None):
+    with cr.RepositoryWriter(str(path), compression=cr.NO_COMPRESSION) as writer:
+        writer.set_num_of_pkgs(len(pkgs))
+        for pkg in pkgs:
+            reused = chunks and chunks.get(pkg.pkgId, pkg.location_href)
+            if reused:
+                for name, chunk in zip(PACKAGE_METADATA_TYPES, reused):
+                    writer.working_metadata_files[name].writer.add_chunk(chunk)
+            else:
+                writer.add_pkg(pkg)
+    return {
+        record.type: os.path.join(path, record.location_href) for record in writer.repomd.records
+    }
+
+
+def _make_pkg(name, location_href):
+    pkg = cr.Package()
+    pkg.name = name
+    pkg.arch = "noarch"
+    pkg.epoch = "0"
+    pkg.version = "1.0"
+    pkg.release = "1"
+    pkg.checksum_type = "sha256"
+    pkg.pkgId = hashlib.sha256(location_href.encode()).hexdigest()
+    pkg.location_href = location_href
+    pkg.files = [(None, "/usr/share/", name)]
+    pkg.changelogs = [("Packager <p@example.com> - 1.0-1", 1, "- </package>\n<package")]
+    return pkg
+
+
+def test_previous_package_chunks(tmp_path):
+    """Test that spliced chunks of a previous publication reproduce the same metadata."""
+    pkgs = [_make_pkg(name, f"Packages/{name[0]}/{name}&1.rpm") for name in ("bear", "cat")]
+    previous = _write_repo(tmp_path / "previous", pkgs)
+    chunks = _PreviousPackageChunks({name: previous[name] for name in PACKAGE_METADATA_TYPES})
+
+    assert chunks.get(pkgs[0].pkgId, "Packages/b/other.rpm") is None
+    assert chunks.get(pkgs[0].pkgId, pkgs[0].location_href)[1].startswith(
+        f'<package pkgid="{pkgs[0].pkgId}" name="bear"'
+    )
+
+    pkgs.append(_make_pkg("dog", "Packages/d/dog.rpm"))
+    spliced = _write_repo(tmp_path / "spliced", pkgs, chunks)
+    rebuilt = _write_repo(tmp_path / "rebuilt", pkgs)
+    chunks.close()
+    for name in PACKAGE_METADATA_TYPES:
+        with open(spliced[name], "rb") as spliced_file, open(rebuilt[name], "rb") as rebuilt_file:
+            assert spliced_file.read() == rebuilt_file.read()
+
+
+def _published_metadata(path, metadata_types=PACKAGE_METADATA_TYPES):
+    paths = _write_repo(path, [_make_pkg("bear", "Packages/b/bear.rpm")])
+    domain = SimpleNamespace(get_storage=lambda: FileSystemStorage(location=str(path)))
+    relative_paths = [os.path.join("repodata", "repomd.xml")] + [
+        os.path.relpath(paths[name], path) for name in metadata_types
+    ]
+    return [
+        SimpleNamespace(
+            relative_path=relative_path,
+            content_artifact=SimpleNamespace(
+                artifact=SimpleNamespace(
+                    pulp_domain=domain, file=SimpleNamespace(name=relative_path)
+                )
+            ),
+        )
+        for relative_path in relative_paths
+    ]
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    workdir = tmp_path / "work"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    return workdir
+
+
+def _from_publication(published_artifacts):
+    with mock.patch.object(publishing, "PublishedArtifact") as published_artifact:
+        published_artifact.objects.filter.return_value.select_related.return_value = (
+            published_artifacts
+        )
+        return _PreviousPackageChunks.from_publication(mock.Mock(), "repodata")
+
+
+def test_previous_package_chunks_from_publication(tmp_path, workdir):
+    """The metadata is fetched into a directory which is removed when the index is closed."""
+    chunks = _from_publication(_published_metadata(tmp_path / "previous"))
+
+    assert chunks.get(hashlib.sha256(b"Packages/b/bear.rpm").hexdigest(), "Packages/b/bear.rpm")
+    assert len(os.listdir(workdir)) == 1
+    chunks.close()
+    assert os.listdir(workdir) == []
+
+
+def test_previous_package_chunks_missing_metadata(tmp_path, workdir):
+    """Nothing is left behind if a metadata file of the publication is missing."""
+    published = _published_metadata(tmp_path / "previous", ("primary", "filelists"))
+
+    assert _from_publication(published) is None
+    assert os.listdir(workdir) == []
+
+
+def test_previous_package_chunks_failed_copy(tmp_path, workdir, monkeypatch):
+    """Nothing is left behind if a metadata file can't be fetched."""
+    copy_artifact = _PreviousPackageChunks._copy_artifact
+
+    def failing_copy_artifact(artifact, path):
+        if path.endswith("other.xml"):
+            raise OSError("storage is gone")
+        copy_artifact(artifact, path)
+
+    monkeypatch.setattr(_PreviousPackageChunks, "_copy_artifact", failing_copy_artifact)
+
+    with pytest.raises(OSError):
+        _from_publication(_published_metadata(tmp_path / "previous"))
+    assert os.listdir(workdir) == []
+
+
+@pytest.mark.django_db
+def test_package_xml_snippet_cache(tmp_path, monkeypatch):
+    """Test that rendered package XML is cached and reused by later publishes."""
+    with RepoContentFactory() as repo:
+        pks = repo.add_packages(["bear", "cat"])
+    retained_packages = {
+        pk: PackageInfo(
+            caid=None, path=f"Packages/{pk}.rpm", checksum_type="sha256", checksum=f"digest-{pk}"
+        )
+        for pk in pks
+    }
+    packages = Package.objects.filter(pk__in=pks).order_by("name", "evr")
+
+    def publish_packages(name, repo_pkg_times=None):
+        with cr.RepositoryWriter(str(tmp_path / name), compression=cr.NO_COMPRESSION) as writer:
+            writer.set_num_of_pkgs(len(pks))
+            add_packages_in_batches(writer, packages, retained_packages, repo_pkg_times or {})
+        records = {record.type: record.location_href for record in writer.repomd.records}
+        with open(tmp_path / name / records["primary"]) as primary:
+            return primary.read()
+
+    # e.g. the time the package was added to a repository
+    repo_pkg_times = {pks[0]: 1700000000.5}
+    monkeypatch.setattr(publishing, "RPM_PACKAGE_XML_CACHE", False)
+    rendered_with_time = publish_packages("rendered_with_time", repo_pkg_times)
+    monkeypatch.setattr(publishing, "RPM_PACKAGE_XML_CACHE", True)
+    rendered = publish_packages("rendered")
+    assert PackageXmlSnippet.objects.filter(package__in=pks).count() == 2
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Package should not have been rendered again")
+
+    monkeypatch.setattr(Package, "to_createrepo_c", fail)
+    assert publish_packages("cached") == rendered
+    assert f'<location href="Packages/{pks[0]}.rpm"/>' in rendered
+    # the file time is set in the cached XML, not cached with it
+    assert publish_packages("cached_with_time", repo_pkg_times) == rendered_with_time
+    assert '<time file="1700000000"' in rendered_with_time
+    assert PackageXmlSnippet.objects.filter(package__in=pks).count() == 2
+
+
+@pytest.mark.parametrize("compression_type", [cr.GZ, cr.ZSTD])
+def test_compress_repo_metadata(tmp_path, compression_type):
+    """Test that compressing metadata afterwards gives the same result as the writer itself."""
+    pkgs = [_make_pkg(name, f"Packages/{name[0]}/{name}.rpm") for name in ("bear", "cat")]
+    comps_path = tmp_path / "comps.xml"
+    comps_path.write_text("<comps/>\n")
+    update = cr.UpdateRecord()
+    update.id = "RHSA-1"
+
+    def write_repo(name, writer_compression_type):
+        with cr.RepositoryWriter(str(tmp_path / name), compression=writer_compression_type) as w:
+            w.set_num_of_pkgs(len(pkgs))
+            for pkg in pkgs:
+                w.add_pkg(pkg)
+            w.add_update_record(update)
+            w.add_repomd_metadata("group", str(comps_path), use_compression=False)
+        return w
+
+    expected = write_repo("expected", compression_type)
+    writer = write_repo("compressed", cr.NO_COMPRESSION)
+    compress_repo_metadata(writer, compression_type, cr.SHA256)
+
+    def normalize(repodata_dir):
+        with open(repodata_dir / "repomd.xml") as repomd:
+            return re.sub(r"<(revision|timestamp)>\d+<", "", repomd.read())
+
+    assert normalize(writer.repodata_dir) == normalize(expected.repodata_dir)
+    assert sorted(os.listdir(writer.repodata_dir)) == sorted(os.listdir(expected.repodata_dir))
+    for record in expected.repomd.records:
+        with open(expected.path / record.location_href, "rb") as expected_file:
+            with open(writer.path / record.location_href, "rb") as compressed_file:
+                assert compressed_file.read() == expected_file.read()
+
+
+@pytest.mark.skipif(not cr.HAS_ZCK, reason="createrepo_c was built without zchunk support")
+def test_add_zchunk_repo_metadata(tmp_path):
+    """Test that zchunk variants of the metadata files are added to repomd.xml."""
+    pkgs = [_make_pkg(name, f"Packages/{name[0]}/{name}.rpm") for name in ("bear", "cat")]
+    with cr.RepositoryWriter(str(tmp_path / "repo"), compression=cr.GZ) as writer:
+        writer.set_num_of_pkgs(len(pkgs))
+        for pkg in pkgs:
+            writer.add_pkg(pkg)
+
+    add_zchunk_repo_metadata(writer, cr.SHA256)
+
+    repomd = cr.Repomd(str(writer.repodata_dir / "repomd.xml"))
+    records = {record.type: record for record in repomd.records}
+    assert {"primary", "filelists", "other"} <= records.keys()
+    for name in PACKAGE_METADATA_TYPES:
+        record = records[f"{name}_zck"]
+        assert record.location_href.endswith(f"-{name}.xml.zck")
+        assert record.checksum_open == records[name].checksum_open
+        assert record.size_header > 0
+        assert os.path.exists(writer.path / record.location_href)
+    assert not [path for path in os.listdir(writer.repodata_dir) if path.startswith("zck-")]
+
+
+def _write_pid(repository_version_pk, path):
+    with open(path, "w") as f:
+        f.write(f"{repository_version_pk} {os.getpid()}")
+
+
+def _generate_metadata(tmp_path, sub_repo_count):
+    progress_report = mock.Mock()
+    main_repo = mock.Mock()
+    sub_repos = [(i, dict(path=tmp_path / f"{i}.pid")) for i in range(sub_repo_count)]
+
+    generate_metadata(main_repo, sub_repos, progress_report)
+
+    main_repo.assert_called_once_with()
+    assert progress_report.increment.call_count == 1 + sub_repo_count
+    pids = []
+    for i in range(sub_repo_count):
+        repository_version_pk, pid = (tmp_path / f"{i}.pid").read_text().split()
+        assert repository_version_pk == str(i)
+        pids.append(int(pid))
+    return pids
+
+
+@pytest.mark.parametrize("sub_repo_count", [1, 3])
+def test_generate_metadata_in_processes(tmp_path, monkeypatch, sub_repo_count):
+    """Even a single sub-repo is generated in another process while the main repo is generated."""
+    monkeypatch.setattr(publishing, "MAX_PUBLISH_METADATA_WORKERS", 2)
+    monkeypatch.setattr(publishing, "generate_repo_version_metadata", _write_pid)
+
+    pids = _generate_metadata(tmp_path, sub_repo_count)
+
+    assert os.getpid() not in pids
+
+
+def _getpid(*args):
+    return os.getpid()
+
+
+def _compress_in_sub_repo_worker(repository_version_pk, path):
+    compressed_records = publishing._compress_metadata_files(
+        ["primary", "filelists"], ["primary.xml", "filelists.xml"], cr.GZ_COMPRESSION, cr.SHA256
+    )
+    _write_pid(repository_version_pk, path)
+    with open(f"{path}.compressed", "w") as f:
+        f.write(" ".join(str(pid) for pid in compressed_records.values()))
+
+
+def test_generate_metadata_no_nested_pools(tmp_path, monkeypatch):
+    """The sub-repo workers compress their metadata files themselves, without a pool."""
+    monkeypatch.setattr(publishing, "MAX_PUBLISH_METADATA_WORKERS", 2)
+    monkeypatch.setattr(publishing, "generate_repo_version_metadata", _compress_in_sub_repo_worker)
+    monkeypatch.setattr(publishing, "_compress_metadata_file", _getpid)
+
+    pids = _generate_metadata(tmp_path, 2)
+
+    for i, pid in enumerate(pids):
+        assert (tmp_path / f"{i}.pid.compressed").read_text().split() == [str(pid)] * 2
+    # this process still compresses in a pool
+    assert not publishing._in_sub_repo_worker
+    compressed_records = publishing._compress_metadata_files(
+        ["primary", "filelists"], ["primary.xml", "filelists.xml"], cr.GZ_COMPRESSION, cr.SHA256
+    )
+    assert os.getpid() not in compressed_records.values()
+
+
+def test_generate_metadata_in_atomic_block(tmp_path, monkeypatch):
+    """The sub-repos are generated one after another in this process inside a transaction."""
+    monkeypatch.setattr(publishing, "MAX_PUBLISH_METADATA_WORKERS", 2)
+    monkeypatch.setattr(publishing, "generate_repo_version_metadata", _write_pid)
+    monkeypatch.setattr(publishing, "connection", mock.Mock(in_atomic_block=True))
+
+    with mock.patch.object(publishing, "ProcessPoolExecutor") as executor:
+        pids = _generate_metadata(tmp_path, 2)
+
+    executor.assert_not_called()
+    assert pids == [os.getpid(), os.getpid()]
+
+
+def test_generate_metadata_without_workers(tmp_path, monkeypatch):
+    """With a single worker the sub-repos are generated in this process."""
+    monkeypatch.setattr(publishing, "MAX_PUBLISH_METADATA_WORKERS", 1)
+    monkeypatch.setattr(publishing, "generate_repo_version_metadata", _write_pid)
+
+    with mock.patch.object(publishing, "ProcessPoolExecutor") as executor:
+        pids = _generate_metadata(tmp_path, 2)
+
+    executor.assert_not_called()
+    assert pids == [os.getpid(), os.getpid()]
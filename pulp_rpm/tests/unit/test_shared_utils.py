@@ -1,7 +1,20 @@
+import hashlib
+import os
+import tempfile
 from datetime import datetime
-from unittest import TestCase
+from types import SimpleNamespace
+from unittest import TestCase, mock
 
-from pulp_rpm.app.shared_utils import is_previous_version, parse_time, urlpath_sanitize
+import rpm_rs
+from django.core.files.storage import FileSystemStorage
+
+from pulp_rpm.app.shared_utils import (
+    is_previous_version,
+    parse_time,
+    read_crpackage_from_artifact,
+    rpm_header_size,
+    urlpath_sanitize,
+)
 
 
 class TestSharedUtils(TestCase):
@@ -83,3 +96,53 @@ class TestSharedUtils(TestCase):
         self.assertNotEqual(iso_input, parse_time(iso_input))
 
         self.assertIsNone(parse_time("abcd"))
+
+
+class TestRpmHeader(TestCase):
+    """Test reading the header of RPMs on its own."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        builder = rpm_rs.PackageBuilder("bear", "4.1", "MIT", "noarch", "A bear")
+        builder.release("1")
+        builder.with_file_contents(os.urandom(300000), rpm_rs.FileOptions.new("/usr/share/bear"))
+        self.path = os.path.join(self.directory.name, "bear.rpm")
+        builder.build().write_file(self.path)
+        with open(self.path, "rb") as f:
+            data = f.read()
+        storage = FileSystemStorage(location=self.directory.name)
+        self.artifact = SimpleNamespace(
+            pk="1",
+            pulp_id="1",
+            file=SimpleNamespace(name="bear.rpm"),
+            size=len(data),
+            sha256=hashlib.sha256(data).hexdigest(),
+            pulp_domain=SimpleNamespace(get_storage=lambda: storage),
+        )
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_rpm_header_size(self):
+        """The header ends where the payload starts."""
+        with open(self.path, "rb") as f:
+            data = f.read()
+        payload = rpm_rs.PackageMetadata.open(self.path).package_segment_offsets().payload
+        self.assertEqual(rpm_header_size(data), payload)
+        self.assertIsNone(rpm_header_size(data[:200]))
+        with self.assertRaises(ValueError):
+            rpm_header_size(b"x" * 200)
+
+    def test_read_crpackage_from_artifact(self):
+        """Only the header is read, the package is the same as when reading the whole file."""
+        with mock.patch("pulp_rpm.app.shared_utils.RPM_HEADER_READ_SIZE", 200):
+            with mock.patch("pulp_rpm.app.shared_utils._copy_artifact_file") as copy:
+                cr_pkg, signing_keys = read_crpackage_from_artifact(
+                    self.artifact, working_dir=self.directory.name
+                )
+        copy.assert_not_called()
+        self.assertEqual(cr_pkg.name, "bear")
+        self.assertEqual(cr_pkg.pkgId, self.artifact.sha256)
+        self.assertEqual(cr_pkg.size_package, self.artifact.size)
+        self.assertEqual(cr_pkg.size_installed, 300000)
+        self.assertEqual(signing_keys, [])
@@ -1,11 +1,14 @@
+import uuid
 from types import SimpleNamespace
+from unittest import mock
 
 import pytest
 import requests
 import rpm_rs
 
+from pulp_rpm.app.models.content import RpmPackageSigningService
 from pulp_rpm.app.shared_utils import extract_signing_keys, format_signing_keys, signing_key_matches
-from pulp_rpm.app.tasks.signing import _verify_package_fingerprint
+from pulp_rpm.app.tasks.signing import _verify_package_fingerprint, _verify_stored_fingerprint
 from pulp_rpm.tests.functional.constants import (
     RPM_FIXTURE_KEYID_SIGNED,
     RPM_FIXTURE_SIGNED,
@@ -236,3 +239,45 @@ def test_extract_signing_keys_signed_rpm(signed_rpm):
 def test_extract_signing_keys_unsigned_rpm(unsigned_rpm):
     keys = extract_signing_keys(unsigned_rpm)
     assert keys == []
+
+
+@pytest.mark.django_db
+def test_verify_stored_fingerprint():
+    """The artifact is only read if the signing keys of the package are unknown."""
+    package = SimpleNamespace(pk=uuid.uuid4(), filename="foo.rpm", signing_keys=None)
+    with mock.patch(
+        "pulp_rpm.app.tasks.signing.read_signing_keys_from_artifact",
+        return_value=[f"v4:{V4_FINGERPRINT}"],
+    ) as read_signing_keys:
+        assert _verify_stored_fingerprint(package, "artifact", f"v4:{V4_FINGERPRINT}")
+        assert package.signing_keys == [f"v4:{V4_FINGERPRINT}"]
+        assert not _verify_stored_fingerprint(package, "artifact", f"v6:{V6_FINGERPRINT}")
+        package.signing_keys = []
+        assert not _verify_stored_fingerprint(package, "artifact", f"v4:{V4_FINGERPRINT}")
+    read_signing_keys.assert_called_once_with("artifact")
+
+
+# Tests for the batch signing protocol
+
+
+def test_sign_batch(tmp_path):
+    script = tmp_path / "sign.sh"
+    script.write_text(
+        "#!/usr/bin/env bash\n"
+        'printf \'{"rpm_packages": [%s], "batch": "%s", "key": "%s"}\' '
+        '"$(printf \'"%s",\' "$@" | sed \'s/,$//\')" '
+        '"$PULP_SIGNING_BATCH" "$PULP_SIGNING_KEY_FINGERPRINT"\n'
+    )
+    script.chmod(0o755)
+    signing_service = RpmPackageSigningService(script=str(script))
+
+    result = signing_service.sign_batch(
+        [tmp_path / "a.rpm", tmp_path / "b.rpm"], pubkey_fingerprint=V4_FINGERPRINT
+    )
+    assert result == {
+        "rpm_packages": [str(tmp_path / "a.rpm"), str(tmp_path / "b.rpm")],
+        "batch": "true",
+        "key": V4_FINGERPRINT,
+    }
+    with pytest.raises(ValueError):
+        signing_service.sign_batch([tmp_path / "a.rpm"])
@@ -0,0 +1,82 @@
+import asyncio
+from unittest import mock
+
+import pytest
+
+from pulpcore.plugin.models import Task
+from pulpcore.plugin.stages import EndStage, Stage, create_pipeline
+
+from pulp_rpm.app.stage_profiling import PipelineProfiler, stage_profile_name
+
+
+class Item:
+    does_batch = True
+
+    def __init__(self, number):
+        self.number = number
+
+
+class ProduceStage(Stage):
+    async def run(self):
+        for number in range(10):
+            await self.put(Item(number))
+
+
+class PassStage(Stage):
+    async def run(self):
+        async for item in self.items():
+            await self.put(item)
+
+
+class DropOddStage(Stage):
+    async def run(self):
+        async for batch in self.batches(minsize=3):
+            for item in batch:
+                if item.number % 2 == 0:
+                    await self.put(item)
+
+
+@pytest.mark.django_db
+def test_pipeline_profiler():
+    """Items flowing through profiled stages are counted per stage."""
+    profiler = PipelineProfiler()
+    stages = profiler.wrap([ProduceStage(), PassStage(), DropOddStage()])
+
+    asyncio.run(create_pipeline(stages + [EndStage()]))
+
+    report = profiler.report()
+    assert [stage["name"] for stage in report["stages"]] == [
+        "ProduceStage",
+        "PassStage",
+        "DropOddStage",
+    ]
+    produce, passthrough, drop_odd = report["stages"]
+    assert (produce["items_in"], produce["items_out"]) == (0, 10)
+    assert (passthrough["items_in"], passthrough["items_out"]) == (10, 10)
+    assert (drop_odd["items_in"], drop_odd["items_out"]) == (10, 5)
+    assert report["duration"] > 0
+    assert report["peak_rss"] > 0
+    for stage in report["stages"]:
+        assert stage["duration"] <= report["duration"]
+        assert stage["peak_rss"] > 0
+
+
+@pytest.mark.django_db
+def test_pipeline_profiles_of_one_task(tmp_path, monkeypatch):
+    """The pipelines of the repositories of a kickstart tree are saved under their own names."""
+    monkeypatch.chdir(tmp_path)
+    task = Task.objects.create(name="sync", state="running")
+
+    with mock.patch("pulp_rpm.app.stage_profiling.Task.current", return_value=task):
+        for namespace in ("BaseOS", "", "addons/HA"):
+            profiler = PipelineProfiler()
+            stages = profiler.wrap([ProduceStage(), PassStage()])
+            asyncio.run(create_pipeline(stages + [EndStage()]))
+            profiler.save(stage_profile_name(namespace))
+
+    names = Task.profile_artifacts.through.objects.filter(task=task).values_list("name", flat=True)
+    assert sorted(names) == [
+        "rpm_sync_stages_profile",
+        "rpm_sync_stages_profile-BaseOS",
+        "rpm_sync_stages_profile-addons-HA",
+    ]
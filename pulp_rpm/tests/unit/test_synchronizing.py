@@ -0,0 +1,582 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import createrepo_c as cr
+import pytest
+
+from pulpcore.plugin.stages import DeclarativeContent
+from pulpcore.plugin.util import get_domain_pk
+
+from pulp_rpm.app.models import RpmRemote, UpdateCollection, UpdateRecord, UpdateReference
+from pulp_rpm.app.tasks import synchronizing
+from pulp_rpm.app.tasks.synchronizing import (
+    ExistingPackages,
+    MirroringStore,
+    RepomdSession,
+    RpmContentSaver,
+    RpmFirstStage,
+    SyncCheckpoint,
+    probe_mirrors,
+    remote_for_event_loop,
+    run_concurrently,
+    unchanged_repodata,
+)
+from pulp_rpm.tests.unit.utils.query_recorder import QueryRecorder
+
+
+def test_existing_packages():
+    """Packages are looked up by pkgId and returned as saved, partially loaded Packages."""
+    pk = uuid.uuid4()
+    existing_packages = ExistingPackages(
+        [(pk, "foo", "0", "1.0", "1", "x86_64", "abc123", "sha256", "foo-1.0-1.x86_64.rpm", 42)]
+    )
+
+    assert len(existing_packages) == 1
+    assert "abc123" in existing_packages
+    assert existing_packages.pop("def456") is None
+
+    package = existing_packages.pop("abc123")
+    assert package.pk == pk
+    assert package.pulp_id == pk
+    assert package.pkgId == "abc123"
+    assert package.nevra == "foo-0:1.0-1.x86_64"
+    assert package.checksum_type == "sha256"
+    assert package.location_href == "foo-1.0-1.x86_64.rpm"
+    assert package.size_package == 42
+    assert not package._state.adding
+    assert {"files", "requires", "provides", "changelogs"} <= package.get_deferred_fields()
+
+    assert len(existing_packages) == 0
+    assert existing_packages.pop("abc123") is None
+
+
+def test_run_concurrently():
+    """Calls run in worker threads with an event loop and the task context, results are ordered."""
+    context_var = contextvars.ContextVar("test_run_concurrently")
+    context_var.set("task context")
+
+    def call(number):
+        asyncio.get_event_loop().run_until_complete(asyncio.sleep(0.01 * (3 - number)))
+        return number, context_var.get(), threading.current_thread() is threading.main_thread()
+
+    assert run_concurrently(call, [(1,), (2,), (3,)], max_workers=3) == [
+        (1, "task context", False),
+        (2, "task context", False),
+        (3, "task context", False),
+    ]
+    # a single call is made in this thread
+    assert run_concurrently(lambda: threading.current_thread(), [()], max_workers=3) == [
+        threading.current_thread()
+    ]
+
+
+def test_run_concurrently_error():
+    """The first error is raised after all calls have finished."""
+    finished = []
+
+    def call(number):
+        if number == 2:
+            raise ValueError(number)
+        time.sleep(0.01)
+        finished.append(number)
+
+    with pytest.raises(ValueError):
+        run_concurrently(call, [(1,), (2,), (3,)], max_workers=2)
+    assert sorted(finished) == [1, 3]
+
+
+@pytest.mark.django_db(transaction=True)
+def test_run_concurrently_downloads(tmp_path, monkeypatch):
+    """Concurrent calls download with their own copy of the remote, in their own event loop."""
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "repomd.xml").write_text("<repomd/>")
+    monkeypatch.chdir(tmp_path)
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(SimpleHTTPRequestHandler, directory=str(served))
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/repomd.xml"
+    remote = RpmRemote.objects.create(name=str(uuid.uuid4()), url=url)
+
+    def download(number):
+        call_remote = remote_for_event_loop(remote)
+        assert remote_for_event_loop(remote) is call_remote
+        downloader = call_remote.get_downloader(url=url)
+        result = asyncio.get_event_loop().run_until_complete(downloader.run())
+        with open(result.path) as f:
+            return f.read(), call_remote is remote
+
+    try:
+        assert (
+            run_concurrently(download, [(1,), (2,), (3,)], max_workers=3)
+            == [("<repomd/>", False)] * 3
+        )
+        # outside of worker threads, the remote itself is used
+        assert remote_for_event_loop(remote) is remote
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_repomd_session(tmp_path):
+    """Each repomd.xml is downloaded and parsed once per URL."""
+    repomd = cr.Repomd()
+    repomd.revision = "1234"
+    repomd_path = tmp_path / "repomd.xml"
+    repomd_path.write_text(repomd.xml_dump())
+    downloaded = []
+
+    class Remote:
+        def get_downloader(self, url):
+            downloaded.append(url)
+            return SimpleNamespace(fetch=lambda: SimpleNamespace(url=url, path=str(repomd_path)))
+
+    session = RepomdSession(Remote())
+    fetched = session.get("http://example.com/repo/")
+    assert fetched.repomd.revision == "1234"
+    assert session.get("http://example.com/repo") is fetched
+    assert session.get("http://example.com/repo/?mirrorlist") is fetched
+    session.get("http://example.com/other/")
+    assert downloaded == [
+        "http://example.com/repo/repodata/repomd.xml",
+        "http://example.com/other/repodata/repomd.xml",
+    ]
+
+
+def test_probe_mirrors(tmp_path):
+    """Mirrors are ranked fastest first, without waiting for the slowest ones."""
+    repomd_path = tmp_path / "repomd.xml"
+    repomd_path.write_text(cr.Repomd().xml_dump())
+    delays = {
+        "http://slow.example.com/": 0.2,
+        "http://dead.example.com/": None,
+        "http://fast.example.com/": 0.01,
+        "http://hung.example.com/": 60,
+        "http://medium.example.com/": 0.1,
+    }
+
+    class Downloader:
+        def __init__(self, url):
+            self.url = url
+
+        async def run(self):
+            delay = delays[self.url.replace("repodata/repomd.xml", "")]
+            if delay is None:
+                raise ConnectionError(self.url)
+            await asyncio.sleep(delay)
+            return SimpleNamespace(url=self.url, path=str(repomd_path))
+
+    class Remote:
+        def get_downloader(self, url):
+            return Downloader(url)
+
+    started = time.monotonic()
+    ranked = asyncio.run(probe_mirrors(Remote(), list(delays), 3))
+    assert time.monotonic() - started < 10
+    assert [mirror_url for mirror_url, fetched in ranked] == [
+        "http://fast.example.com/",
+        "http://medium.example.com/",
+        "http://slow.example.com/",
+    ]
+
+
+@pytest.mark.django_db
+def test_get_package_urls():
+    """Package downloads are spread over the mirrors when downloading immediately."""
+    mirror_urls = ["http://a.example.com/repo/", "http://b.example.com/", "http://c.example.com/"]
+    stage = RpmFirstStage(None, None, False, False, new_url=mirror_urls[0], mirror_urls=mirror_urls)
+    urls = stage.get_package_urls(None, "Packages/f/foo.rpm")
+    assert sorted(urls) == [
+        "http://a.example.com/repo/Packages/f/foo.rpm",
+        "http://b.example.com/Packages/f/foo.rpm",
+        "http://c.example.com/Packages/f/foo.rpm",
+    ]
+    starts = {stage.get_package_urls(None, f"Packages/{i}.rpm")[0][:20] for i in range(20)}
+    assert len(starts) == 3
+    assert stage.get_package_urls("http://base.example.com/", "foo.rpm") == [
+        "http://base.example.com/foo.rpm"
+    ]
+
+    stage.deferred_download = True
+    assert stage.get_package_urls(None, "foo.rpm")[0] == "http://a.example.com/repo/foo.rpm"
+
+
+def test_mirroring_store(tmp_path):
+    """Metadata files and package locations are kept per repository."""
+    repo = SimpleNamespace(pk=uuid.uuid4())
+    sub_repo = SimpleNamespace(pk=uuid.uuid4())
+    store = MirroringStore(str(tmp_path / "mirroring.sqlite3"))
+
+    store.add_metadata_file(repo, "repodata/repomd.xml", "/tmp/old")
+    store.add_metadata_file(repo, "repodata/repomd.xml", "/tmp/repomd.xml")
+    store.add_metadata_file(sub_repo, "repodata/repomd.xml", "/tmp/sub-repomd.xml")
+    for i in range(MirroringStore.BATCH_SIZE + 1):
+        store.add_package(repo, f"pkgid-{i}", f"Packages/{i}.rpm")
+    store.add_package(repo, "pkgid-0", "Other/0.rpm")
+    store.add_package(repo, "pkgid-0", "Other/0.rpm")
+    store.add_package(sub_repo, "pkgid-1", "Sub/1.rpm")
+
+    assert store.metadata_files(repo) == [("repodata/repomd.xml", "/tmp/repomd.xml")]
+    locations = store.package_locations(repo, ["pkgid-0", "pkgid-1000", "pkgid-missing"])
+    assert locations == {
+        "pkgid-0": {"Packages/0.rpm", "Other/0.rpm"},
+        "pkgid-1000": {"Packages/1000.rpm"},
+    }
+    assert store.package_locations(sub_repo, ["pkgid-1"]) == {"pkgid-1": {"Sub/1.rpm"}}
+    store.close()
+
+
+@pytest.mark.django_db
+def test_content_saver_update_record_relations():
+    """Relations are only saved once for new advisories, with a single query to find existing."""
+    existing = UpdateRecord.objects.create(id="EXISTING-1", digest=uuid.uuid4().hex)
+    UpdateReference.objects.create(update_record=existing, href="https://example.com/1")
+    new = UpdateRecord.objects.create(id="NEW-1", digest=uuid.uuid4().hex)
+
+    batch = [None]
+    for update_record in (existing, new, new):
+        dc = DeclarativeContent(content=update_record)
+        dc.extra_data = {
+            "collections": {UpdateCollection(name=f"{update_record.id}-collection"): []},
+            "references": [UpdateReference(href=f"https://example.com/{update_record.id}")],
+        }
+        batch.append(dc)
+
+    with QueryRecorder() as recorder:
+        RpmContentSaver()._post_save(batch)
+    # one query for the existing relations, one insert for collections and one for references
+    assert len(recorder.queries) == 3
+
+    assert not existing.collections.exists()
+    assert existing.references.count() == 1
+    assert list(new.collections.values_list("name", flat=True)) == ["NEW-1-collection"]
+    assert new.references.count() == 1
+
+
+def test_unchanged_repodata():
+    """Only the metadata with the same checksum as the last sync is unchanged."""
+    last_sync_details = {
+        "url": "http://example.com/repo/",
+        "download_policy": "on_demand",
+        "sync_policy": "additive",
+        "most_recent_version": 3,
+        "retain_package_versions": 0,
+        "skip_types": [],
+        "repomd_checksums": {"primary": "a", "filelists": "b", "other": "c", "updateinfo": "d"},
+    }
+    sync_details = {
+        **last_sync_details,
+        "repomd_checksums": {"primary": "a", "filelists": "b", "other": "c", "updateinfo": "e"},
+    }
+
+    unchanged = unchanged_repodata(sync_details, last_sync_details)
+    assert unchanged == {"primary", "filelists", "other", "modules", "group"}
+    stage = RpmFirstStage(None, None, False, False, new_url="http://example.com/repo/")
+    assert stage.carried_repodata == set()
+    stage = RpmFirstStage(
+        None, None, False, False, new_url="http://example.com/repo/", unchanged_repodata=unchanged
+    )
+    assert stage.carried_repodata == {"primary", "filelists", "other", "modules", "group"}
+
+    # a new modules record means the packages have to be parsed again
+    sync_details["repomd_checksums"]["modules"] = "f"
+    stage = RpmFirstStage(
+        None,
+        None,
+        False,
+        False,
+        new_url="http://example.com/repo/",
+        unchanged_repodata=unchanged_repodata(sync_details, last_sync_details),
+    )
+    assert stage.carried_repodata == {"group"}
+
+    assert unchanged_repodata({**sync_details, "skip_types": ["srpm"]}, last_sync_details) == set()
+    assert (
+        unchanged_repodata({**sync_details, "most_recent_version": 4}, last_sync_details) == set()
+    )
+    del last_sync_details["repomd_checksums"]
+    assert unchanged_repodata(sync_details, last_sync_details) == set()
+
+
+@pytest.mark.django_db
+def test_sync_checkpoint(tmp_path, settings):
+    """Saved packages are recorded per repository and remote until the repository is synced."""
+    settings.WORKING_DIRECTORY = str(tmp_path)
+    repo = SimpleNamespace(pk=uuid.uuid4())
+    remote = SimpleNamespace(pk=uuid.uuid4())
+
+    checkpoint = SyncCheckpoint(repo, remote)
+    pks = [uuid.uuid4() for _ in range(3)]
+    checkpoint.add_packages(pks[:2])
+    checkpoint.add_packages(pks[1:])
+    checkpoint._connection.close()
+
+    checkpoint = SyncCheckpoint(repo, remote)
+    assert {pk for (pk,) in checkpoint._connection.execute("SELECT pk FROM packages")} == {
+        str(pk) for pk in pks
+    }
+    # the packages don't exist anymore, e.g. they were removed by orphan cleanup
+    assert checkpoint.saved_packages() == []
+
+    checkpoint.remove()
+    assert not (tmp_path / "rpm-sync-checkpoints" / str(repo.pk)).exists()
+
+
+def test_sync_checkpoint_remove_expired(tmp_path, settings):
+    """The checkpoints of repositories which weren't written to for a while are removed."""
+    settings.WORKING_DIRECTORY = str(tmp_path)
+    SyncCheckpoint.remove_expired()
+    checkpoints = {}
+    for name in ("current", "expired", "partly_expired"):
+        checkpoint = SyncCheckpoint(SimpleNamespace(pk=uuid.uuid4()), SimpleNamespace(pk=name))
+        checkpoint._connection.close()
+        checkpoints[name] = checkpoint
+    SyncCheckpoint(
+        SimpleNamespace(pk=os.path.basename(checkpoints["partly_expired"].directory)),
+        SimpleNamespace(pk="current"),
+    )._connection.close()
+    expired = time.time() - SyncCheckpoint.MAX_AGE - 60
+    for name in ("expired", "partly_expired"):
+        directory = checkpoints[name].directory
+        os.utime(os.path.join(directory, f"{name}.sqlite3"), (expired, expired))
+        os.utime(directory, (expired, expired))
+
+    SyncCheckpoint.remove_expired()
+
+    assert os.path.exists(checkpoints["current"].directory)
+    assert not os.path.exists(checkpoints["expired"].directory)
+    # a checkpoint of the repository is still in use
+    assert sorted(os.listdir(checkpoints["partly_expired"].directory)) == [
+        "current.sqlite3",
+        "partly_expired.sqlite3",
+    ]
+
+
+def _make_pkg(name, version="1.0", location_href=None, pkgid=None, time_build=1):
+    pkg = cr.Package()
+    pkg.name = name
+    pkg.arch = "noarch"
+    pkg.epoch = "0"
+    pkg.version = version
+    pkg.release = "1"
+    pkg.time_build = time_build
+    pkg.size_package = 100
+    pkg.checksum_type = "sha256"
+    pkg.location_href = location_href or f"Packages/{name}-{version}-1.noarch.rpm"
+    pkg.pkgId = pkgid or hashlib.sha256(pkg.location_href.encode()).hexdigest()
+    pkg.summary = f"A {name}"
+    pkg.requires = [("glibc", None, None, None, None, False)]
+    pkg.files = [(None, "/usr/share/", f"{name}-{version}")]
+    pkg.changelogs = [("Packager <p@example.com> - 1.0-1", 1, f"- {name} {version}")]
+    return pkg
+
+
+def _write_repo(path, pkgs):
+    with cr.RepositoryWriter(str(path), compression=cr.NO_COMPRESSION) as writer:
+        writer.set_num_of_pkgs(len(pkgs))
+        for pkg in pkgs:
+            writer.add_pkg(pkg)
+    return {
+        record.type: SimpleNamespace(
+            path=os.path.join(path, record.location_href), url=record.location_href
+        )
+        for record in writer.repomd.records
+    }
+
+
+class ProgressReport:
+    def __init__(self, **kwargs):
+        self.code = kwargs["code"]
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    async def asave(self):
+        pass
+
+    async def aincrement(self):
+        pass
+
+
+def _parse_packages(monkeypatch, metadata, existing_pkgs=(), between_passes=None):
+    """Run parse_packages() of the first stage and return the content it passes on."""
+    existing_rows = [
+        (
+            uuid.uuid4(),
+            pkg.name,
+            pkg.epoch,
+            pkg.version,
+            pkg.release,
+            pkg.arch,
+            pkg.pkgId,
+            pkg.checksum_type,
+            pkg.location_href,
+            pkg.size_package,
+        )
+        for pkg in existing_pkgs
+    ]
+    monkeypatch.setattr(
+        ExistingPackages, "from_repository_version", lambda version: ExistingPackages(existing_rows)
+    )
+
+    class BetweenPassesProgressReport(ProgressReport):
+        async def __aenter__(self):
+            # The skipped packages are reported after the first pass over primary.xml
+            if self.code == "sync.skipped.packages" and between_passes:
+                between_passes()
+            return await super().__aenter__()
+
+    monkeypatch.setattr(synchronizing, "ProgressReport", BetweenPassesProgressReport)
+    repository = SimpleNamespace(retain_package_versions=0, latest_version=lambda: None)
+    remote = SimpleNamespace(pk=uuid.uuid4())
+    stage = RpmFirstStage(remote, repository, True, False, new_url="http://example.com/repo/")
+    content = []
+
+    async def put(dc):
+        content.append(dc.content)
+
+    stage.put = put
+    # Saves a query from inside the event loop
+    get_domain_pk()
+    asyncio.run(
+        stage.parse_packages(
+            metadata["primary"], metadata["filelists"], metadata["other"], modulemd_list=[]
+        )
+    )
+    return content
+
+
+def _package_fields(package):
+    return (
+        package.pkgId,
+        package.name,
+        package.version,
+        package.location_href,
+        package.summary,
+        package.requires,
+        package.files,
+        package.changelogs,
+    )
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("existing", [0, 2])
+def test_parse_packages_selectively(tmp_path, monkeypatch, caplog, existing):
+    """
+    The filelists and other metadata is only parsed for the new packages, the packages are the
+    same as when everything is parsed.
+    """
+    caplog.set_level(logging.DEBUG, logger=synchronizing.__name__)
+    pkgs = [_make_pkg(name) for name in ("bear", "cat", "dog", "fox")]
+    metadata = _write_repo(tmp_path / "repo", pkgs)
+
+    content = _parse_packages(monkeypatch, metadata, pkgs[:existing])
+
+    assert [package.pkgId for package in content] == [pkg.pkgId for pkg in pkgs]
+    for package in content[:existing]:
+        assert not package._state.adding
+    new_packages = content[existing:]
+    assert all(package._state.adding for package in new_packages)
+    selective = f"Parsing filelists and other only for {len(pkgs) - existing} packages"
+    assert (selective in caplog.text) == bool(existing)
+
+    monkeypatch.setattr(synchronizing, "SELECTIVE_PARSE_MAX_NEW_PACKAGES", 0)
+    caplog.clear()
+    fully_parsed = _parse_packages(monkeypatch, metadata, pkgs[:existing])[existing:]
+
+    assert "only for" not in caplog.text
+    assert [_package_fields(package) for package in new_packages] == [
+        _package_fields(package) for package in fully_parsed
+    ]
+    assert [file_entry[2] for file_entry in new_packages[-1].files] == ["fox-1.0"]
+    assert [changelog[2] for changelog in new_packages[-1].changelogs] == ["- fox 1.0"]
+
+
+@pytest.mark.django_db
+def test_parse_packages_selectively_without_filelists(tmp_path, monkeypatch, caplog):
+    """Without filelists.xml, the new packages keep the files listed in primary.xml."""
+    caplog.set_level(logging.DEBUG, logger=synchronizing.__name__)
+    pkgs = [_make_pkg(name) for name in ("bear", "cat", "dog", "fox")]
+    for pkg in pkgs:
+        pkg.files = [(None, "/usr/bin/", pkg.name)]
+    metadata = _write_repo(tmp_path / "repo", pkgs)
+    metadata["filelists"] = None
+
+    new_packages = _parse_packages(monkeypatch, metadata, pkgs[:2])[2:]
+
+    assert "Parsing filelists and other only for 2 packages" in caplog.text
+    assert [
+        [tuple(file_entry[1:3]) for file_entry in package.files] for package in new_packages
+    ] == [
+        [("/usr/bin/", "dog")],
+        [("/usr/bin/", "fox")],
+    ]
+    monkeypatch.setattr(synchronizing, "SELECTIVE_PARSE_MAX_NEW_PACKAGES", 0)
+    fully_parsed = _parse_packages(monkeypatch, metadata, pkgs[:2])[2:]
+    assert [_package_fields(package) for package in new_packages] == [
+        _package_fields(package) for package in fully_parsed
+    ]
+
+
+@pytest.mark.django_db
+def test_parse_packages_duplicates(tmp_path, monkeypatch, caplog):
+    """
+    Of the packages sharing a NEVRA only the latest build is passed on, and duplicate pkgIds
+    fall back to parsing all of the metadata.
+    """
+    caplog.set_level(logging.DEBUG, logger=synchronizing.__name__)
+    bear = _make_pkg("bear")
+    pkgs = [
+        bear,
+        _make_pkg("cat", pkgid=bear.pkgId),
+        _make_pkg("dog", location_href="Packages/old/dog-1.0-1.noarch.rpm"),
+        _make_pkg("dog", time_build=2),
+        _make_pkg("bear", location_href="Packages/other/bear-1.0-1.noarch.rpm", pkgid=bear.pkgId),
+        _make_pkg("fox"),
+    ]
+    metadata = _write_repo(tmp_path / "repo", pkgs)
+
+    content = _parse_packages(monkeypatch, metadata, existing_pkgs=[pkgs[5]])
+
+    assert [(package.name, package.pkgId) for package in content] == [
+        ("bear", bear.pkgId),
+        ("cat", bear.pkgId),
+        ("dog", pkgs[3].pkgId),
+        ("fox", pkgs[5].pkgId),
+    ]
+    assert "only for" not in caplog.text
+    assert [file_entry[2] for file_entry in content[2].files] == ["dog-1.0"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("existing", [0, 1])
+@pytest.mark.parametrize(
+    "changed_names",
+    [("dog", "cat", "bear"), ("bear", "cat", "fox"), ("bear", "cat", "dog", "fox")],
+)
+def test_parse_packages_changed_primary(tmp_path, monkeypatch, existing, changed_names):
+    """A primary.xml which changes between the two passes over it is an error."""
+    pkgs = [_make_pkg(name) for name in ("bear", "cat", "dog")]
+    metadata = _write_repo(tmp_path / "repo", pkgs)
+    changed = _write_repo(tmp_path / "changed", [_make_pkg(name) for name in changed_names])
+
+    def change_metadata():
+        for name in ("primary", "filelists", "other"):
+            shutil.copyfile(changed[name].path, metadata[name].path)
+
+    with pytest.raises(ValueError, match="do not match the first pass"):
+        _parse_packages(monkeypatch, metadata, pkgs[:existing], between_passes=change_metadata)
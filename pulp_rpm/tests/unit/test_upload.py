@@ -0,0 +1,181 @@
+import hashlib
+import os
+import uuid
+from types import SimpleNamespace
+from unittest import mock
+
+import pytest
+import rpm_rs
+from django.core.files.storage import FileSystemStorage
+from rest_framework.serializers import ValidationError
+
+from pulpcore.plugin.models import Artifact, ContentArtifact
+
+from pulp_rpm.app.exceptions import PackageParseError
+from pulp_rpm.app.models import Package, RpmRepository
+from pulp_rpm.app.serializers import PackageBulkUploadSerializer
+from pulp_rpm.app.tasks.upload import (
+    _parse_package,
+    _save_packages,
+    parse_packages,
+    upload_packages,
+)
+from pulp_rpm.tests.unit.utils.query_recorder import QueryRecorder
+
+
+class Domain:
+    def __init__(self, location):
+        self.location = location
+
+    def get_storage(self):
+        return FileSystemStorage(location=self.location)
+
+
+def _artifact(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return SimpleNamespace(
+        pk=path.name,
+        pulp_id=path.name,
+        file=SimpleNamespace(name=path.name),
+        size=len(data),
+        sha256=hashlib.sha256(data).hexdigest(),
+        pulp_domain=Domain(str(path.parent)),
+    )
+
+
+def _build_rpm(path, name):
+    builder = rpm_rs.PackageBuilder(name, "1.0", "MIT", "noarch", f"A {name}")
+    builder.release("2")
+    builder.with_file_contents(os.urandom(1000), rpm_rs.FileOptions.new(f"/usr/share/{name}"))
+    builder.build().write_file(str(path / f"{name}.rpm"))
+    return path / f"{name}.rpm"
+
+
+def test_parse_packages(tmp_path, settings):
+    """The RPMs are parsed in worker processes, in order, and unparsable ones are None."""
+    settings.MAX_PACKAGE_UPLOAD_WORKERS = 2
+    artifacts = [_artifact(_build_rpm(tmp_path, name)) for name in ("bear", "cat", "dog")]
+    (tmp_path / "notrpm.rpm").write_bytes(b"not an rpm" * 100)
+    artifacts.insert(1, _artifact(tmp_path / "notrpm.rpm"))
+
+    packages = parse_packages(artifacts)
+
+    assert packages[1] is None
+    assert [package["name"] for package in packages if package] == ["bear", "cat", "dog"]
+    assert packages[0]["location_href"] == "bear-1.0-2.noarch.rpm"
+    assert packages[0]["pkgId"] == artifacts[0].sha256
+    assert packages[0]["size_package"] == artifacts[0].size
+
+
+def _save_artifact(path):
+    artifact = Artifact.init_and_validate(str(path))
+    artifact.save()
+    return artifact
+
+
+def _save_package(artifact, downloaded=True):
+    """Save the package of an artifact, without the artifact if it wasn't downloaded."""
+    package = Package.objects.create(**_parse_package(artifact))
+    ContentArtifact.objects.create(
+        artifact=artifact if downloaded else None,
+        content=package,
+        relative_path=package.location_href,
+    )
+    return package
+
+
+@pytest.mark.django_db
+def test_save_packages(tmp_path):
+    """
+    New packages are saved with their artifacts, packages created concurrently are reused, and
+    existing packages without an artifact get the uploaded one.
+    """
+    artifacts = {
+        name: _save_artifact(_build_rpm(tmp_path, name)) for name in ("bear", "cat", "dog")
+    }
+    on_demand_cat = _save_package(artifacts["cat"], downloaded=False)
+    # created by another upload since the existing packages were looked up
+    concurrent_dog = _save_package(artifacts["dog"])
+
+    new_packages = [
+        (artifacts["bear"], _parse_package(artifacts["bear"])),
+        (artifacts["dog"], _parse_package(artifacts["dog"])),
+    ]
+
+    with QueryRecorder() as recorder:
+        packages = _save_packages(new_packages, [(artifacts["cat"], on_demand_cat)])
+
+    assert sorted(package.name for package in packages) == ["bear", "cat", "dog"]
+    assert {package.pk for package in packages} >= {on_demand_cat.pk, concurrent_dog.pk}
+    for name, artifact in artifacts.items():
+        content_artifacts = ContentArtifact.objects.filter(
+            content__in=Package.objects.filter(name=name)
+        )
+        assert [content_artifact.artifact_id for content_artifact in content_artifacts] == [
+            artifact.pk
+        ]
+        assert content_artifacts[0].relative_path == "{}-1.0-2.noarch.rpm".format(name)
+    # the packages created concurrently are looked up at once
+    package_lookups = recorder.get_queries(
+        lambda query: query.statement_type == "SELECT" and 'FROM "rpm_package"' in query.sql
+    )
+    assert len(package_lookups) == 1
+
+
+@pytest.mark.django_db
+def test_upload_packages(tmp_path):
+    """The packages of all the files are added to the repository in a single new version."""
+    repository = RpmRepository.objects.create(name=str(uuid.uuid4()))
+    artifacts = [_save_artifact(_build_rpm(tmp_path, name)) for name in ("bear", "cat")]
+    existing_cat = _save_package(artifacts[1])
+
+    with mock.patch("pulp_rpm.app.tasks.upload.CreatedResource") as created_resource:
+        upload_packages(
+            str(repository.pk), artifact_pks=[str(artifact.pk) for artifact in artifacts * 2]
+        )
+
+    repository.refresh_from_db()
+    assert repository.next_version == 2
+    version = repository.latest_version()
+    assert version.number == 1
+    packages = Package.objects.filter(pk__in=version.content)
+    assert sorted(packages.values_list("name", flat=True)) == ["bear", "cat"]
+    assert existing_cat.pk in {package.pk for package in packages}
+    assert Package.objects.filter(name="cat").count() == 1
+    assert len(created_resource.objects.bulk_create.call_args.args[0]) == 2
+
+
+@pytest.mark.django_db
+def test_upload_packages_unparsable(tmp_path):
+    """No repository version is created if one of the files isn't an RPM."""
+    repository = RpmRepository.objects.create(name=str(uuid.uuid4()))
+    (tmp_path / "notrpm.rpm").write_bytes(b"not an rpm" * 100)
+    artifacts = [
+        _save_artifact(_build_rpm(tmp_path, "bear")),
+        _save_artifact(tmp_path / "notrpm.rpm"),
+    ]
+
+    with pytest.raises(PackageParseError) as exc_info:
+        upload_packages(
+            str(repository.pk), artifact_pks=[str(artifact.pk) for artifact in artifacts]
+        )
+
+    assert exc_info.value.sha256s == [artifacts[1].sha256]
+
+    assert repository.latest_version().number == 0
+    assert not Package.objects.filter(name="bear").exists()
+
+
+def test_bulk_upload_serializer_validation():
+    """Something has to be uploaded, and the repository must not sign packages."""
+    serializer = PackageBulkUploadSerializer()
+    repository = mock.Mock(package_signing_service=None)
+
+    with pytest.raises(ValidationError):
+        serializer.validate({"repository": repository, "files": [], "uploads": []})
+    assert serializer.validate({"repository": repository, "files": ["bear.rpm"]})
+
+    repository.package_signing_service = mock.Mock()
+    with pytest.raises(ValidationError):
+        serializer.validate({"repository": repository, "files": ["bear.rpm"]})
@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from pulpcore.plugin.download import DownloadResult, HttpDownloader
+
+from pulp_rpm.app.shared_utils import urlpath_sanitize
+from pulp_rpm.app.tasks.synchronizing import RpmFirstStage
+from pulp_rpm.app.zchunk import (
+    ZCK_MAGIC,
+    ZchunkError,
+    ZchunkHeader,
+    download_zchunk_delta,
+    header_size,
+    plan_chunks,
+    read_compint,
+    zchunk_cache_path,
+)
+
+
+def compint(value):
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F)
+        value >>= 7
+    data.append(value | 0x80)
+    return bytes(data)
+
+
+def make_zchunk(chunks):
+    """A zchunk file with a SHA-256 header checksum and SHA-512/128 chunk checksums."""
+    index = compint(3) + compint(len(chunks) + 1)
+    index += bytes(16) + compint(0) + compint(0)  # no dictionary
+    for chunk in chunks:
+        index += hashlib.sha512(chunk).digest()[:16] + compint(len(chunk)) + compint(len(chunk))
+    data = b"".join(chunks)
+    preface = hashlib.sha256(data).digest() + compint(0) + compint(2)
+    header = preface + compint(len(index)) + index + compint(0)
+    lead = ZCK_MAGIC + compint(1) + compint(len(header))
+    checksum = hashlib.sha256(lead + header).digest()
+    return lead + checksum + header + data
+
+
+def test_read_compint():
+    """Compressed integers round trip."""
+    for value in (0, 1, 127, 128, 300, 2**32):
+        encoded = b"x" + compint(value) + b"y"
+        assert read_compint(encoded, 1) == (value, len(encoded) - 1)
+
+
+def test_zchunk_header():
+    """The header lists every chunk with its offset in the file."""
+    chunks = [b"a" * 10, b"b" * 20, b"c" * 5]
+    zck = make_zchunk(chunks)
+    header = ZchunkHeader(zck)
+
+    assert header.size == header_size(zck[:64])
+    assert header.checksum == header.computed_checksum
+    assert header.size + header.data_size == len(zck)
+    assert [chunk.size for chunk in header.chunks] == [0, 10, 20, 5]
+    for chunk, data in zip(header.chunks[1:], chunks):
+        assert zck[chunk.offset : chunk.offset + chunk.size] == data
+
+    with pytest.raises(ZchunkError):
+        ZchunkHeader(b"<?xml")
+    with pytest.raises(ZchunkError):
+        ZchunkHeader(zck[: header.size - 1])
+
+
+def test_plan_chunks():
+    """Unchanged chunks are copied, changed chunks are downloaded in merged ranges."""
+    previous = ZchunkHeader(make_zchunk([b"a" * 10, b"b" * 20, b"c" * 5]))
+    header = ZchunkHeader(make_zchunk([b"b" * 20, b"d" * 7, b"e" * 3, b"a" * 10]))
+    b, d, e, a = header.chunks[1:]
+
+    reused, ranges = plan_chunks(header, previous)
+
+    assert reused == [
+        (previous.chunks[2].offset, b.offset, 20),
+        (previous.chunks[1].offset, a.offset, 10),
+    ]
+    assert ranges == [(d.offset, e.offset + e.size - 1)]
+
+
+class RangeResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    async def read(self):
+        return self.data
+
+
+class RangeDownloader(HttpDownloader):
+    """An HttpDownloader serving the range requests of its session from memory."""
+
+    def __init__(self, url, data, status=206):
+        self.url = url
+        self.data = data
+        self.status = status
+        self.semaphore = asyncio.Semaphore(2)
+        self.auth = self.proxy = self.proxy_auth = None
+        self.session = self
+        self.requested = []
+
+    def get(self, url, headers, **kwargs):
+        start, end = map(int, headers["Range"].removeprefix("bytes=").split("-"))
+        self.requested.append((start, end))
+        return RangeResponse(self.status, self.data[start : end + 1])
+
+
+def zchunk_record(zck):
+    header = ZchunkHeader(zck)
+    return SimpleNamespace(
+        type="primary_zck",
+        location_base=None,
+        location_href="repodata/primary.xml.zck",
+        size=len(zck),
+        size_header=header.size,
+        checksum_header=header.checksum.hex(),
+        checksum_type="sha256",
+        checksum=hashlib.sha256(zck).hexdigest(),
+    )
+
+
+def test_download_zchunk_delta(tmp_path, monkeypatch):
+    """Only the header and the changed chunks are downloaded, the rest is copied."""
+    monkeypatch.chdir(tmp_path)
+    previous_path = tmp_path / "previous.zck"
+    previous_path.write_bytes(make_zchunk([b"a" * 10, b"b" * 20, b"c" * 5]))
+    zck = make_zchunk([b"b" * 20, b"d" * 7, b"e" * 3, b"a" * 10])
+    header = ZchunkHeader(zck)
+    d, e = header.chunks[2:4]
+    downloader = RangeDownloader("http://example.com/repodata/primary.xml.zck", zck)
+
+    result, downloaded = asyncio.run(
+        download_zchunk_delta(downloader, zchunk_record(zck), str(previous_path))
+    )
+
+    with open(result.path, "rb") as f:
+        assert f.read() == zck
+    assert downloaded == header.size + 10
+    assert downloader.requested == [(0, header.size - 1), (d.offset, e.offset + e.size - 1)]
+
+    # the server ignores the range and sends the whole file
+    downloader = RangeDownloader(downloader.url, zck, status=200)
+    with pytest.raises(ZchunkError):
+        asyncio.run(download_zchunk_delta(downloader, zchunk_record(zck), str(previous_path)))
+    # e.g. a file:// remote
+    downloader = SimpleNamespace(url="file:///repo/repodata/primary.xml.zck")
+    with pytest.raises(ZchunkError):
+        asyncio.run(download_zchunk_delta(downloader, zchunk_record(zck), str(previous_path)))
+
+
+def test_download_zchunk_without_range_requests(tmp_path, settings):
+    """Downloaders which can't make range requests download the whole file instead."""
+    settings.WORKING_DIRECTORY = str(tmp_path)
+    zck = make_zchunk([b"b" * 20, b"d" * 7])
+    downloaded_path = tmp_path / "downloaded.zck"
+    downloaded_path.write_bytes(zck)
+
+    class FileDownloader:
+        def __init__(self, url, **kwargs):
+            self.url = url
+
+        async def run(self):
+            return DownloadResult(
+                url=self.url, artifact_attributes={}, path=str(downloaded_path), headers=None
+            )
+
+    remote = SimpleNamespace(pk=uuid.uuid4(), get_downloader=FileDownloader)
+    stage = RpmFirstStage(remote, None, False, False, new_url="file:///repo/")
+    cache_path = zchunk_cache_path(remote, urlpath_sanitize("file:///repo/", "primary_zck"))
+    os.makedirs(os.path.dirname(cache_path))
+    with open(cache_path, "wb") as f:
+        f.write(make_zchunk([b"a" * 10]))
+
+    result = asyncio.run(stage.download_zchunk(zchunk_record(zck)))
+
+    assert result.path == str(downloaded_path)
+    with open(cache_path, "rb") as f:
+        assert f.read() == zck
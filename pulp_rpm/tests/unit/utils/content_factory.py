@@ -12,6 +12,7 @@ from pulp_rpm.app.models import (
     UpdateCollection,
     UpdateCollectionPackage,
     UpdateRecord,
+    UpdateReference,
 )
 
 
@@ -117,11 +118,14 @@ class RepoContentFactory:
         self._content_pks.extend(pks)
         return nsvcas, pks
 
-    def add_advisory(self, advisory_id, *, package_names=None, module_nsvcas=None):
+    def add_advisory(
+        self, advisory_id, *, package_names=None, module_nsvcas=None, reference_hrefs=None
+    ):
         """UpdateRecord referencing the given package names and/or module NSVCAs.
 
         Packages all go in one UpdateCollection. Modules each need their own UpdateCollection,
         since a collection carries at most one module NSVCA (UpdateCollection.module).
+        Each of `reference_hrefs` becomes an UpdateReference of the advisory.
         """
         advisory, _ = UpdateRecord.objects.get_or_create(
             id=advisory_id,
@@ -178,5 +182,12 @@ class RepoContentFactory:
                         },
                     },
                 )
+        if reference_hrefs:
+            UpdateReference.objects.bulk_create(
+                [
+                    UpdateReference(update_record=advisory, href=href, ref_type="bugzilla")
+                    for href in reference_hrefs
+                ]
+            )
         self._content_pks.append(advisory.pk)
         return advisory.pk